@@ -0,0 +1,76 @@
+"""
+Benchmark of the acronyms text transformer
+
+Compare the single pass matcher with the previous implementation (one re.sub per acronym),
+scaling both the text length and the dictionary size.
+
+Usage: python benchmarks/acronyms_benchmark.py
+"""
+import random
+import re
+import string
+import timeit
+
+from eurelis_kb_framework.acronyms import AcronymsTextTransformer
+
+
+def legacy_transform(acronyms: dict[str, str], text: str) -> str:
+    for key, value in acronyms.items():
+        text = re.sub(rf"\b{key}\b", f"{key} ({value})", text)
+
+    return text
+
+
+def build_acronyms(size: int, rng: random.Random) -> dict[str, str]:
+    acronyms: dict[str, str] = {}
+    while len(acronyms) < size:
+        key = "".join(rng.choices(string.ascii_uppercase, k=rng.randint(2, 6)))
+        acronyms[key] = f"expansion of {key.lower()}"
+
+    return acronyms
+
+
+def build_text(words: int, acronyms: dict[str, str], rng: random.Random) -> str:
+    keys = list(acronyms.keys())
+    vocabulary = ["the", "knowledge", "base", "document", "search", "index", "with"]
+    return " ".join(
+        rng.choice(keys) if rng.random() < 0.05 else rng.choice(vocabulary)
+        for _ in range(words)
+    )
+
+
+def bench(dictionary_size: int, words: int, rng: random.Random):
+    acronyms = build_acronyms(dictionary_size, rng)
+    text = build_text(words, acronyms, rng)
+
+    transformer = AcronymsTextTransformer(acronyms)
+
+    # both implementations should agree on texts without nested expansions
+    assert transformer.transform(text) == legacy_transform(acronyms, text)
+
+    number = 3
+    legacy = timeit.timeit(lambda: legacy_transform(acronyms, text), number=number)
+    single = timeit.timeit(lambda: transformer.transform(text), number=number)
+
+    print(
+        f"{dictionary_size:>6} acronyms {words:>8} words "
+        f"legacy {legacy / number * 1000:>10.2f} ms "
+        f"single pass {single / number * 1000:>8.2f} ms "
+        f"x{legacy / single:>7.1f}"
+    )
+
+
+def main():
+    rng = random.Random(42)
+
+    print("Scaling text length")
+    for words in (1_000, 10_000, 100_000):
+        bench(1_800, words, rng)
+
+    print("Scaling dictionary size")
+    for dictionary_size in (10, 100, 1_000, 5_000):
+        bench(dictionary_size, 10_000, rng)
+
+
+if __name__ == "__main__":
+    main()
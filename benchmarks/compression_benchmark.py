@@ -0,0 +1,113 @@
+"""
+Benchmark of the numpy vector store compression
+
+Compare the bytes by vector, the recall@k and the latency of each compression, with the exact float32 search,
+on synthetic clustered vectors. Compressed codes are scanned, then the best k * rerank candidates are re-ranked
+with the full precision vectors. Compressed stores are persisted to a temporary folder, as compression
+needs the full precision vectors memory mapped.
+
+Usage: python benchmarks/compression_benchmark.py [--size 100000] [--dimension 384] [--rerank 4]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from eurelis_kb_framework.vectorstores.numpy.numpy_vector_store import NumpyVectorStore
+
+
+def clustered_vectors(
+    size: int, dimension: int, clusters: int, rng: np.random.Generator
+) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    labels = rng.integers(0, clusters, size)
+    return centers[labels] + 0.6 * rng.normal(size=(size, dimension)).astype(np.float32)
+
+
+def timed_search(store: NumpyVectorStore, queries: np.ndarray, k: int):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append(
+            [doc.metadata["row"] for doc in store.similarity_search_by_vector(query, k)]
+        )
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def fill(store: NumpyVectorStore, vectors: np.ndarray, batch_size: int = 10_000):
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start : start + batch_size]
+        store.add_embeddings(
+            [""] * len(batch),
+            batch,
+            [{"row": row} for row in range(start, start + len(batch))],
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(args.size, args.dimension, 2_000, rng)
+    queries = vectors[rng.choice(args.size, args.queries, replace=False)]
+    queries = queries + 0.3 * rng.normal(size=queries.shape).astype(np.float32)
+
+    exact_store = NumpyVectorStore(embedding=None)  # type: ignore[arg-type]
+    fill(exact_store, vectors)
+    exact, exact_latency = timed_search(exact_store, queries, args.k)
+    print(
+        f"{args.size} vectors of dimension {args.dimension}, re-ranking {args.rerank} candidates by result"
+    )
+    print(
+        f"{'float32':>10} {args.dimension * 4:>6} bytes/vector x{1.0:>5.1f} "
+        f"recall@{args.k} 1.000 latency {exact_latency * 1000:>8.2f} ms"
+    )
+
+    compressions = [
+        {"type": "float16"},
+        {"type": "int8"},
+        {"type": "pq", "m": args.dimension // 4},
+        {"type": "pq", "m": args.dimension // 8},
+        {"type": "pq", "m": args.dimension // 16},
+    ]
+    folder = tempfile.TemporaryDirectory()
+    for position, compression in enumerate(compressions):
+        if compression.get("m") == 0 or args.dimension % compression.get("m", 1):
+            continue
+
+        store = NumpyVectorStore(
+            embedding=None,  # type: ignore[arg-type]
+            path=os.path.join(folder.name, str(position)),
+            compression={**compression, "rerank": args.rerank},
+        )
+        fill(store, vectors)
+
+        approximate, latency = timed_search(store, queries, args.k)
+        recall = np.mean(
+            [
+                len(set(expected) & set(found)) / len(expected)
+                for expected, found in zip(exact, approximate)
+            ]
+        )
+        code_bytes = store._codes[0].nbytes
+        name = compression["type"] + (
+            f" m={compression['m']}" if "m" in compression else ""
+        )
+        print(
+            f"{name:>10} {code_bytes:>6} bytes/vector x{args.dimension * 4 / code_bytes:>5.1f} "
+            f"recall@{args.k} {recall:.3f} latency {latency * 1000:>8.2f} ms"
+        )
+
+    folder.cleanup()
+
+
+if __name__ == "__main__":
+    main()
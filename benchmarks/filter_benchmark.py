@@ -0,0 +1,88 @@
+"""
+Benchmark of the numpy vector store metadata index
+
+Compare the latency of filtered searches evaluated by the metadata index with the ones evaluated by sqlite,
+for filters of decreasing selectivity.
+
+Usage: python benchmarks/filter_benchmark.py [--size 200000] [--dimension 384]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from eurelis_kb_framework.vectorstores.numpy.numpy_vector_store import NumpyVectorStore
+
+METADATA_INDEX = {"namespace": "category", "source": "category", "year": "number"}
+
+
+def fill(
+    store: NumpyVectorStore, vectors: np.ndarray, metadatas: list, batch_size=10_000
+):
+    for start in range(0, len(vectors), batch_size):
+        store.add_embeddings(
+            [""] * len(vectors[start : start + batch_size]),
+            vectors[start : start + batch_size],
+            metadatas[start : start + batch_size],
+        )
+
+
+def timed_search(store: NumpyVectorStore, queries: np.ndarray, k: int, filter: dict):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append(store.similarity_search_by_vector(query, k, filter=filter))
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(args.size, args.dimension)).astype(np.float32)
+    queries = rng.normal(size=(args.queries, args.dimension)).astype(np.float32)
+    metadatas = [
+        {
+            "namespace": f"namespace-{row % 4}",
+            "source": f"source-{row % 10_000}",
+            "year": 2000 + row % 25,
+        }
+        for row in range(args.size)
+    ]
+
+    sqlite_store = NumpyVectorStore(embedding=None, metadata_index={})  # type: ignore[arg-type]
+    fill(sqlite_store, vectors, metadatas)
+    indexed_store = NumpyVectorStore(embedding=None, metadata_index=METADATA_INDEX)  # type: ignore[arg-type]
+    fill(indexed_store, vectors, metadatas)
+
+    filters = [
+        {"source": "source-42"},
+        {"namespace": "namespace-1", "year": {"$gte": 2020}},
+        {"year": {"$lt": 2005}},
+        {"namespace": {"$in": ["namespace-0", "namespace-1"]}},
+        {"namespace": {"$ne": "namespace-3"}},
+    ]
+
+    for search_filter in filters:
+        expected, sqlite_latency = timed_search(
+            sqlite_store, queries, args.k, search_filter
+        )
+        found, latency = timed_search(indexed_store, queries, args.k, search_filter)
+        assert [[doc.metadata for doc in docs] for docs in expected] == [
+            [doc.metadata for doc in docs] for docs in found
+        ]
+        selectivity = len(indexed_store._filtered_rows(search_filter)) / args.size
+        print(
+            f"{str(search_filter):<60} selectivity {selectivity:>6.2%} "
+            f"sqlite {sqlite_latency * 1000:>8.2f} ms index {latency * 1000:>8.2f} ms "
+            f"x{sqlite_latency / latency:>6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark of the token length batching of HuggingFace embeddings, on CPU
+
+Embed a synthetic corpus of chunks of very different lengths with the langchain HuggingFaceEmbeddings
+(static batch size) and with the bucketed embeddings (batches under a token budget), compare the
+throughput, the number of padded tokens and check that both give the same embeddings.
+
+Usage: python benchmarks/hf_batching_benchmark.py [--model sentence-transformers/all-MiniLM-L6-v2]
+    [--size 2000] [--batch-size 32] [--max-batch-tokens 16384]
+"""
+import argparse
+import time
+
+import numpy as np
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+from eurelis_kb_framework.embeddings.huggingface.bucketed import (
+    BucketedHuggingFaceEmbeddings,
+    token_budget_batches,
+)
+
+WORDS = (
+    "the knowledge base framework indexes documents split in chunks embedded by a model "
+    "and stored in a vector store queried by similarity with metadata filters"
+).split()
+
+
+def corpus(size: int, rng: np.random.Generator) -> list:
+    # chunk lengths spread from a few words to the max sequence length
+    lengths = np.clip(rng.lognormal(mean=3.5, sigma=1.0, size=size), 3, 400)
+    return [" ".join(rng.choice(WORDS, int(length))) for length in lengths]
+
+
+def padded_tokens(batches, lengths) -> int:
+    return sum(max(lengths[index] for index in batch) * len(batch) for batch in batches)
+
+
+def timed(embeddings, texts) -> tuple:
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(texts))
+    return vectors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-batch-tokens", type=int, default=16384)
+    args = parser.parse_args()
+
+    texts = corpus(args.size, np.random.default_rng(0))
+
+    static = HuggingFaceEmbeddings(
+        model_name=args.model,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"batch_size": args.batch_size},
+    )
+    bucketed = BucketedHuggingFaceEmbeddings(
+        model_name=args.model,
+        model_kwargs={"device": "cpu"},
+        max_batch_tokens=args.max_batch_tokens,
+    )
+
+    # warm up both, the model is shared
+    static.embed_documents(texts[:8])
+    bucketed.embed_documents(texts[:8])
+
+    lengths = bucketed.token_lengths(texts)
+    # sentence transformers sorts each call by characters length before its static batches
+    by_characters = np.argsort([-len(text) for text in texts], kind="stable").tolist()
+    static_batches = [
+        by_characters[start : start + args.batch_size]
+        for start in range(0, len(texts), args.batch_size)
+    ]
+    budget_batches = token_budget_batches(
+        lengths, args.max_batch_tokens, bucketed.max_batch_size
+    )
+
+    expected, static_time = timed(static, texts)
+    found, bucketed_time = timed(bucketed, texts)
+    assert np.allclose(expected, found, atol=1e-4), "embeddings differ"
+
+    useful = sum(lengths)
+    for name, batches, elapsed in (
+        ("static", static_batches, static_time),
+        ("bucketed", budget_batches, bucketed_time),
+    ):
+        padded = padded_tokens(batches, lengths)
+        print(
+            f"{name:<9} {len(batches):>5} batches {len(texts) / elapsed:>8.1f} texts/s "
+            f"padding {1 - useful / padded:>6.1%} of {padded} tokens"
+        )
+    print(f"speedup x{static_time / bucketed_time:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark of the numpy vector store IVF index
+
+Compare the recall@k and the latency of the IVF index, for several nprobe values, with the exact search,
+on synthetic clustered vectors.
+
+Usage: python benchmarks/ivf_benchmark.py [--size 200000] [--dimension 384] [--nlist 1024]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from eurelis_kb_framework.vectorstores.numpy.numpy_vector_store import NumpyVectorStore
+
+
+def clustered_vectors(
+    size: int, dimension: int, clusters: int, rng: np.random.Generator
+) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    labels = rng.integers(0, clusters, size)
+    return centers[labels] + 0.6 * rng.normal(size=(size, dimension)).astype(np.float32)
+
+
+def timed_search(store: NumpyVectorStore, queries: np.ndarray, k: int, **kwargs):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append(
+            [
+                doc.metadata["row"]
+                for doc in store.similarity_search_by_vector(query, k, **kwargs)
+            ]
+        )
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def fill(store: NumpyVectorStore, vectors: np.ndarray, batch_size: int = 10_000):
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start : start + batch_size]
+        store.add_embeddings(
+            [""] * len(batch),
+            batch,
+            [{"row": row} for row in range(start, start + len(batch))],
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = clustered_vectors(args.size, args.dimension, 2_000, rng)
+    queries = vectors[rng.choice(args.size, args.queries, replace=False)]
+    queries = queries + 0.3 * rng.normal(size=queries.shape).astype(np.float32)
+
+    exact_store = NumpyVectorStore(embedding=None)  # type: ignore[arg-type]
+    fill(exact_store, vectors)
+
+    ivf_store = NumpyVectorStore(
+        embedding=None,  # type: ignore[arg-type]
+        index={"type": "ivf", "nlist": args.nlist},
+    )
+    start = time.perf_counter()
+    fill(ivf_store, vectors)
+    print(
+        f"{args.size} vectors of dimension {args.dimension}, IVF index with {args.nlist} lists "
+        f"built in {time.perf_counter() - start:.1f} s"
+    )
+
+    exact, exact_latency = timed_search(exact_store, queries, args.k)
+    print(
+        f"{'exact':>12} recall@{args.k} 1.000 latency {exact_latency * 1000:>8.2f} ms"
+    )
+
+    for nprobe in (1, 4, 8, 16, 32, 64, 128):
+        if nprobe > args.nlist:
+            break
+        approximate, latency = timed_search(ivf_store, queries, args.k, nprobe=nprobe)
+        recall = np.mean(
+            [
+                len(set(expected) & set(found)) / len(expected)
+                for expected, found in zip(exact, approximate)
+            ]
+        )
+        print(
+            f"nprobe {nprobe:>5} recall@{args.k} {recall:.3f} latency {latency * 1000:>8.2f} ms "
+            f"x{exact_latency / latency:>6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,52 @@
+import re
+from typing import Iterable, Optional
+
 from eurelis_kb_framework.text_transformers import TextTransformer
 
 
+def _trie_pattern(keys: Iterable[str]) -> str:
+    """
+    Build a regular expression matching any of the given keys
+
+    Keys are stored in a character trie which is then serialized as nested groups, so the regex
+    engine never backtracks over a shared prefix, longest keys are preferred
+
+    Args:
+        keys: the strings to match
+
+    Returns:
+        str: the regular expression
+    """
+    trie: dict = {}
+    for key in keys:
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[""] = True  # end of key marker
+
+    def serialize(node: dict) -> str:
+        is_end = "" in node
+        branches = [
+            re.escape(char) + serialize(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+
+        if not branches:
+            return ""
+
+        if len(branches) == 1:
+            pattern = branches[0]
+            group = f"(?:{pattern})" if len(pattern) > 1 else pattern
+        else:
+            group = "(?:" + "|".join(branches) + ")"
+
+        # the optional group is greedy: longer keys are tried first
+        return f"{group}?" if is_end else group
+
+    return serialize(trie)
+
+
 class AcronymsTextTransformer(TextTransformer):
     """
     Acronyms text transformer
@@ -16,13 +62,23 @@ class AcronymsTextTransformer(TextTransformer):
 
         self._acronyms: dict[str, str] = acronyms
 
+        # single matcher for every acronym, compiled once
+        self._pattern: Optional[re.Pattern] = (
+            re.compile(rf"\b(?:{_trie_pattern(key for key in acronyms if key)})\b")
+            if any(acronyms)
+            else None
+        )
+
+    def _replace(self, match: re.Match) -> str:
+        key = match.group(0)
+        return f"{key} ({self._acronyms[key]})"
+
     def transform(self, text: str) -> str:
         if not text:
             return ""
 
-        import re
-
-        for key, value in self._acronyms.items():
-            text = re.sub(rf"\b{key}\b", f"{key} ({value})", text)
+        if not self._pattern:
+            return text
 
-        return text
+        # one linear pass over the text, expansions are never rescanned
+        return self._pattern.sub(self._replace, text)
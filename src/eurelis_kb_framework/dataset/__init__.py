@@ -10,6 +10,7 @@ from eurelis_kb_framework.base_factory import (
     JSON,
 )
 from eurelis_kb_framework.dataset.dataset import Dataset
+from eurelis_kb_framework.document_loaders.sql.sql_loader import SQLLoader
 from eurelis_kb_framework.types import FACTORY
 from eurelis_kb_framework.utils import parse_param_value
 
@@ -199,6 +200,16 @@ class DatasetFactory(ParamsDictFactory[Dataset]):
         self._handle_output(instance)
         self._handle_index(instance)
 
+        if (
+            isinstance(loader, SQLLoader)
+            and loader.watermark_column
+            and instance.cleanup == "full"
+        ):
+            # an incremental load only yields new rows, a full cleanup would delete the other ones
+            raise ValueError(
+                f"Dataset {instance.id} uses a sql watermark, incompatible with the 'full' cleanup method"
+            )
+
         return instance
 
     @staticmethod
@@ -203,11 +203,22 @@ class Dataset(BaseLoader):
 
         """
         with open(path) as json_file:
-            doc_json = json.load(json_file)
-            page_content = doc_json.get("page_content")
-            metadata = doc_json.get("metadata")
+            return Dataset.document_from_json(json.load(json_file))
 
-            return Document(page_content=page_content, metadata=metadata)
+    @staticmethod
+    def document_from_json(doc_json: Mapping[str, Any]) -> Document:
+        """
+        Helper method to build a document from its json cache representation
+        Args:
+            doc_json: dictionary with page_content and metadata keys
+
+        Returns:
+            langchain document object
+
+        """
+        return Document(
+            page_content=doc_json["page_content"], metadata=doc_json.get("metadata")
+        )
 
     def _write_document_as_cache(self, document: Document):
         """
@@ -13,4 +13,6 @@ class GenericLoaderFactory(ProviderFactory[BaseLoader]):
         "fs": "eurelis_kb_framework.document_loaders.fs.FSLoaderFactory",
         "list": "eurelis_kb_framework.document_loaders.list.ListLoaderFactory",
         "sitemap": "eurelis_kb_framework.document_loaders.sitemap.SitemapDocumentLoaderFactory",
+        "archive": "eurelis_kb_framework.document_loaders.archive.ArchiveLoaderFactory",
+        "sql": "eurelis_kb_framework.document_loaders.sql.SQLLoaderFactory",
     }
@@ -0,0 +1,43 @@
+from typing import TYPE_CHECKING
+
+from langchain.document_loaders.base import BaseLoader
+
+from eurelis_kb_framework.document_loaders.fs import FSLoaderFactory
+
+if TYPE_CHECKING:
+    from eurelis_kb_framework.langchain_wrapper import BaseContext
+
+
+class ArchiveLoaderFactory(FSLoaderFactory):
+    """
+    Archive Loader Factory, read zip and tar members as in-memory blobs instead of extracting them
+    """
+
+    OPTIONAL_PARAMS = {"glob", "exclude", "suffixes"}
+
+    def build(self, context: "BaseContext") -> BaseLoader:
+        """
+        Construct the document loader
+
+        Args:
+            context: the context object, usually the current langchain wrapper instance
+
+        Returns:
+            document loader
+
+        """
+        from langchain_community.document_loaders.generic import GenericLoader
+        from langchain_community.document_loaders.parsers.registry import get_parser
+        from eurelis_kb_framework.document_loaders.archive.archive_loader import (
+            ArchiveBlobLoader,
+        )
+
+        if not self.path:
+            raise ValueError("Missing required path parameter for archive loader")
+
+        arguments = self._process_parser_data(context, {})
+        parser = arguments.get("parser", get_parser("default"))
+
+        blob_loader = ArchiveBlobLoader(self.path, **self.get_optional_params())  # type: ignore[arg-type]
+
+        return GenericLoader(blob_loader, parser)  # type: ignore[arg-type]
@@ -0,0 +1,153 @@
+import mimetypes
+import os.path
+import tarfile
+import zipfile
+from fnmatch import fnmatchcase
+from pathlib import PurePosixPath
+from typing import Iterable, Optional, Sequence, Tuple, Iterator
+
+from langchain_community.document_loaders import Blob
+from langchain_community.document_loaders.blob_loaders import BlobLoader
+
+
+def _match_parts(parts: Sequence[str], pattern_parts: Sequence[str]) -> bool:
+    """
+    Helper function to match path segments against glob segments, '**' matches zero or more segments
+    Args:
+        parts: path segments
+        pattern_parts: glob segments
+
+    Returns:
+        True if the segments match
+    """
+    if not pattern_parts:
+        return not parts
+
+    if pattern_parts[0] == "**":
+        return any(
+            _match_parts(parts[index:], pattern_parts[1:])
+            for index in range(len(parts) + 1)
+        )
+
+    return bool(parts) and (
+        fnmatchcase(parts[0], pattern_parts[0])
+        and _match_parts(parts[1:], pattern_parts[1:])
+    )
+
+
+def _match_glob(name: str, pattern: str) -> bool:
+    """
+    Helper function to match an archive member name against a glob pattern, mimics Path.glob behavior
+    Args:
+        name: the member name, using '/' separators
+        pattern: the glob pattern
+
+    Returns:
+        True if the name match the pattern
+    """
+    return _match_parts(PurePosixPath(name).parts, pattern.split("/"))
+
+
+class ArchiveBlobLoader(BlobLoader):
+    """
+    Blob loader iterating over zip or tar archive members without extracting them to the disk
+    """
+
+    def __init__(
+        self,
+        path: str,
+        glob: str = "**/[!.]*",
+        exclude: Sequence[str] = (),
+        suffixes: Optional[Sequence[str]] = None,
+    ):
+        """
+        Constructor
+        Args:
+            path: path of the archive (zip, tar, tar.gz, tar.bz2, tar.xz)
+            glob: glob pattern members should match
+            exclude: list of patterns to exclude members
+            suffixes: list of suffixes members should have, default to any
+        """
+        self.path = path
+        self.glob = glob
+        self.exclude = exclude
+        self.suffixes = suffixes
+
+    def _is_selected(self, name: str) -> bool:
+        """
+        Helper method to apply the same filters as the file system blob loader
+        Args:
+            name: member name
+
+        Returns:
+            True if the member should be loaded
+        """
+        if not _match_glob(name, self.glob):
+            return False
+
+        member_path = PurePosixPath(name)
+
+        if self.exclude and any(member_path.match(glob) for glob in self.exclude):
+            return False
+
+        if self.suffixes and member_path.suffix not in self.suffixes:
+            return False
+
+        return True
+
+    def _iterate_zip(self) -> Iterator[Tuple[str, bytes]]:
+        """
+        Helper method to iterate over zip members, one member is held in memory at a time
+        Yields:
+            member name and content
+        """
+        with zipfile.ZipFile(self.path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not self._is_selected(info.filename):
+                    continue
+
+                with archive.open(info) as member_fp:
+                    yield info.filename, member_fp.read()
+
+    def _iterate_tar(self) -> Iterator[Tuple[str, bytes]]:
+        """
+        Helper method to iterate over tar members, the archive is read as a stream (no seek)
+        Yields:
+            member name and content
+        """
+        with tarfile.open(self.path, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile() or not self._is_selected(member.name):
+                    continue
+
+                member_fp = archive.extractfile(member)
+                if not member_fp:
+                    continue
+
+                with member_fp:
+                    yield member.name, member_fp.read()
+
+    def yield_blobs(
+        self,
+    ) -> Iterable[Blob]:
+        """
+        Yield blobs for archive members matching the requested patterns
+
+        Blob path is the archive path joined with the member name, so parsers computing a
+        path relative to the loader path will get the member name
+        """
+        iterator = (
+            self._iterate_zip()
+            if zipfile.is_zipfile(self.path)
+            else self._iterate_tar()
+        )
+
+        for name, data in iterator:
+            member_path = os.path.join(self.path, name)
+            mime_type, _ = mimetypes.guess_type(name)
+
+            yield Blob.from_data(
+                data,
+                mime_type=mime_type,
+                path=member_path,
+            )
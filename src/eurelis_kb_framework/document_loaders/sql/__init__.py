@@ -0,0 +1,109 @@
+from typing import TYPE_CHECKING
+
+from langchain.document_loaders.base import BaseLoader
+
+from eurelis_kb_framework.base_factory import ParamsDictFactory
+from eurelis_kb_framework.document_loaders.sql.sql_loader import SQLLoader
+
+if TYPE_CHECKING:
+    from eurelis_kb_framework.langchain_wrapper import BaseContext
+
+
+class SQLLoaderFactory(ParamsDictFactory[BaseLoader]):
+    """
+    SQL loader factory, stream rows from a relational database using sqlalchemy
+    """
+
+    OPTIONAL_PARAMS = {
+        "page_content_columns",
+        "metadata_columns",
+        "source_column",
+        "fetch_size",
+        "watermark_column",
+        "watermark_file",
+    }
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        super().__init__()
+        self.url = None
+        self.query = None
+
+    def set_url(self, url: str):
+        """
+        Setter for the url parameter
+        Args:
+            url: sqlalchemy database url (ie: sqlite:///data.db)
+
+        Returns:
+
+        """
+        self.url = url
+
+    def set_query(self, query: str):
+        """
+        Setter for the query parameter
+        Args:
+            query: select query to fetch rows from
+
+        Returns:
+
+        """
+        self.query = query
+
+    def set_table(self, table: str):
+        """
+        Setter for the table parameter, shortcut to select every row of a table
+        Args:
+            table: name of the table
+
+        Returns:
+
+        """
+        self.query = f"SELECT * FROM {table}"
+
+    def set_watermark(self, watermark: dict):
+        """
+        Setter for the watermark parameter
+        Args:
+            watermark: dictionary with a 'column' and a 'file' key
+
+        Returns:
+
+        """
+        if not isinstance(watermark, dict):
+            raise ValueError(
+                f"Bad watermark value, expecting a dict, got {type(watermark)}"
+            )
+
+        self.params["watermark_column"] = watermark.get("column")
+        self.params["watermark_file"] = watermark.get(
+            "file", "sql_loader_watermark.json"
+        )
+
+    def build(self, context: "BaseContext") -> BaseLoader:
+        """
+        Construct the sql document loader
+
+        Args:
+            context: the context object, usually the current langchain wrapper instance
+
+        Returns:
+            a document loader
+        """
+        missing_parameters = []
+        if not self.url:
+            missing_parameters.append("url")
+        if not self.query:
+            missing_parameters.append("query")
+
+        if missing_parameters:
+            raise ValueError(
+                f"SQL document loader is missing following required parameters: {str(missing_parameters)}"
+            )
+
+        parameters = self.get_optional_params()
+
+        return SQLLoader(self.url, self.query, **parameters)  # type: ignore[arg-type]
@@ -0,0 +1,300 @@
+import hashlib
+import json
+import os.path
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from langchain.document_loaders.base import BaseLoader
+from langchain.schema import Document
+
+
+class SQLLoader(BaseLoader):
+    """
+    SQL loader class, stream rows from a query using a server side cursor and map them to documents
+
+    With a watermark column, only rows at or after the last committed watermark are loaded. The watermark
+    of a complete run is kept pending until commit_watermark is called, by the indexing run once the
+    documents are indexed, so other readers of the documents never move it
+    """
+
+    WATERMARK_ALIAS = "kbf_watermark_source"
+
+    def __init__(
+        self,
+        url: str,
+        query: str,
+        page_content_columns: Optional[Sequence[str]] = None,
+        metadata_columns: Optional[Sequence[str]] = None,
+        source_column: Optional[str] = None,
+        fetch_size: int = 1000,
+        watermark_column: Optional[str] = None,
+        watermark_file: Optional[str] = None,
+    ):
+        """
+        Constructor
+        Args:
+            url (str): sqlalchemy database url
+            query (str): the select query to fetch rows from
+            page_content_columns (Sequence[str], optional): columns to build the page content from,
+                default to all columns
+            metadata_columns (Sequence[str], optional): columns to put in the metadata, default to all columns
+                not used for the page content
+            source_column (str, optional): column to use as 'source' metadata value
+            fetch_size (int): number of rows fetched from the cursor at a time
+            watermark_column (str, optional): column used for incremental loading (ie: updated_at or id)
+            watermark_file (str, optional): json file to store the last seen watermark value in, shared
+                by loaders, each url, query and watermark column has its own state
+        """
+        if fetch_size < 1:
+            raise ValueError("fetch_size must be at least one")
+
+        if watermark_column and not watermark_file:
+            raise ValueError("A watermark_file is required to use a watermark_column")
+
+        self.url = url
+        self.query = query
+        self.page_content_columns = page_content_columns
+        self.metadata_columns = metadata_columns
+        self.source_column = source_column
+        self.fetch_size = fetch_size
+        self.watermark_column = watermark_column
+        self.watermark_file = watermark_file
+        # last watermark value and hashes of its rows, from the last complete run
+        self._pending_watermark: Optional[Tuple[Any, Set[str]]] = None
+
+    def _watermark_key(self) -> str:
+        """
+        Helper method to get the key of the loader state in the watermark file, hashed to keep
+        credentials of the url out of the file
+        Returns:
+            the key
+        """
+        return hashlib.sha256(
+            json.dumps([self.url, self.query, self.watermark_column]).encode("utf-8")
+        ).hexdigest()
+
+    @staticmethod
+    def _row_hash(row: Mapping[Any, Any]) -> str:
+        """
+        Helper method to identify a row, to skip the rows already loaded with the last watermark value
+        """
+        return hashlib.sha1(
+            json.dumps(dict(row), sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def _read_watermark(self) -> Tuple[Optional[Any], Set[str]]:
+        """
+        Helper method to read the last seen watermark value for the loader
+        Returns:
+            the watermark value or None if no previous run was recorded, and the hashes of the rows
+            loaded with this value
+        """
+        if not self.watermark_file or not os.path.isfile(self.watermark_file):
+            return None, set()
+
+        with open(self.watermark_file) as watermark_fp:
+            watermarks = json.load(watermark_fp)
+
+        watermark = watermarks.get(self._watermark_key())
+        if not watermark:
+            return None, set()
+
+        value = watermark.get("value")
+        value_type = watermark.get("type")
+        seen = set(watermark.get("rows", []))
+
+        if value_type == "datetime":
+            return datetime.fromisoformat(value), seen
+        elif value_type == "date":
+            return date.fromisoformat(value), seen
+        elif value_type == "Decimal":
+            return Decimal(value), seen
+
+        return value, seen
+
+    def _write_watermark(self, value: Any, rows: Set[str]):
+        """
+        Helper method to store the last seen watermark value for the loader
+        Args:
+            value: the watermark value
+            rows: hashes of the rows loaded with this value
+
+        Returns:
+
+        """
+        if not self.watermark_file:
+            return
+
+        watermarks: Dict[str, Any] = {}
+        if os.path.isfile(self.watermark_file):
+            with open(self.watermark_file) as watermark_fp:
+                watermarks = json.load(watermark_fp)
+
+        watermark: Dict[str, Any]
+        if isinstance(value, datetime):
+            watermark = {"value": value.isoformat(), "type": "datetime"}
+        elif isinstance(value, date):
+            watermark = {"value": value.isoformat(), "type": "date"}
+        elif isinstance(value, (str, int, float, bool)):
+            watermark = {"value": value, "type": type(value).__name__}
+        else:
+            # Decimal and other driver types, read back as a string unless handled by _read_watermark
+            watermark = {"value": str(value), "type": type(value).__name__}
+        watermark["rows"] = sorted(rows)
+
+        watermarks[self._watermark_key()] = watermark
+
+        os.makedirs(
+            Path(os.path.dirname(os.path.abspath(self.watermark_file))), exist_ok=True
+        )
+
+        # write to a temporary file first so an interrupted run can't corrupt the state
+        tmp_file = f"{self.watermark_file}.tmp"
+        with open(tmp_file, "w") as watermark_fp:
+            json.dump(watermarks, watermark_fp)
+        os.replace(tmp_file, self.watermark_file)
+
+    def _build_statement(self, watermark: Optional[Any]):
+        """
+        Helper method to build the statement to execute
+        Args:
+            watermark: last seen watermark value, None for a full load
+
+        Returns:
+            sqlalchemy text clause and its bound parameters
+        """
+        from sqlalchemy import text
+
+        if not self.watermark_column:
+            return text(self.query), {}
+
+        # wrap the query to filter and order it on the watermark column, rows sharing the last value
+        # are read again as later rows may have the same value, loaded ones are skipped by lazy_load
+        statement = f"SELECT * FROM ({self.query}) AS {SQLLoader.WATERMARK_ALIAS}"
+        params = {}
+        if watermark is not None:
+            statement += f" WHERE {self.watermark_column} >= :kbf_watermark"
+            params["kbf_watermark"] = watermark
+        statement += f" ORDER BY {self.watermark_column}"
+
+        return text(statement), params
+
+    def _row_to_document(self, row: Mapping[Any, Any]) -> Document:
+        """
+        Helper method to map a row to a document
+        Args:
+            row: mapping between column names and values
+
+        Returns:
+            a document
+        """
+        content_columns = (
+            self.page_content_columns if self.page_content_columns else list(row.keys())
+        )
+        metadata_columns = (
+            self.metadata_columns
+            if self.metadata_columns is not None
+            else [column for column in row.keys() if column not in content_columns]
+        )
+
+        if len(content_columns) == 1:
+            page_content = str(row[content_columns[0]])
+        else:
+            page_content = "\n".join(
+                f"{column}: {row[column]}" for column in content_columns
+            )
+
+        metadata = {}
+        for column in metadata_columns:
+            value = row[column]
+            # keep metadata values json friendly
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            elif value is not None and not isinstance(value, (str, int, float, bool)):
+                value = str(value)
+            metadata[column] = value
+
+        if self.source_column:
+            metadata["source"] = str(row[self.source_column])
+
+        return Document(page_content=page_content, metadata=metadata)
+
+    def lazy_load(
+        self,
+    ) -> Iterator[Document]:
+        """
+        Lazy load method, the watermark is only kept pending once every row has been consumed,
+        see commit_watermark
+        Returns:
+            iterator over documents
+        """
+        from sqlalchemy import create_engine
+
+        engine = create_engine(self.url)
+
+        self._pending_watermark = None
+        watermark, seen = self._read_watermark()
+        last_watermark = None
+        # hashes of the rows with the last watermark value
+        last_rows: Set[str] = set()
+
+        statement, params = self._build_statement(watermark)
+
+        try:
+            with engine.connect() as connection:
+                # stream_results enables server side cursors on backends supporting them
+                result = connection.execution_options(
+                    stream_results=True, yield_per=self.fetch_size
+                ).execute(statement, params)
+
+                for partition in result.mappings().partitions(self.fetch_size):
+                    for row in partition:
+                        if self.watermark_column:
+                            value = row[self.watermark_column]
+                            row_hash = SQLLoader._row_hash(row)
+                            if value != last_watermark:
+                                last_watermark = value
+                                last_rows = set(seen) if value == watermark else set()
+                            if value == watermark and row_hash in seen:
+                                continue
+                            last_rows.add(row_hash)
+                        yield self._row_to_document(row)
+        finally:
+            engine.dispose()
+
+        if last_watermark is not None:
+            self._pending_watermark = (last_watermark, last_rows)
+
+    def commit_watermark(self):
+        """
+        Store the watermark of the last complete run, to be called once its documents are indexed
+
+        Returns:
+
+        """
+        if self._pending_watermark is None:
+            return
+
+        value, rows = self._pending_watermark
+        self._write_watermark(value, rows)
+        self._pending_watermark = None
+
+    def load(self) -> List[Document]:
+        """
+        Load method
+        Returns:
+            list of documents
+        """
+        return list(self.lazy_load())
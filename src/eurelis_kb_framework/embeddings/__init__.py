@@ -1,8 +1,12 @@
-from typing import Mapping, Union
+from typing import Mapping, Union, TYPE_CHECKING, Optional
 
 from langchain.schema.embeddings import Embeddings
 
 from eurelis_kb_framework.base_factory import ProviderFactory
+from eurelis_kb_framework.types import JSON
+
+if TYPE_CHECKING:
+    from eurelis_kb_framework.langchain_wrapper import BaseContext
 
 
 class GenericEmbeddingsFactory(ProviderFactory[Embeddings]):
@@ -15,3 +19,129 @@ class GenericEmbeddingsFactory(ProviderFactory[Embeddings]):
         "openai": "eurelis_kb_framework.embeddings.openai.OpenAIEmbeddingsFactory",
         "huggingface": "eurelis_kb_framework.embeddings.huggingface.HuggingFaceEmbeddingsFactory",
     }
+
+    def __init__(self):
+        super().__init__()
+        self.cache: Optional[dict] = None
+        self.dimension: Optional[int] = None
+        self.reduce: Optional[dict] = None
+
+    def set_cache(self, cache: JSON):
+        """
+        Setter for the query embeddings cache parameter
+        Args:
+            cache: either a boolean or a dictionary with optional max_size, path, disk_max_size and dtype keys
+
+        Returns:
+
+        """
+        if isinstance(cache, bool):
+            self.cache = {} if cache else None
+        elif isinstance(cache, dict):
+            self.cache = cache.copy()
+        else:
+            raise ValueError(
+                f"Bad cache value, expecting a boolean or a dict, got {type(cache)}"
+            )
+
+    def set_dimension(self, dimension: int):
+        """
+        Setter for the dimension parameter, output dimension of the model, needed by some vector stores
+        Args:
+            dimension: dimension of the embeddings, known models and probed dimensions are used if not provided
+
+        Returns:
+
+        """
+        self.dimension = int(dimension)
+
+    def set_reduce(self, reduce: JSON):
+        """
+        Setter for the reduce parameter, reduce the dimension of documents and queries embeddings
+        Args:
+            reduce: dictionary with a dimension key and optional method (truncate or pca), path (npz file
+                of the pca projection) and normalize keys
+
+        Returns:
+
+        """
+        if not isinstance(reduce, dict):
+            raise ValueError(f"Bad reduce value, expecting a dict, got {type(reduce)}")
+        if not isinstance(reduce.get("dimension"), int):
+            raise ValueError("The reduce parameter needs an integer dimension")
+
+        method = reduce.get("method", "truncate")
+        if method not in ("truncate", "pca"):
+            raise ValueError(f"Unknown reduce method {method}, use truncate or pca")
+        if method == "pca" and not reduce.get("path"):
+            raise ValueError("The pca reduce method needs a path to the projection")
+
+        self.reduce = reduce.copy()
+
+    def _model_identifier(self) -> str:
+        """
+        Helper method to identify the embeddings model, used as part of the cache key
+        Returns:
+            str: provider and model name, with the reduction and the pca projection fingerprint if any
+        """
+        model = self.params.get(
+            "model", self.params.get("model_name", self.params.get("deployment", ""))
+        )
+        identifier = f"{self.params.get('provider')}:{model}"
+
+        if self.reduce is not None:
+            # reduced query embeddings are cached apart from the full ones
+            identifier = f"{identifier}:{self.reduce.get('method', 'truncate')}{self.reduce['dimension']}"
+            if self.reduce.get("path") and self.reduce.get("method") == "pca":
+                from eurelis_kb_framework.embeddings.reduction import (
+                    projection_fingerprint,
+                )
+
+                # queries reduced by a previous fit of the projection are not served
+                identifier = (
+                    f"{identifier}:{projection_fingerprint(self.reduce['path'])}"
+                )
+
+        return identifier
+
+    def build(self, context: "BaseContext") -> Embeddings:
+        """
+        Construct the embeddings object, wrapped in a dimension reduction and a query cache if configured
+
+        Args:
+            context: the context object, usually the current langchain wrapper instance
+
+        Returns:
+            embeddings
+        """
+        embeddings = super().build(context)
+
+        if self.dimension:
+            from eurelis_kb_framework.embeddings.dimensions import register_dimension
+
+            register_dimension(embeddings, self.dimension)
+
+        if self.reduce is not None:
+            from eurelis_kb_framework.embeddings.reduction import ReducedEmbeddings
+
+            embeddings = ReducedEmbeddings(
+                embeddings,
+                self.reduce["dimension"],
+                method=self.reduce.get("method", "truncate"),
+                path=self.reduce.get("path"),
+                normalize=self.reduce.get("normalize", True),
+            )
+
+        if self.cache is None:
+            return embeddings
+
+        from eurelis_kb_framework.embeddings.cache import QueryCacheEmbeddings
+
+        return QueryCacheEmbeddings(
+            embeddings,
+            self._model_identifier(),
+            max_size=self.cache.get("max_size", 1024),
+            path=self.cache.get("path"),
+            disk_max_size=self.cache.get("disk_max_size", 100_000),
+            dtype=self.cache.get("dtype", "float64"),
+        )
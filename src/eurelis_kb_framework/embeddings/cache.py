@@ -0,0 +1,281 @@
+import os.path
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple, Sequence
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+
+# prefix of the keys of queries embedded in a batch, with embed_documents, normalized queries never
+# contain a tab so they do not collide with embed_query keys
+BATCH_KEY_PREFIX = "doc\t"
+
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize a query before using it as a cache key, collapse whitespaces
+    Args:
+        text: the query
+
+    Returns:
+        normalized query
+    """
+    return " ".join(text.split())
+
+
+class QueryCacheEmbeddings(Embeddings):
+    """
+    Embeddings wrapper keeping a bounded LRU cache of query embeddings, optionally shared on disk
+
+    Only embed_query is cached, documents embeddings are forwarded to the wrapped embeddings.
+    Cached embeddings are stored as numpy arrays of the configured dtype, float32 or float16
+    trade some precision for a smaller cache
+    """
+
+    DISK_PRUNE_INTERVAL = 100
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        max_size: int = 1024,
+        path: Optional[str] = None,
+        disk_max_size: int = 100_000,
+        dtype: str = "float64",
+    ):
+        """
+        Constructor
+        Args:
+            embeddings: the wrapped embeddings object
+            model: model identifier, part of the cache key
+            max_size: max number of query embeddings kept in memory
+            path: optional sqlite file to share the cache between processes
+            disk_max_size: max number of query embeddings kept on disk
+            dtype: storage type of the cached embeddings, float64 (lossless), float32 or float16
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least one")
+        if dtype not in ("float64", "float32", "float16"):
+            raise ValueError(
+                f"Bad cache dtype {dtype}, use float64, float32 or float16"
+            )
+
+        self.embeddings = embeddings
+        self.model = model
+        self.max_size = max_size
+        self.disk_max_size = disk_max_size
+        self.dtype = np.dtype(dtype)
+        # embeddings stored with another dtype are not readable, the dtype is part of the disk key
+        self._disk_model = model if dtype == "float64" else f"{model}:{dtype}"
+
+        self._cache: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self._miss_latency = 0.0
+        self._disk_inserts = 0
+
+        self._connection: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(Path(os.path.dirname(os.path.abspath(path))), exist_ok=True)
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings "
+                "(model TEXT, query TEXT, embedding BLOB, PRIMARY KEY (model, query))"
+            )
+            self._connection.commit()
+
+    def _get(self, key: str) -> Optional[List[float]]:
+        """
+        Helper method to get an embedding from memory, then from disk
+        Args:
+            key: normalized query
+
+        Returns:
+            the embedding or None
+        """
+        with self._lock:
+            embedding = self._cache.get(key)
+            if embedding is not None:
+                self._cache.move_to_end(key)
+                return embedding.tolist()
+
+            if not self._connection:
+                return None
+
+            row = self._connection.execute(
+                "SELECT embedding FROM query_embeddings WHERE model = ? AND query = ?",
+                (self._disk_model, key),
+            ).fetchone()
+
+            if not row:
+                return None
+
+            embedding = np.frombuffer(row[0], dtype=self.dtype)
+            self._put_in_memory(key, embedding)
+
+            return embedding.tolist()
+
+    def _put_in_memory(self, key: str, embedding: np.ndarray):
+        """
+        Helper method to add an embedding to the memory cache, evicting the least recently used one
+        """
+        self._cache[key] = embedding
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def _put(self, key: str, embedding: List[float]):
+        """
+        Helper method to add an embedding to the memory and disk caches
+        Args:
+            key: normalized query
+            embedding: the embedding
+
+        Returns:
+
+        """
+        stored = np.asarray(embedding, dtype=self.dtype)
+
+        with self._lock:
+            self._put_in_memory(key, stored)
+
+            if not self._connection:
+                return
+
+            self._connection.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, query, embedding) VALUES (?, ?, ?)",
+                (self._disk_model, key, stored.tobytes()),
+            )
+
+            self._disk_inserts += 1
+            if self._disk_inserts % QueryCacheEmbeddings.DISK_PRUNE_INTERVAL == 0:
+                # oldest rows first
+                self._connection.execute(
+                    "DELETE FROM query_embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM query_embeddings ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_max_size,),
+                )
+
+            self._connection.commit()
+
+    def _record_misses(self, count: int, elapsed: float):
+        with self._lock:
+            self.misses += count
+            self._miss_latency += elapsed
+
+    def _record_hits(self, count: int):
+        with self._lock:
+            self.hits += count
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed documents, not cached
+        """
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embed a query, using the cache
+        """
+        key = normalize_query(text)
+
+        embedding = self._get(key)
+        if embedding is not None:
+            self._record_hits(1)
+            return embedding
+
+        start = time.perf_counter()
+        embedding = self.embeddings.embed_query(text)
+        self._record_misses(1, time.perf_counter() - start)
+
+        self._put(key, embedding)
+
+        return embedding
+
+    def embed_queries(self, texts: Sequence[str]) -> List[List[float]]:
+        """
+        Embed several queries at once, cache misses are embedded with a single embed_documents call
+
+        Models may embed documents and queries differently, the results are cached apart from the
+        embed_query ones, under keys with a "doc" prefix
+        Args:
+            texts: the queries
+
+        Returns:
+            list of embeddings, in the same order as the queries
+        """
+        keys = [BATCH_KEY_PREFIX + normalize_query(text) for text in texts]
+        results: List[Optional[List[float]]] = [self._get(key) for key in keys]
+
+        missing: List[Tuple[int, str]] = [
+            (index, texts[index])
+            for index, embedding in enumerate(results)
+            if embedding is None
+        ]
+        self._record_hits(len(texts) - len(missing))
+
+        if missing:
+            start = time.perf_counter()
+            embeddings = self.embeddings.embed_documents([text for _, text in missing])
+            self._record_misses(len(missing), time.perf_counter() - start)
+
+            for (index, _), embedding in zip(missing, embeddings):
+                results[index] = embedding
+                self._put(keys[index], embedding)
+
+        return [embedding for embedding in results if embedding is not None]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    @property
+    def stats(self) -> dict:
+        """
+        Cache statistics
+        Returns:
+            dictionary with hits, misses, hit_ratio and latency_saved (in seconds) values
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            mean_miss_latency = self._miss_latency / self.misses if self.misses else 0.0
+
+            return {
+                "model": self.model,
+                "size": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "latency_saved": self.hits * mean_miss_latency,
+            }
+
+    def set_model(self, model: str):
+        """
+        Change the model identifier of the cache key, the memory cache is cleared
+        Args:
+            model: new model identifier
+
+        Returns:
+
+        """
+        with self._lock:
+            self.model = model
+            self._disk_model = (
+                model if self.dtype == np.float64 else f"{model}:{self.dtype.name}"
+            )
+            self._cache.clear()
+
+    def clear(self):
+        """
+        Clear the memory cache and the statistics
+        """
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+            self._miss_latency = 0.0
@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from langchain.schema.embeddings import Embeddings
+
+# output dimension of well known models, by model name
+KNOWN_DIMENSIONS: Dict[str, int] = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "sentence-transformers/all-MiniLM-L12-v2": 384,
+    "sentence-transformers/all-mpnet-base-v2": 768,
+    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2": 384,
+    "sentence-transformers/paraphrase-multilingual-mpnet-base-v2": 768,
+    "sentence-transformers/distiluse-base-multilingual-cased-v2": 512,
+    "intfloat/multilingual-e5-small": 384,
+    "intfloat/multilingual-e5-base": 768,
+    "intfloat/multilingual-e5-large": 1024,
+    "intfloat/e5-small-v2": 384,
+    "intfloat/e5-base-v2": 768,
+    "intfloat/e5-large-v2": 1024,
+    "BAAI/bge-small-en-v1.5": 384,
+    "BAAI/bge-base-en-v1.5": 768,
+    "BAAI/bge-large-en-v1.5": 1024,
+    "BAAI/bge-m3": 1024,
+    "dangvantuan/sentence-camembert-base": 768,
+    "dangvantuan/sentence-camembert-large": 1024,
+}
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "eurelis_kb_framework", "dimensions.json"
+)
+
+_configured_dimensions: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def model_name(embeddings: Embeddings) -> str:
+    """
+    Helper function to get the model name of an embeddings object, wrappers are looked through
+    Args:
+        embeddings: the embeddings object
+
+    Returns:
+        the model name, the class name if the model is unknown
+    """
+    # embeddings wrappers (cache, dimension reduction) keep the wrapped object as an embeddings attribute
+    while isinstance(getattr(embeddings, "embeddings", None), Embeddings):
+        embeddings = getattr(embeddings, "embeddings")
+
+    for attribute in ("model", "model_name", "deployment"):
+        value = getattr(embeddings, attribute, None)
+        if isinstance(value, str) and value:
+            return value
+
+    return type(embeddings).__name__
+
+
+def register_dimension(embeddings: Embeddings, dimension: int):
+    """
+    Register the dimension of an embeddings model, from the configuration
+    Args:
+        embeddings: the embeddings object
+        dimension: output dimension of the model
+
+    Returns:
+
+    """
+    if dimension < 1:
+        raise ValueError(f"Bad embeddings dimension {dimension}")
+
+    with _lock:
+        _configured_dimensions[model_name(embeddings)] = dimension
+
+
+def _read_cache(cache_path: str) -> Dict[str, int]:
+    try:
+        with open(cache_path, "r", encoding="utf-8") as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def embedding_dimension(
+    embeddings: Embeddings,
+    probe: bool = True,
+    cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+) -> Optional[int]:
+    """
+    Get the output dimension of an embeddings model without any embeddings call if possible
+
+    A dimension reduction wrapper gives its output dimension, otherwise the dimension given in the
+    configuration comes first, then the known models, then the dimensions
+    probed before and cached on disk. Probing embeds a short text, its result is cached
+    Args:
+        embeddings: the embeddings object
+        probe: if the dimension is unknown, probe it with an embeddings call
+        cache_path: optional json file caching the probed dimensions
+
+    Returns:
+        the dimension, None if unknown and probe is False
+    """
+    # wrappers changing the dimension (reduction) give it as an output_dimension attribute
+    wrapped: Optional[Embeddings] = embeddings
+    while wrapped is not None:
+        output_dimension = getattr(wrapped, "output_dimension", None)
+        if isinstance(output_dimension, int):
+            return output_dimension
+        inner = getattr(wrapped, "embeddings", None)
+        wrapped = inner if isinstance(inner, Embeddings) else None
+
+    name = model_name(embeddings)
+
+    with _lock:
+        dimension = _configured_dimensions.get(name)
+    if dimension:
+        return dimension
+
+    dimension = KNOWN_DIMENSIONS.get(name)
+    if dimension:
+        return dimension
+
+    if cache_path:
+        dimension = _read_cache(cache_path).get(name)
+        if dimension:
+            return dimension
+
+    if not probe:
+        return None
+
+    dimension = len(embeddings.embed_query("dimension"))
+
+    if cache_path:
+        with _lock:
+            cached = _read_cache(cache_path)
+            cached[name] = dimension
+            os.makedirs(
+                Path(os.path.dirname(os.path.abspath(cache_path))), exist_ok=True
+            )
+            with open(cache_path, "w", encoding="utf-8") as cache_file:
+                json.dump(cached, cache_file, indent=2, sort_keys=True)
+
+    return dimension
@@ -1,15 +1,66 @@
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
 from langchain.schema.embeddings import Embeddings
 
 from eurelis_kb_framework.base_factory import ParamsDictFactory
+from eurelis_kb_framework.types import JSON
 
 if TYPE_CHECKING:
     from eurelis_kb_framework.langchain_wrapper import BaseContext
 
 
 class HuggingFaceEmbeddingsFactory(ParamsDictFactory[Embeddings]):
-    OPTIONAL_PARAMS = {"cache_folder", "encode_kwargs", "model_name", "multi_process"}
+    OPTIONAL_PARAMS = {
+        "cache_folder",
+        "encode_kwargs",
+        "model_kwargs",
+        "model_name",
+        "multi_process",
+    }
+
+    def __init__(self):
+        super().__init__()
+        self.dynamic_batching: Optional[dict] = None
+        self.worker_pool: Optional[dict] = None
+
+    def set_dynamic_batching(self, dynamic_batching: JSON):
+        """
+        Setter for the dynamic batching parameter, texts are batched by token length under a token budget
+        Args:
+            dynamic_batching: either a boolean or a dictionary with optional max_batch_tokens and
+                max_batch_size keys
+
+        Returns:
+
+        """
+        if isinstance(dynamic_batching, bool):
+            self.dynamic_batching = {} if dynamic_batching else None
+        elif isinstance(dynamic_batching, dict):
+            self.dynamic_batching = dynamic_batching.copy()
+        else:
+            raise ValueError(
+                f"Bad dynamic_batching value, expecting a boolean or a dict, got {type(dynamic_batching)}"
+            )
+
+    def set_worker_pool(self, worker_pool: JSON):
+        """
+        Setter for the worker pool parameter, documents are embedded by a pool of processes kept alive
+        during indexing
+        Args:
+            worker_pool: either a boolean or a dictionary with optional workers, threads_per_worker and
+                chunk_size keys
+
+        Returns:
+
+        """
+        if isinstance(worker_pool, bool):
+            self.worker_pool = {} if worker_pool else None
+        elif isinstance(worker_pool, dict):
+            self.worker_pool = worker_pool.copy()
+        else:
+            raise ValueError(
+                f"Bad worker_pool value, expecting a boolean or a dict, got {type(worker_pool)}"
+            )
 
     def build(self, context: "BaseContext") -> Embeddings:
         """
@@ -21,8 +72,26 @@ class HuggingFaceEmbeddingsFactory(ParamsDictFactory[Embeddings]):
         Returns:
             embeddings
         """
-        from langchain_community.embeddings import HuggingFaceEmbeddings
+        arguments = dict(self.get_optional_params())
+
+        if self.worker_pool is not None:
+            from eurelis_kb_framework.embeddings.huggingface.worker_pool import (
+                PooledHuggingFaceEmbeddings,
+            )
+
+            if arguments.get("multi_process"):
+                raise ValueError("worker_pool does not support multi_process")
+
+            return PooledHuggingFaceEmbeddings(
+                arguments,
+                dynamic_batching=self.dynamic_batching,
+                workers=self.worker_pool.get("workers"),
+                threads_per_worker=self.worker_pool.get("threads_per_worker"),
+                chunk_size=self.worker_pool.get("chunk_size", 32),
+            )
 
-        arguments = self.get_optional_params()
+        from eurelis_kb_framework.embeddings.huggingface.bucketed import (
+            huggingface_embeddings,
+        )
 
-        return HuggingFaceEmbeddings(**arguments)
+        return huggingface_embeddings(arguments, self.dynamic_batching)
@@ -0,0 +1,239 @@
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+DEFAULT_MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
+
+# loaded models of this process, by model name, cache folder and model arguments
+_models: Dict[Tuple[str, Optional[str], str], Any] = {}
+_models_lock = threading.Lock()
+
+
+def load_model(
+    model_name: str,
+    cache_folder: Optional[str] = None,
+    model_kwargs: Optional[dict] = None,
+):
+    """
+    Load a sentence transformers model once by process, the following calls get the loaded model
+    Args:
+        model_name: name or path of the model
+        cache_folder: optional folder where models are downloaded
+        model_kwargs: optional arguments of the SentenceTransformer constructor
+
+    Returns:
+        the SentenceTransformer model
+    """
+    model_kwargs = model_kwargs or {}
+    key = (model_name, cache_folder, repr(sorted(model_kwargs.items())))
+
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            try:
+                import sentence_transformers  # type: ignore[import-not-found]
+            except ImportError as exc:
+                raise ImportError(
+                    "Could not import sentence_transformers python package. "
+                    "Please install it with `pip install sentence-transformers`."
+                ) from exc
+
+            model = sentence_transformers.SentenceTransformer(
+                model_name, cache_folder=cache_folder, **model_kwargs
+            )
+            _models[key] = model
+
+    return model
+
+
+def token_budget_batches(
+    lengths: Sequence[int], max_batch_tokens: int, max_batch_size: int
+) -> List[List[int]]:
+    """
+    Group texts of similar lengths in batches whose padded size stays under a token budget
+    Args:
+        lengths: token length of each text
+        max_batch_tokens: max number of tokens of a batch, padding included
+        max_batch_size: max number of texts of a batch
+
+    Returns:
+        list of batches of text indexes, a text longer than the budget gets its own batch
+    """
+    batches: List[List[int]] = []
+    batch: List[int] = []
+
+    # ascending lengths, the last text of a batch is its padded length
+    for index in np.argsort(np.asarray(lengths), kind="stable").tolist():
+        if batch and (
+            len(batch) >= max_batch_size
+            or (len(batch) + 1) * lengths[index] > max_batch_tokens
+        ):
+            batches.append(batch)
+            batch = []
+        batch.append(index)
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+class BucketedHuggingFaceEmbeddings(Embeddings):
+    """
+    Sentence transformers embeddings batching texts by token length
+
+    A static batch size pads every text to the longest one of its batch, with chunks of very different
+    lengths most of the computation is spent on padding. Texts are tokenized first, sorted by length and
+    grouped in batches under a token budget, so short texts go in large batches and long texts in small
+    ones, then the embeddings are put back in the order of the texts.
+
+    The model is loaded once by process and shared by the instances using the same model
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL_NAME,
+        cache_folder: Optional[str] = None,
+        model_kwargs: Optional[dict] = None,
+        encode_kwargs: Optional[dict] = None,
+        max_batch_tokens: int = 16384,
+        max_batch_size: Optional[int] = None,
+    ):
+        """
+        Constructor
+        Args:
+            model_name: name or path of the model
+            cache_folder: optional folder where models are downloaded
+            model_kwargs: optional arguments of the SentenceTransformer constructor
+            encode_kwargs: optional arguments of the encode method, a batch_size is the default max_batch_size
+            max_batch_tokens: max number of tokens of a batch, padding included
+            max_batch_size: max number of texts of a batch, default to 256
+        """
+        if max_batch_tokens < 1:
+            raise ValueError("max_batch_tokens must be at least one")
+
+        self.model_name = model_name
+        self.cache_folder = cache_folder
+        self.model_kwargs = dict(model_kwargs or {})
+        self.encode_kwargs = dict(encode_kwargs or {})
+        self.max_batch_tokens = max_batch_tokens
+        batch_size = self.encode_kwargs.pop("batch_size", 256)
+        # batches are always converted to numpy arrays to be reordered, and encoded without progress bar
+        self.encode_kwargs.pop("convert_to_numpy", None)
+        self.encode_kwargs.pop("show_progress_bar", None)
+        self.max_batch_size = max_batch_size or batch_size
+
+        self.client = load_model(model_name, cache_folder, self.model_kwargs)
+
+    def token_lengths(self, texts: Sequence[str]) -> List[int]:
+        """
+        Token length of texts, truncated to the model max sequence length
+        Args:
+            texts: the texts
+
+        Returns:
+            list of lengths
+        """
+        max_length = getattr(self.client, "max_seq_length", None) or 512
+        tokenizer = getattr(self.client, "tokenizer", None)
+
+        if tokenizer is None:
+            # models without tokenizer, about four characters by token
+            return [min(len(text) // 4 + 2, max_length) for text in texts]
+
+        encoded = tokenizer(
+            list(texts),
+            add_special_tokens=True,
+            truncation=True,
+            max_length=max_length,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Helper method to embed texts batched by token length
+        Returns:
+            array of embeddings, in the order of the texts
+        """
+        texts = [text.replace("\n", " ") for text in texts]
+        lengths = self.token_lengths(texts)
+
+        embeddings: Optional[np.ndarray] = None
+        for batch in token_budget_batches(
+            lengths, self.max_batch_tokens, self.max_batch_size
+        ):
+            batch_embeddings = self.client.encode(
+                [texts[index] for index in batch],
+                batch_size=len(batch),
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                **self.encode_kwargs,
+            )
+            if embeddings is None:
+                embeddings = np.empty(
+                    (len(texts), batch_embeddings.shape[1]),
+                    dtype=batch_embeddings.dtype,
+                )
+            embeddings[batch] = batch_embeddings
+
+        return embeddings if embeddings is not None else np.empty((0, 0))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Compute documents embeddings
+        Args:
+            texts: the texts to embed
+
+        Returns:
+            list of embeddings, one for each text
+        """
+        if not texts:
+            return []
+
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Compute a query embeddings
+        Args:
+            text: the text to embed
+
+        Returns:
+            embeddings of the text
+        """
+        return self._embed([text])[0].tolist()
+
+
+def huggingface_embeddings(
+    arguments: dict, dynamic_batching: Optional[dict] = None
+) -> Embeddings:
+    """
+    Build HuggingFace embeddings in this process
+    Args:
+        arguments: arguments of the langchain HuggingFaceEmbeddings
+        dynamic_batching: optional dictionary with max_batch_tokens and max_batch_size keys, texts are
+            batched by token length if provided
+
+    Returns:
+        embeddings
+    """
+    if dynamic_batching is None:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(**arguments)
+
+    if arguments.get("multi_process"):
+        raise ValueError("dynamic_batching does not support multi_process")
+
+    return BucketedHuggingFaceEmbeddings(
+        model_name=arguments.get("model_name", DEFAULT_MODEL_NAME),
+        cache_folder=arguments.get("cache_folder"),
+        model_kwargs=arguments.get("model_kwargs"),
+        encode_kwargs=arguments.get("encode_kwargs"),
+        max_batch_tokens=dynamic_batching.get("max_batch_tokens", 16384),
+        max_batch_size=dynamic_batching.get("max_batch_size"),
+    )
@@ -0,0 +1,203 @@
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+from eurelis_kb_framework.embeddings.huggingface.bucketed import DEFAULT_MODEL_NAME
+
+# embeddings of a worker process, loaded once by the pool initializer
+_worker_embeddings: Optional[Embeddings] = None
+
+THREADS_ENVIRONMENT = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+def _init_worker(arguments: dict, dynamic_batching: Optional[dict], threads: int):
+    """
+    Initializer of a worker process, pin the number of threads then load the model
+    """
+    global _worker_embeddings
+
+    # set before torch is imported, native thread pools read them once
+    for variable in THREADS_ENVIRONMENT:
+        os.environ[variable] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    try:
+        import torch  # type: ignore[import-not-found]
+
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        pass
+
+    from eurelis_kb_framework.embeddings.huggingface.bucketed import (
+        huggingface_embeddings,
+    )
+
+    _worker_embeddings = huggingface_embeddings(arguments, dynamic_batching)
+
+
+def _embed_in_worker(texts: List[str]) -> np.ndarray:
+    """
+    Task of a worker process, embed a chunk of texts
+    """
+    if _worker_embeddings is None:
+        raise RuntimeError("Embeddings worker is not initialized")
+
+    return np.asarray(_worker_embeddings.embed_documents(texts), dtype=np.float32)
+
+
+class PooledHuggingFaceEmbeddings(Embeddings):
+    """
+    HuggingFace embeddings computed by a pool of worker processes, for CPU only hosts
+
+    Each worker loads the model once and runs with a pinned number of threads, so that workers do not
+    oversubscribe the cores. The pool only runs between start and close, the wrapper keeps it for a whole
+    indexing run and gives it batches of workers * chunk_size documents. Each call is then split in chunks
+    embedded in parallel, embeddings are returned in the order of the texts
+
+    Queries, and documents while the pool is not started, are embedded in the current process by a model
+    loaded on first use
+    """
+
+    def __init__(
+        self,
+        arguments: dict,
+        dynamic_batching: Optional[dict] = None,
+        workers: Optional[int] = None,
+        threads_per_worker: Optional[int] = None,
+        chunk_size: int = 32,
+    ):
+        """
+        Constructor
+        Args:
+            arguments: arguments of the langchain HuggingFaceEmbeddings, used by the workers
+            dynamic_batching: optional dynamic batching parameters of the workers embeddings
+            workers: number of worker processes, default to a quarter of the cores
+            threads_per_worker: number of threads of each worker, default to the cores divided by the workers
+            chunk_size: max number of texts sent at once to a worker
+        """
+        cores = os.cpu_count() or 1
+
+        self.arguments = dict(arguments)
+        self.dynamic_batching = dynamic_batching
+        self.workers = workers or max(1, cores // 4)
+        self.threads_per_worker = threads_per_worker or max(1, cores // self.workers)
+        self.chunk_size = chunk_size
+        self.model_name = self.arguments.get("model_name", DEFAULT_MODEL_NAME)
+
+        if self.workers < 1 or self.threads_per_worker < 1 or self.chunk_size < 1:
+            raise ValueError(
+                "workers, threads_per_worker and chunk_size must be at least one"
+            )
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._local_embeddings: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+
+    @property
+    def index_batch_size(self) -> int:
+        """
+        Number of documents to give at once, enough to keep every worker busy
+        """
+        return self.workers * self.chunk_size
+
+    def start(self):
+        """
+        Start the worker processes, if not already started
+        """
+        with self._lock:
+            if self._executor is not None:
+                return
+
+            # spawned workers do not inherit the threads of the parent process
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(
+                    self.arguments,
+                    self.dynamic_batching,
+                    self.threads_per_worker,
+                ),
+            )
+
+    def close(self):
+        """
+        Stop the worker processes, a later call starts them again
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _local(self) -> Embeddings:
+        """
+        Helper method to get the embeddings of the current process, the model is loaded on first use
+        """
+        with self._lock:
+            if self._local_embeddings is None:
+                from eurelis_kb_framework.embeddings.huggingface.bucketed import (
+                    huggingface_embeddings,
+                )
+
+                self._local_embeddings = huggingface_embeddings(
+                    self.arguments, self.dynamic_batching
+                )
+
+            return self._local_embeddings
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Helper method to embed texts in chunks spread over the workers, or in the current process
+        if the pool is not started
+        Returns:
+            array of embeddings, in the order of the texts
+        """
+        executor = self._executor
+        if executor is None:
+            return np.asarray(self._local().embed_documents(texts), dtype=np.float32)
+
+        chunk_size = min(self.chunk_size, math.ceil(len(texts) / self.workers))
+        futures = [
+            executor.submit(_embed_in_worker, texts[start : start + chunk_size])
+            for start in range(0, len(texts), chunk_size)
+        ]
+
+        return np.concatenate([future.result() for future in futures])
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Compute documents embeddings
+        Args:
+            texts: the texts to embed
+
+        Returns:
+            list of embeddings, one for each text
+        """
+        if not texts:
+            return []
+
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Compute a query embeddings, in the current process
+        Args:
+            text: the text to embed
+
+        Returns:
+            embeddings of the text
+        """
+        return self._local().embed_query(text)
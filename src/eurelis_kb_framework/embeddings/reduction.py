@@ -0,0 +1,253 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+from langchain.schema.embeddings import Embeddings
+
+TRUNCATE = "truncate"
+PCA = "pca"
+
+
+def fit_pca(vectors: np.ndarray, dimension: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fit a PCA projection on a sample of embeddings
+    Args:
+        vectors: sample of embeddings, one by row
+        dimension: output dimension
+
+    Returns:
+        tuple with the mean vector and the components, one by row, by decreasing variance
+    """
+    vectors = np.asarray(vectors, dtype=np.float64)
+    if dimension > min(vectors.shape):
+        raise ValueError(
+            f"Cannot fit a {dimension} dimensions projection on {vectors.shape[0]} vectors "
+            f"of {vectors.shape[1]} dimensions"
+        )
+
+    mean = vectors.mean(axis=0)
+    _, _, components = np.linalg.svd(vectors - mean, full_matrices=False)
+
+    return mean, components[:dimension]
+
+
+def projection_fingerprint(path: str) -> str:
+    """
+    Fingerprint of a saved pca projection, part of the query cache key so a refit projection does not
+    serve queries reduced by the previous one
+    Args:
+        path: npz file of the projection
+
+    Returns:
+        short hash of the file content, "unfitted" if the file does not exist
+    """
+    if not os.path.exists(path):
+        return "unfitted"
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as projection_file:
+        for chunk in iter(lambda: projection_file.read(1 << 20), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()[:16]
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class ReducedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper reducing the dimension of the embeddings, documents and queries alike
+
+    Two methods are available:
+    - truncate keeps the first dimensions, for models trained to that end (Matryoshka representation
+      learning, like the OpenAI text-embedding-3 models), then normalizes the vectors
+    - pca projects the vectors on principal components fitted offline on a sample of the datasets and
+      saved as a npz file, see fit
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        dimension: int,
+        method: str = TRUNCATE,
+        path: Optional[str] = None,
+        normalize: bool = True,
+    ):
+        """
+        Constructor
+        Args:
+            embeddings: the wrapped embeddings object
+            dimension: output dimension
+            method: truncate or pca
+            path: npz file of the pca projection, required by the pca method
+            normalize: normalize the reduced vectors
+        """
+        if dimension < 1:
+            raise ValueError(f"Bad reduced dimension {dimension}")
+        if method not in (TRUNCATE, PCA):
+            raise ValueError(f"Unknown reduce method {method}, use truncate or pca")
+        if method == PCA and not path:
+            raise ValueError("The pca reduce method needs a path to the projection")
+
+        self.embeddings = embeddings
+        self.output_dimension = dimension
+        self.method = method
+        self.path = path
+        self.normalize = normalize
+
+        self._mean: Optional[np.ndarray] = None
+        self._components: Optional[np.ndarray] = None
+
+    def _projection(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Helper method to get the pca projection, loaded on first use
+        Returns:
+            tuple with the mean vector and the components
+        """
+        if self._mean is None or self._components is None:
+            if not self.path or not os.path.exists(self.path):
+                raise RuntimeError(
+                    f"No pca projection found at {self.path}, fit it first with 'kbf embeddings reduce'"
+                )
+
+            with np.load(self.path) as projection:
+                mean, components = projection["mean"], projection["components"]
+            if components.shape[0] != self.output_dimension:
+                raise RuntimeError(
+                    f"The pca projection at {self.path} has {components.shape[0]} dimensions, "
+                    f"expecting {self.output_dimension}"
+                )
+            self._mean, self._components = mean, components
+
+        return self._mean, self._components
+
+    def fit(self, vectors: np.ndarray):
+        """
+        Fit the pca projection on a sample of the wrapped embeddings, and save it
+        Args:
+            vectors: sample of embeddings of the wrapped model, one by row
+
+        Returns:
+
+        """
+        if self.method != PCA or not self.path:
+            raise ValueError("Only the pca reduce method is fitted")
+
+        mean, components = fit_pca(vectors, self.output_dimension)
+
+        os.makedirs(Path(os.path.dirname(os.path.abspath(self.path))), exist_ok=True)
+        with open(self.path, "wb") as projection_file:
+            np.savez(projection_file, mean=mean, components=components)
+
+        self._mean, self._components = mean, components
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Fingerprint of the pca projection, empty for the truncate method
+        """
+        if self.method != PCA or not self.path:
+            return ""
+
+        return projection_fingerprint(self.path)
+
+    def reduce(self, vectors: ArrayLike) -> np.ndarray:
+        """
+        Reduce embeddings of the wrapped model
+        Args:
+            vectors: embeddings, one by row
+
+        Returns:
+            array of reduced embeddings
+        """
+        array = np.asarray(vectors, dtype=np.float64)
+
+        if self.method == TRUNCATE:
+            if array.shape[-1] < self.output_dimension:
+                raise ValueError(
+                    f"Cannot truncate {array.shape[-1]} dimensions embeddings to {self.output_dimension}"
+                )
+            reduced = array[..., : self.output_dimension]
+        else:
+            mean, components = self._projection()
+            reduced = (array - mean) @ components.T
+
+        return _normalized(reduced) if self.normalize else reduced
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Compute reduced documents embeddings
+        Args:
+            texts: the texts to embed
+
+        Returns:
+            list of embeddings, one for each text
+        """
+        if not texts:
+            return []
+
+        return self.reduce(self.embeddings.embed_documents(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Compute a reduced query embeddings
+        Args:
+            text: the text to embed
+
+        Returns:
+            embeddings of the text
+        """
+        return self.reduce(self.embeddings.embed_query(text)).tolist()
+
+
+def recall_report(
+    reduced: ReducedEmbeddings,
+    documents: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+) -> dict:
+    """
+    Measure how much of the exact nearest neighbours the reduced embeddings find, by cosine similarity
+    Args:
+        reduced: the reduced embeddings
+        documents: embeddings of a sample of documents by the wrapped model, one by row
+        queries: embeddings of sample queries by the wrapped model, one by row
+        k: number of neighbours by query
+
+    Returns:
+        dictionary with the dimensions, the recall at k and the storage ratio
+    """
+    documents = np.asarray(documents, dtype=np.float64)
+    queries = np.asarray(queries, dtype=np.float64)
+    k = min(k, len(documents))
+
+    def top_k(query_vectors: np.ndarray, document_vectors: np.ndarray) -> np.ndarray:
+        scores = _normalized(query_vectors) @ _normalized(document_vectors).T
+        return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+    expected = top_k(queries, documents)
+    found = top_k(reduced.reduce(queries), reduced.reduce(documents))
+
+    recall = np.mean(
+        [
+            len(np.intersect1d(expected_row, found_row)) / k
+            for expected_row, found_row in zip(expected, found)
+        ]
+    )
+
+    return {
+        "method": reduced.method,
+        "dimension": documents.shape[1],
+        "reduced_dimension": reduced.output_dimension,
+        "k": k,
+        "queries": len(queries),
+        "documents": len(documents),
+        "recall": round(float(recall), 4),
+        "storage_ratio": reduced.output_dimension / documents.shape[1],
+    }
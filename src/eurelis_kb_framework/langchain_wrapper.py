@@ -9,14 +9,16 @@ from typing import (
     Optional,
     Sequence,
     Union,
-    cast,
     List,
     Iterable,
+    Iterator,
     Tuple,
+    cast,
     Callable,
     Mapping,
     TYPE_CHECKING,
     Any,
+    Dict,
 )
 
 import numpy as np
@@ -32,13 +34,35 @@ from eurelis_kb_framework.base_factory import DefaultFactories
 from eurelis_kb_framework.class_loader import ClassLoader
 from eurelis_kb_framework.dataset import DatasetFactory
 from eurelis_kb_framework.dataset.dataset import Dataset
+from eurelis_kb_framework.document_loaders.sql.sql_loader import SQLLoader
 from eurelis_kb_framework.types import FACTORY, EMBEDDING, DOCUMENT_MEAN_EMBEDDING
+from eurelis_kb_framework.retrievers.diversity import source_cap_indexes
 from eurelis_kb_framework.utils import parse_param_value, batched
+from eurelis_kb_framework.vectorstores.capabilities import (
+    BulkWritesCapability,
+    IndexSetupCapability,
+    StoredEmbeddingsCapability,
+    MetadataScanCapability,
+)
+from eurelis_kb_framework.vectorstores.centroids import (
+    SourceCentroidIndex,
+    CentroidTrackingVectorStore,
+)
+from eurelis_kb_framework.vectorstores.keyword_index import (
+    KeywordIndex,
+    KeywordIndexingVectorStore,
+)
+from eurelis_kb_framework.vectorstores.related_graph import RelatedSourcesGraph
 
 if TYPE_CHECKING:
+    from langchain.indexes import SQLRecordManager
     from langchain.schema.embeddings import Embeddings
     from langchain.schema.vectorstore import VectorStore
 
+    from eurelis_kb_framework.embeddings.huggingface.worker_pool import (
+        PooledHuggingFaceEmbeddings,
+    )
+
 
 class MetadataEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -59,6 +83,8 @@ class BaseContext(ABC):
         self.opt_embeddings: Optional["Embeddings"] = None
         self.opt_vector_store: Optional["VectorStore"] = None
         self.is_verbose = False
+        # instances shared between equal factory configurations, see get_instance_from_factory
+        self.instances: Dict[tuple, Any] = {}
 
     def copy_context(self) -> BaseContext:
         new_context = BaseContext(self.loader)
@@ -66,6 +92,7 @@ class BaseContext(ABC):
         new_context.opt_embeddings = self.opt_embeddings
         new_context.opt_vector_store = self.opt_vector_store
         new_context.is_verbose = self.is_verbose
+        new_context.instances = self.instances
 
         return new_context
 
@@ -89,6 +116,13 @@ class LangchainWrapper(BaseContext):
     Langchain wrapper, main class of the project
     """
 
+    # kinds of instances shared between equal configurations, memories and chains keep a state
+    SHARED_FACTORIES = (
+        DefaultFactories.EMBEDDINGS,
+        DefaultFactories.LLM,
+        DefaultFactories.VECTORSTORE,
+    )
+
     def __init__(self) -> None:
         """
         Constructor
@@ -106,6 +140,13 @@ class LangchainWrapper(BaseContext):
         self.is_initialized = False
         self._acronyms_data = None
         self._acronyms = None
+        self.centroid_fields: List[str] = []
+        self._centroid_index: Optional[SourceCentroidIndex] = None
+        self.related_data: Optional[dict] = None
+        self._record_managers: dict[str, "SQLRecordManager"] = {}
+        self._related_graph: Optional[RelatedSourcesGraph] = None
+        self.keyword_index_data: Optional[Union[bool, dict]] = None
+        self._keyword_index: Optional[KeywordIndex] = None
 
     @property
     def project(self) -> str:
@@ -178,6 +219,15 @@ class LangchainWrapper(BaseContext):
             self._datasets_data = config.get("dataset", [])
             self._acronyms_data = config.get("acronyms", None)
 
+            centroid_fields = config.get("centroids", [])
+            self.centroid_fields = (
+                [centroid_fields]
+                if isinstance(centroid_fields, str)
+                else list(centroid_fields)
+            )
+            self.related_data = config.get("related")
+            self.keyword_index_data = config.get("keyword_index")
+
             self.llm_factory = config.get("llm")
             self.chain_factory = config.get("chain", {})
 
@@ -218,6 +268,200 @@ class LangchainWrapper(BaseContext):
 
         return self._acronyms
 
+    @property
+    def centroid_index(self) -> Optional[SourceCentroidIndex]:
+        """
+        Getter for the source centroid table, None if no centroid field is configured
+        """
+        if not self.centroid_fields:
+            return None
+
+        if not self._centroid_index:
+            self._centroid_index = SourceCentroidIndex(self.record_manager_db_url)
+            self._centroid_index.create_schema()
+
+        return self._centroid_index
+
+    @property
+    def keyword_index(self) -> Optional[KeywordIndex]:
+        """
+        Getter for the BM25 keyword index, None if not configured
+        """
+        if not self.keyword_index_data:
+            return None
+
+        if self._keyword_index is None:
+            keyword_index_data = (
+                self.keyword_index_data
+                if isinstance(self.keyword_index_data, dict)
+                else {}
+            )
+            self._keyword_index = KeywordIndex(
+                keyword_index_data.get("path", "keyword_index"),
+                k1=keyword_index_data.get("k1", 1.2),
+                b=keyword_index_data.get("b", 0.75),
+            )
+
+        return self._keyword_index
+
+    def _related_config(self) -> dict:
+        """
+        Helper method to read the related sources graph configuration, with default values
+        """
+        related_data = self.related_data if self.related_data else {}
+
+        return {
+            "field": related_data.get("field", "source"),
+            "path": related_data.get("path", "related_sources.npz"),
+            "top_n": related_data.get("top_n", 50),
+            "block_size": related_data.get("block_size", 1024),
+        }
+
+    @property
+    def related_graph(self) -> Optional[RelatedSourcesGraph]:
+        """
+        Getter for the related sources graph, None if not configured or not built yet
+        """
+        if not self.related_data:
+            return None
+
+        if not self._related_graph:
+            path = self._related_config()["path"]
+            if not os.path.exists(path):
+                return None
+            self._related_graph = RelatedSourcesGraph.load(path)
+
+        return self._related_graph
+
+    def _representative_document(
+        self, field: str, source: str, centroid: np.ndarray
+    ) -> Optional[Document]:
+        """
+        Helper method to find the chunk of a source nearest to its centroid
+        Args:
+            field: the metadata field
+            source: the source value
+            centroid: the source centroid
+
+        Returns:
+            the document, None if the source has no chunk
+        """
+        if not isinstance(self.vector_store, StoredEmbeddingsCapability):
+            documents = self.metadata_search_documents(1, {field: source})
+            return documents[0] if documents else None
+
+        candidates = [
+            (doc, embedding)
+            for doc, embedding in self.vector_store.metadata_search_with_embeddings(
+                10, {field: source}
+            )
+            if embedding is not None
+        ]
+        if not candidates:
+            return None
+
+        similarities = np.array([embedding for _, embedding in candidates]) @ centroid
+
+        return candidates[int(np.argmax(similarities))][0]
+
+    def build_related_graph(
+        self, top_n: Optional[int] = None, block_size: Optional[int] = None
+    ) -> RelatedSourcesGraph:
+        """
+        Method to compute the related sources graph from the source centroids and write it to disk
+        Args:
+            top_n: optional, number of neighbors kept by source, override the configuration
+            block_size: optional, number of sources compared at once, override the configuration
+
+        Returns:
+            the graph
+        """
+        self.ensure_initialized()
+
+        related_config = self._related_config()
+        field = related_config["field"]
+        centroid_index = self.centroid_index
+
+        if not centroid_index or field not in self.centroid_fields:
+            raise ValueError(
+                f"Related sources graph needs centroids on the '{field}' field, "
+                f"add it to the centroids configuration and index the datasets"
+            )
+
+        sources, centroids = self.console.status(
+            "Reading source centroids",
+            lambda: centroid_index.all_centroids(field, f"{self.project}/"),
+        )
+
+        graph = self.console.status(
+            f"Computing neighbors of {len(sources)} sources",
+            lambda: RelatedSourcesGraph.build(
+                field,
+                sources,
+                centroids,
+                top_n if top_n else related_config["top_n"],
+                block_size if block_size else related_config["block_size"],
+            ),
+        )
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        def find_documents():
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                return list(
+                    executor.map(
+                        lambda item: self._representative_document(field, *item),
+                        zip(sources, centroids),
+                    )
+                )
+
+        graph.documents = self.console.status(
+            "Fetching representative documents", find_documents
+        )
+
+        graph.save(related_config["path"])
+        self._related_graph = graph
+
+        self.console.print(
+            f"Related sources graph written to {related_config['path']} "
+            f"({len(sources)} sources, {graph.top_n} neighbors by source)"
+        )
+
+        return graph
+
+    def _tracked_vector_store(
+        self, vector_store: VectorStore, namespace: str
+    ) -> VectorStore:
+        """
+        Helper method to wrap a vector store so that source centroids and the keyword index
+        are maintained on add and delete
+        Args:
+            vector_store: the vector store
+            namespace: namespace of the chunks
+
+        Returns:
+            the wrapped vector store, or the vector store itself if neither is configured
+        """
+        # side indexes only cover the main vector store
+        if vector_store is not self.vector_store:
+            return vector_store
+
+        tracked_vector_store = vector_store
+
+        centroid_index = self.centroid_index
+        if centroid_index:
+            tracked_vector_store = CentroidTrackingVectorStore(
+                tracked_vector_store, centroid_index, namespace, self.centroid_fields
+            )
+
+        keyword_index = self.keyword_index
+        if keyword_index is not None:
+            tracked_vector_store = KeywordIndexingVectorStore(
+                tracked_vector_store, keyword_index
+            )
+
+        return tracked_vector_store
+
     def _parse_embeddings(self, embeddings: FACTORY):
         """
         Process the embeddings configuration
@@ -284,28 +528,54 @@ class LangchainWrapper(BaseContext):
 
         dataset_index_results = OrderedDict()
 
-        # TODO: add lockfile
-
-        for dataset in self._list_datasets(dataset_id):
-            if not dataset.index:
-                self.console.print(f"Skipping dataset '{dataset.id}'")
-                continue
+        # documents are given by batches keeping every embeddings worker busy
+        worker_pool = self._embeddings_worker_pool()
+        batch_size = 100
+        if worker_pool is not None:
+            # workers load the model while the first documents are loaded
+            worker_pool.start()
+            batch_size = worker_pool.index_batch_size
 
-            if dataset.index == "cache":
-                self.write_files(dataset.id)
-                continue
+        # TODO: add lockfile
 
-            index_dataset = LangchainWrapper.build_index_dataset(
-                dataset, self.project, self.record_manager_db_url
-            )
+        try:
+            for dataset in self._list_datasets(dataset_id):
+                if not dataset.index:
+                    self.console.print(f"Skipping dataset '{dataset.id}'")
+                    continue
+
+                if dataset.index == "cache":
+                    self.write_files(dataset.id)
+                    continue
+
+                index_dataset = LangchainWrapper.build_index_dataset(
+                    dataset,
+                    self.project,
+                    self.record_manager_db_url,
+                    (
+                        self._tracked_vector_store(
+                            dataset.vector_store, f"{self.project}/{dataset.name}"
+                        )
+                        if dataset.vector_store is not None
+                        else None
+                    ),
+                    max(batch_size, dataset.vector_store.index_batch_size)
+                    if isinstance(dataset.vector_store, BulkWritesCapability)
+                    else batch_size,
+                )
 
-            return_value = self.console.status(
-                f"Indexing '{dataset.id}' dataset using '{dataset.cleanup}' cleanup method.",
-                index_dataset,
-            )
-            return_value["cleanup"] = str(dataset.cleanup)
-            return_value["source_id_key"] = dataset.source_id_key
-            dataset_index_results[dataset.id] = return_value
+                return_value = self.console.status(
+                    f"Indexing '{dataset.id}' dataset using '{dataset.cleanup}' cleanup method.",
+                    index_dataset,
+                )
+                if self.keyword_index is not None:
+                    self.keyword_index.flush()
+                return_value["cleanup"] = str(dataset.cleanup)
+                return_value["source_id_key"] = dataset.source_id_key
+                dataset_index_results[dataset.id] = return_value
+        finally:
+            if worker_pool is not None:
+                worker_pool.close()
 
         self.console.print_table(
             dataset_index_results.items(),
@@ -412,6 +682,18 @@ class LangchainWrapper(BaseContext):
 
         self.ensure_initialized()
 
+        if isinstance(self.vector_store, MetadataScanCapability):
+            # metadata lookup only, no embeddings call and no vector search
+            documents: List[Document] = []
+            for page in self.vector_store.metadata_scan(
+                search_filter, page_size=min(k, 1000)
+            ):
+                documents.extend(page[: k - len(documents)])
+                if len(documents) >= k:
+                    break
+
+            return documents
+
         search_args = self._build_search_args(k, search_filter)
 
         return self.vector_store.similarity_search(query="", **search_args)
@@ -433,6 +715,25 @@ class LangchainWrapper(BaseContext):
         Returns:
             embedding, list of float
         """
+        if not callable(mean_embedding_method) and isinstance(
+            self.vector_store, StoredEmbeddingsCapability
+        ):
+            # use the embeddings already stored in the vector store, no embeddings call needed
+            self.ensure_initialized()
+
+            stored_embeddings = [
+                embedding
+                for _, embedding in self.vector_store.metadata_search_with_embeddings(
+                    k, search_filter
+                )
+                if embedding is not None
+            ]
+
+            if not stored_embeddings:
+                return None
+
+            return np.mean(np.array(stored_embeddings), axis=0).tolist()
+
         # no need to call ensure initialized as it is performed on metadata search documents
         documents = self.metadata_search_documents(k, search_filter)
 
@@ -476,9 +777,48 @@ class LangchainWrapper(BaseContext):
             list of tuples with the document and relevance score
         """
 
+        related_graph = self.related_graph
+        if (
+            related_graph
+            and related_graph.field == source_field
+            and single_doc_by_source
+            and not callable(source_mean_embedding_method)
+            and k <= related_graph.top_n
+            and sources
+            and all(source in related_graph for source in sources)
+        ):
+            # precomputed neighbors, no vector store query needed
+            graph_sources = list(sources)
+            graph_coefs = coefs
+            if coefs:
+                graph_sources = graph_sources[: len(coefs)]
+                graph_coefs = coefs[: len(graph_sources)]
+
+            return [
+                (related_graph.document(related_source), score)
+                for related_source, score in related_graph.related(
+                    graph_sources, k, graph_coefs, exclude=sources
+                )
+            ]
+
+        centroids: Mapping[str, np.ndarray] = {}
+        if (
+            source_field in self.centroid_fields
+            and not callable(source_mean_embedding_method)
+            and self.centroid_index
+        ):
+            # precomputed centroids, sources missing from the table fall back to a metadata search
+            centroids = self.centroid_index.get_centroids(
+                source_field, sources, f"{self.project}/"
+            )
+
         # get the mean embedding for the sources
         embeddings = []
         for source in sources:
+            if source in centroids:
+                embeddings.append(centroids[source])
+                continue
+
             embedding = self.mean_embedding_from_metadata_search_documents(
                 k=expected_docs_by_source,
                 search_filter={source_field: source},
@@ -486,7 +826,7 @@ class LangchainWrapper(BaseContext):
             )
 
             if embedding:
-                embeddings.append(embedding)
+                embeddings.append(np.asarray(embedding))
         if not embeddings:
             return []
 
@@ -520,27 +860,23 @@ class LangchainWrapper(BaseContext):
         )
 
         # we remove from documents those corresponding to the given sources
-        documents: Iterable[Tuple[Document, float]] = filter(
-            lambda item: item[0].metadata.get(source_field) not in sources,
-            search_documents,
-        )
+        documents: List[Tuple[Document, float]] = [
+            item
+            for item in search_documents
+            if item[0].metadata.get(source_field) not in sources
+        ]
 
         if single_doc_by_source:
-            new_docs = []
-            source_set = set()
-
             # ensure to have only the first document for a given source value
-            for doc_relevance in documents:
-                doc, relevance = doc_relevance
-                doc_source = doc.metadata.get(source_field)
-                if doc_source not in source_set:
-                    new_docs.append(doc_relevance)
-                    source_set.add(doc_source)
-
-            documents = new_docs
+            documents = [
+                documents[index]
+                for index in source_cap_indexes(
+                    [doc.metadata.get(source_field) for doc, _ in documents], 1
+                )
+            ]
 
         # we truncate the return list
-        return list(documents)[:k]
+        return documents[:k]
 
     def vector_search_documents(
         self,
@@ -574,7 +910,7 @@ class LangchainWrapper(BaseContext):
             )
 
         search_method = (
-            vector_store.similarity_search
+            vector_store.similarity_search_by_vector
             if not include_relevance
             else getattr(
                 vector_store, "similarity_search_by_vector_with_relevance_scores"
@@ -616,9 +952,12 @@ class LangchainWrapper(BaseContext):
             else self.vector_store.similarity_search_with_relevance_scores
         )
 
+        # documents were indexed with expanded acronyms, so is the query
+        search_query = self.acronyms.transform(query) if self.acronyms else query
+
         documents = self.console.status(
             "Performing similarity search",
-            lambda: search_method(query=query, **search_args),
+            lambda: search_method(query=search_query, **search_args),
         )
 
         console_print_table = (
@@ -636,8 +975,94 @@ class LangchainWrapper(BaseContext):
             title=query,
         )
 
+        cache_stats = self.embeddings_cache_stats()
+        if cache_stats:
+            self.console.verbose_print(f"Query embeddings cache: {cache_stats}")
+
         return documents
 
+    def search_documents_batch(
+        self,
+        queries: Iterable[str],
+        k: int = 4,
+        search_filter: Optional[dict[str, str]] = None,
+        include_relevance: bool = False,
+        batch_size: int = 64,
+        max_workers: int = 8,
+    ) -> Iterator[Tuple[str, list]]:
+        """
+        Method to execute similarity searches for many queries
+
+        Queries are embedded with a single embeddings call per batch, then vector store searches
+        are run concurrently on a thread pool. Results are yielded as soon as they are available,
+        in the queries order.
+
+        Args:
+            queries: iterable over the queries to look documents for
+            k: max number of documents to return for each query
+            search_filter: filter
+            include_relevance: should we include relevance in results
+            batch_size: number of queries embedded at a time
+            max_workers: number of concurrent vector store searches
+
+        Yields:
+            tuples with the query and its list of documents
+        """
+        self.ensure_initialized()
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        search_args = self._build_search_args(k, search_filter)
+
+        vector_store = self.vector_store
+        if include_relevance and not hasattr(
+            vector_store, "similarity_search_by_vector_with_relevance_scores"
+        ):
+            raise ValueError(
+                f"{type(vector_store)} does not implement similarity_search_by_vector_with_relevance_scores"
+            )
+
+        search_method = (
+            vector_store.similarity_search_by_vector
+            if not include_relevance
+            else getattr(
+                vector_store, "similarity_search_by_vector_with_relevance_scores"
+            )
+        )
+
+        embeddings = self.embeddings
+        # the query embeddings cache handles batches too, using embed_documents for the misses
+        embed_method = getattr(embeddings, "embed_queries", embeddings.embed_documents)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for queries_batch in batched(queries, batch_size):
+                search_queries = (
+                    [self.acronyms.transform(query) for query in queries_batch]
+                    if self.acronyms
+                    else list(queries_batch)
+                )
+
+                vectors = embed_method(search_queries)
+
+                results = executor.map(
+                    lambda vector: search_method(vector, **search_args), vectors
+                )
+
+                yield from zip(queries_batch, results)
+
+    def embeddings_cache_stats(self) -> Optional[dict]:
+        """
+        Method to get the query embeddings cache statistics
+        Returns:
+            dictionary with hits, misses, hit_ratio and latency_saved values, None if no cache is configured
+        """
+        from eurelis_kb_framework.embeddings.cache import QueryCacheEmbeddings
+
+        if not isinstance(self.opt_embeddings, QueryCacheEmbeddings):
+            return None
+
+        return self.opt_embeddings.stats
+
     def list_datasets(self):
         """
         Method to print the list of datasets
@@ -650,110 +1075,360 @@ class LangchainWrapper(BaseContext):
         datasets = self._list_datasets()
         Dataset.print_datasets(self.console, datasets, verbose_only=False)
 
-    def _delete_from_namespace(
-        self, namespace: str, documents: List[Document], dataset_id: Optional[str]
-    ) -> int:
+    def init_vector_stores(self, dataset_id: Optional[str] = None):
         """
-        Delete documents inside a namespace
+        Method to set up the indexes of the vector stores, the default one and the dataset ones
+
+        This is the only step probing the embeddings dimension when it is not known, vector stores
+        do not make any remote call at startup
         Args:
-            namespace: namespace
-            documents: list of documents
-            dataset_id: optional dataset id
+            dataset_id: optional, if given only the vector store of the named dataset is set up
 
         Returns:
-            number of deleted documents
+
         """
+        from eurelis_kb_framework.embeddings.dimensions import embedding_dimension
 
         self.ensure_initialized()
 
-        from langchain.indexes import SQLRecordManager
+        # metadata fields used to select the documents of each vector store
+        vector_stores: List[Tuple[VectorStore, List[str]]] = (
+            [] if dataset_id else [(self.vector_store, ["namespace"])]
+        )
+        for dataset in self._list_datasets(dataset_id):
+            if dataset.vector_store is None:
+                continue
 
-        # TODO: add lockfile
+            fields = next(
+                (
+                    fields
+                    for vector_store, fields in vector_stores
+                    if vector_store is dataset.vector_store
+                ),
+                None,
+            )
+            if fields is None:
+                fields = ["namespace"]
+                vector_stores.append((dataset.vector_store, fields))
+            if dataset.source_id_key and dataset.source_id_key not in fields:
+                fields.append(dataset.source_id_key)
+
+        for vector_store, fields in vector_stores:
+            name = type(vector_store).__name__
+            if not isinstance(vector_store, IndexSetupCapability):
+                self.console.print(f"{name}: no index to set up")
+                continue
 
-        # TODO: get dataset from document schema
+            embeddings = vector_store.embeddings or self.embeddings
+            dimension = self.console.status(
+                "Getting embeddings dimension",
+                lambda: embedding_dimension(embeddings),
+            )
+            messages = self.console.status(
+                f"Setting up {name} indexes",
+                lambda: vector_store.setup_indexes(dimension, fields),
+            )
+            for message in messages:
+                self.console.print(f"{name}: {message}")
 
-        num_deleted = 0
+    def reduce_embeddings(
+        self,
+        dataset_id: Optional[str] = None,
+        sample_size: int = 2000,
+        queries: Optional[List[str]] = None,
+        k: int = 10,
+    ) -> dict:
+        """
+        Method to fit the embeddings dimension reduction on a sample of the datasets, if it is a pca
+        projection, and report the recall of the reduced embeddings
+        Args:
+            dataset_id: optional, if given only the named dataset is sampled
+            sample_size: number of sampled documents
+            queries: optional sample queries, default to sampled documents
+            k: number of neighbours by query of the recall report
 
-        dataset = next(
-            (
-                dataset
-                for dataset in self._list_datasets(dataset_id)
-                if dataset.index
-                and dataset.index != "cache"
-                and f"{self.project}/{dataset.name}" == namespace
-            ),
-            None,
+        Returns:
+            the recall report
+        """
+        from eurelis_kb_framework.embeddings.cache import QueryCacheEmbeddings
+        from eurelis_kb_framework.embeddings.reduction import (
+            PCA,
+            ReducedEmbeddings,
+            recall_report,
+        )
+
+        self.ensure_initialized()
+
+        reduced = self._wrapped_embeddings(ReducedEmbeddings)
+        if reduced is None:
+            raise ValueError("No embeddings reduce stage configured")
+
+        def sample_texts() -> List[str]:
+            # reservoir sampling over the documents of the datasets
+            rng = np.random.default_rng(0)
+            sample: List[str] = []
+            seen = 0
+            for dataset in self._list_datasets(dataset_id):
+                if not dataset.index:
+                    continue
+                for document in dataset.lazy_load():
+                    seen += 1
+                    if len(sample) < sample_size:
+                        sample.append(document.page_content)
+                    else:
+                        index = rng.integers(seen)
+                        if index < sample_size:
+                            sample[index] = document.page_content
+            return sample
+
+        texts = self.console.status("Sampling documents", sample_texts)
+        if not texts:
+            raise ValueError("No document to sample")
+
+        documents = np.asarray(
+            self.console.status(
+                f"Embedding {len(texts)} documents",
+                lambda: reduced.embeddings.embed_documents(texts),
+            )
         )
 
-        if not dataset:
-            return 0
+        if queries:
+            query_vectors = np.asarray(
+                self.console.status(
+                    f"Embedding {len(queries)} queries",
+                    lambda: [
+                        reduced.embeddings.embed_query(query) for query in queries
+                    ],
+                )
+            )
+        else:
+            # held out sampled documents, a document would always find itself, and they are kept
+            # out of the pca fit so the recall is measured on unseen vectors
+            held_out = min(100, max(1, len(documents) // 10))
+            query_vectors, documents = documents[:held_out], documents[held_out:]
+
+        if reduced.method == PCA:
+            previous_fingerprint = reduced.fingerprint
+            self.console.status(
+                f"Fitting the pca projection to {reduced.output_dimension} dimensions",
+                lambda: reduced.fit(documents),
+            )
+            self.console.print(f"PCA projection saved to {reduced.path}")
 
-        source_id_assigner = _get_source_id_assigner(dataset.source_id_key)
+            cache = self._wrapped_embeddings(QueryCacheEmbeddings)
+            if cache is not None and cache.model.endswith(previous_fingerprint):
+                # the cache key ends with the projection fingerprint, cached queries are reduced by the previous fit
+                cache.set_model(
+                    cache.model[: -len(previous_fingerprint)] + reduced.fingerprint
+                )
 
-        source_ids: Sequence[Optional[str]] = [
-            source_id_assigner(doc) for doc in documents
-        ]
+        report = recall_report(reduced, documents, query_vectors, k=k)
+
+        self.console.print_table(
+            report.items(),
+            ["Key", "Value"],
+            lambda _, keyval: (keyval[0], str(keyval[1])),
+            title="Embeddings reduction recall",
+            show_lines=True,
+        )
+
+        return report
+
+    def _wrapped_embeddings(self, embeddings_class: type) -> Optional[Any]:
+        """
+        Helper method to find embeddings of a given class, embeddings wrappers are looked through
+        Args:
+            embeddings_class: the class to look for
+
+        Returns:
+            the embeddings object, None if not found
+        """
+        embeddings = self.opt_embeddings
+        while embeddings is not None and not isinstance(embeddings, embeddings_class):
+            embeddings = getattr(embeddings, "embeddings", None)
+
+        return embeddings
+
+    def _embeddings_worker_pool(self) -> Optional["PooledHuggingFaceEmbeddings"]:
+        """
+        Helper method to get the embeddings worker pool
+        Returns:
+            the pooled embeddings, None if the embeddings are not computed by a worker pool
+        """
+        from eurelis_kb_framework.embeddings.huggingface.worker_pool import (
+            PooledHuggingFaceEmbeddings,
+        )
+
+        return self._wrapped_embeddings(PooledHuggingFaceEmbeddings)
+
+    def _get_record_manager(self, namespace: str) -> "SQLRecordManager":
+        """
+        Helper method to get the record manager of a namespace, record managers share a single engine
+        Args:
+            namespace: namespace
+
+        Returns:
+            the record manager
+        """
+        from langchain.indexes import SQLRecordManager
+
+        record_manager = self._record_managers.get(namespace)
+        if record_manager:
+            return record_manager
+
+        if self._record_managers:
+            engine = next(iter(self._record_managers.values())).engine
+            record_manager = SQLRecordManager(namespace, engine=engine)
+        else:
+            record_manager = SQLRecordManager(
+                namespace, db_url=self.record_manager_db_url
+            )
+            record_manager.create_schema()
+
+        self._record_managers[namespace] = record_manager
+
+        return record_manager
+
+    def _indexed_datasets_by_namespace(
+        self, dataset_id: Optional[str] = None
+    ) -> dict[str, Dataset]:
+        """
+        Helper method to get the datasets stored in the vector store, by namespace
+        Args:
+            dataset_id: optional dataset id
 
-        namespace = f"{self.project}/{dataset.name}"
-        record_manager = SQLRecordManager(namespace, db_url=self.record_manager_db_url)
+        Returns:
+            dictionary of namespace to dataset
+        """
+        return {
+            f"{self.project}/{dataset.name}": dataset
+            for dataset in self._list_datasets(dataset_id)
+            if dataset.index and dataset.index != "cache"
+        }
+
+    def _delete_source_ids(
+        self, namespace: str, source_ids: Sequence[str], batch_size: int
+    ) -> int:
+        """
+        Delete every chunk of some source ids inside a namespace, from the vector store and the record manager
+        Args:
+            namespace: namespace
+            source_ids: source ids, values of the dataset source_id_key
+            batch_size: number of chunks deleted at once
 
-        record_manager.create_schema()
+        Returns:
+            number of deleted chunks
+        """
+        record_manager = self._get_record_manager(namespace)
+        vector_store = self._tracked_vector_store(self.vector_store, namespace)
 
-        _source_ids = cast(Sequence[str], source_ids)
+        num_deleted = 0
 
-        uids_to_delete = record_manager.list_keys(group_ids=_source_ids)
+        for source_ids_batch in batched(source_ids, batch_size):
+            uids_to_delete = record_manager.list_keys(group_ids=list(source_ids_batch))
 
-        if uids_to_delete:
-            # Then delete from vector store.
-            self.vector_store.delete(uids_to_delete)
-            # First delete from record store.
-            record_manager.delete_keys(uids_to_delete)
-            num_deleted += len(uids_to_delete)
+            for uids_batch in batched(uids_to_delete, batch_size):
+                uids = list(uids_batch)
+                # delete from the vector store first, then from the record manager
+                vector_store.delete(uids)
+                record_manager.delete_keys(uids)
+                num_deleted += len(uids)
 
         return num_deleted
 
-    def delete(self, search_filter: dict[str, str], dataset_id: Optional[str]) -> int:
+    def delete(
+        self,
+        search_filter: dict[str, str],
+        dataset_id: Optional[str],
+        page_size: int = 1000,
+        batch_size: int = 500,
+    ) -> int:
         """
-        Method to delete documents using a search query
+        Method to delete documents using a search query, every chunk of a matching document is deleted
         Args:
             search_filter: filters for the search query
             dataset_id: optional dataset id
+            page_size: number of matching chunks fetched at once to resolve source ids
+            batch_size: number of chunks deleted at once
 
         Returns:
-
+            number of deleted chunks
         """
         self.ensure_initialized()
 
         if not search_filter:
             raise ValueError(f"Missing delete filter value")
 
+        datasets = self._indexed_datasets_by_namespace(dataset_id)
+
+        def source_ids_by_namespace(
+            documents: Iterable[Document],
+        ) -> dict[str, set[str]]:
+            source_ids: dict[str, set[str]] = {}
+
+            for doc in documents:
+                namespace = doc.metadata.get("namespace")
+                if not namespace or namespace not in datasets:
+                    continue
+                dataset = datasets[namespace]
+
+                source_id = _get_source_id_assigner(dataset.source_id_key)(doc)
+                if source_id is not None:
+                    source_ids.setdefault(namespace, set()).add(source_id)
+
+            return source_ids
+
+        def scan_delete_work():
+            # resolve every matching source id first, the scan is not disturbed by deletions
+            source_ids: dict[str, set[str]] = {}
+            scanned = 0
+
+            for page in cast(MetadataScanCapability, self.vector_store).metadata_scan(
+                search_filter, page_size
+            ):
+                scanned += len(page)
+                for namespace, page_source_ids in source_ids_by_namespace(page).items():
+                    source_ids.setdefault(namespace, set()).update(page_source_ids)
+                self.console.verbose_print(f"{scanned} matching chunk(s) scanned")
+
+            total_num_deleted = 0
+            for namespace, namespace_source_ids in source_ids.items():
+                total_num_deleted += self._delete_source_ids(
+                    namespace, list(namespace_source_ids), batch_size
+                )
+                self.console.print(f"{total_num_deleted} chunk(s) deleted so far")
+
+            return total_num_deleted
+
         def delete_work():
             total_num_deleted = 0
-            should_search = True
 
-            while should_search:
-                num_deleted = 0
+            while True:
                 documents = self.metadata_search_documents(
-                    k=10,
+                    k=page_size,
                     search_filter=search_filter,
                 )
 
-                namespace_set = set()
-
-                for doc in documents:
-                    namespace_set.add(doc.metadata.get("namespace"))
+                num_deleted = sum(
+                    self._delete_source_ids(namespace, list(source_ids), batch_size)
+                    for namespace, source_ids in source_ids_by_namespace(
+                        documents
+                    ).items()
+                )
 
-                for namespace in namespace_set:
-                    num_deleted += self._delete_from_namespace(
-                        namespace, documents, dataset_id
-                    )
+                if not num_deleted:
+                    # nothing left, or only documents outside of the indexed datasets
+                    return total_num_deleted
 
                 total_num_deleted += num_deleted
-                should_search = bool(num_deleted)
-
-            return total_num_deleted
+                self.console.print(f"{total_num_deleted} chunk(s) deleted so far")
 
-        final_num_deleted = self.console.status("Processing delete query", delete_work)
+        final_num_deleted = self.console.status(
+            "Processing delete query",
+            scan_delete_work
+            if isinstance(self.vector_store, MetadataScanCapability)
+            else delete_work,
+        )
 
         self.console.print(f"{final_num_deleted} chunk(s) deleted from database")
 
@@ -771,7 +1446,7 @@ class LangchainWrapper(BaseContext):
         self.ensure_initialized()
 
         dataset_index_results = OrderedDict()
-        from langchain.indexes import SQLRecordManager, index
+        from langchain.indexes import index
 
         # TODO: add lockfile
 
@@ -781,17 +1456,15 @@ class LangchainWrapper(BaseContext):
                 continue
 
             namespace = f"{self.project}/{dataset.name}"
-            record_manager = SQLRecordManager(
-                namespace, db_url=self.record_manager_db_url
-            )
+            record_manager = self._get_record_manager(namespace)
 
-            record_manager.create_schema()
+            vector_store = self._tracked_vector_store(self.vector_store, namespace)
 
             def clear_dataset():
                 return index(
                     [],
                     record_manager,
-                    self.vector_store,
+                    vector_store,
                     cleanup="full",
                     source_id_key=dataset.source_id_key,
                 )
@@ -874,6 +1547,63 @@ class LangchainWrapper(BaseContext):
 
         return chain
 
+    @staticmethod
+    def _instance_key(
+        context, default: DefaultFactories, data: Optional[FACTORY]
+    ) -> Optional[tuple]:
+        """
+        Helper method to compute the registry key of an instance
+        Args:
+            context: the context object to build the instance
+            default: default factories enum value
+            data: factory data
+
+        Returns:
+            the key, None if the instance is not shared
+        """
+        if default not in LangchainWrapper.SHARED_FACTORIES:
+            return None
+
+        try:
+            normalized = json.dumps(data if data else {}, sort_keys=True)
+        except (TypeError, ValueError):
+            # configuration holding objects
+            return None
+
+        if default == DefaultFactories.VECTORSTORE:
+            # vector stores are built with the embeddings of the context, datasets may have their own
+            return (
+                default.name,
+                normalized,
+                LangchainWrapper._embeddings_key(context),
+            )
+
+        return default.name, normalized
+
+    @staticmethod
+    def _embeddings_key(context) -> Any:
+        """
+        Helper method to identify the embeddings of a context, by the normalized configuration they are
+        registered under, so that a dataset configuring the main embeddings again shares the main vector store
+        Args:
+            context: the context object to build the instance
+
+        Returns:
+            the normalized embeddings configuration, or the embeddings id if they are not registered
+        """
+        embeddings = context.opt_embeddings
+        if embeddings is None:
+            return None
+
+        return next(
+            (
+                key[1]
+                for key, instance in context.instances.items()
+                if key[0] == DefaultFactories.EMBEDDINGS.name and instance is embeddings
+            ),
+            id(embeddings),
+        )
+
     @staticmethod
     def get_instance_from_factory(
         context,
@@ -882,7 +1612,10 @@ class LangchainWrapper(BaseContext):
         mandatory: bool = False,
     ):
         """
-        Helper method to
+        Helper method to get an instance from factory data
+
+        Embeddings, LLMs and vector stores are built once by configuration: equal configurations get the
+        same instance, so one model is loaded and one connection pool opened
         Args:
             context: the context object to build the instance, usually the langchain wrapper itself
             default: default factories enum value, contains default module and class name
@@ -896,6 +1629,10 @@ class LangchainWrapper(BaseContext):
         if not mandatory and not data:
             return None
 
+        key = LangchainWrapper._instance_key(context, default, data)
+        if key is not None and key in context.instances:
+            return context.instances[key]
+
         # instantiate the factory
         class_loader = context.loader
         default_values = default.value
@@ -904,11 +1641,20 @@ class LangchainWrapper(BaseContext):
         )
 
         # use the factory to build the object
-        return factory.build(context)
+        instance = factory.build(context)
+
+        if key is not None and instance is not None:
+            context.instances[key] = instance
+
+        return instance
 
     @staticmethod
     def build_index_dataset(
-        dataset: Dataset, project: str, record_manager_db_url: str
+        dataset: Dataset,
+        project: str,
+        record_manager_db_url: str,
+        vector_store: Optional[VectorStore] = None,
+        batch_size: int = 100,
     ) -> Callable[[], Mapping[str, int]]:
         """Build the index_dataset method
 
@@ -916,6 +1662,8 @@ class LangchainWrapper(BaseContext):
             dataset: the dataset
             project: name of the project
             record_manager_db_url: url to store record_manager
+            vector_store: optional, vector store to index into, default to the dataset vector store
+            batch_size: number of documents embedded and written at once
 
         Returns:
             The index_dataset method
@@ -925,12 +1673,14 @@ class LangchainWrapper(BaseContext):
 
         namespace = f"{project}/{dataset.name}"
 
+        target_vector_store = vector_store if vector_store else dataset.vector_store
+
         def index_dataset():
             dataset_documents = dataset.lazy_load()
 
             with_namespace = dataset.build_with_namespace_function(project)
 
-            if type(dataset.vector_store).delete == VectorStore.delete:
+            if type(target_vector_store).delete == VectorStore.delete:
                 if dataset.cleanup is not None:
                     raise ValueError(
                         f"unsupported {dataset.cleanup} cleanup method, this vector store only accept None"
@@ -938,9 +1688,12 @@ class LangchainWrapper(BaseContext):
 
                 num_added = 0
 
-                for docs in batched(with_namespace(dataset_documents), 100):
+                for docs in batched(with_namespace(dataset_documents), batch_size):
                     num_added += len(docs)
-                    dataset.vector_store.add_documents(docs)
+                    target_vector_store.add_documents(docs)
+
+                if isinstance(dataset.loader, SQLLoader):
+                    dataset.loader.commit_watermark()
 
                 return {
                     "cleanup": "None",
@@ -954,12 +1707,19 @@ class LangchainWrapper(BaseContext):
 
             record_manager.create_schema()
 
-            return index(
+            result = index(
                 with_namespace(dataset_documents),
                 record_manager,
-                dataset.vector_store,
+                target_vector_store,
                 cleanup=dataset.cleanup,
                 source_id_key=dataset.source_id_key,
+                batch_size=batch_size,
             )
 
+            # loaded rows are only skipped by the next runs once indexed
+            if isinstance(dataset.loader, SQLLoader):
+                dataset.loader.commit_watermark()
+
+            return result
+
         return index_dataset
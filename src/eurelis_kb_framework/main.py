@@ -151,13 +151,17 @@ def dataset_clear(ctx):
 @cli.command()
 @click.option("--id", default=None, help="Dataset ID")
 @click.option("filters", "--filter", multiple=True, type=str)
+@click.option(
+    "--batch-size", default=500, type=int, help="Number of chunks deleted at once"
+)
 @click.pass_context
-def delete(ctx, filters, **kwargs):
+def delete(ctx, filters, batch_size, **kwargs):
     """
     Delete content from database using a query
     Args:
         ctx: click context
         filters: filters to apply to search query
+        batch_size: number of chunks deleted at once
         **kwargs: options
 
     Returns:
@@ -180,24 +184,47 @@ def delete(ctx, filters, **kwargs):
     if not filter_args:  # if empty dict we consider a None value
         filter_args = None
 
-    wrapper.delete(filter_args, dataset_id)
+    wrapper.delete(filter_args, dataset_id, batch_size=batch_size)
 
 
 @cli.command()
-@click.argument("query")
+@click.argument("query", required=False)
 @click.option("filters", "--filter", multiple=True, type=str)
+@click.option("-k", "--k", default=4, type=int, help="Number of documents by query")
+@click.option(
+    "queries_file",
+    "--file",
+    default=None,
+    type=click.File("r"),
+    help="File with one query by line, results are written as JSON lines",
+)
+@click.option(
+    "output_file",
+    "--output",
+    default="-",
+    type=click.File("w"),
+    help="Where to write JSON lines results, default to stdout",
+)
+@click.option("--relevance/--no-relevance", default=False)
 @click.pass_context
-def search(ctx, query, filters):
+def search(ctx, query, filters, k, queries_file, output_file, relevance):
     """
     Method to handle search
     Args:
         ctx: click context
         query: the text to look for
         filters: list of filters to apply
+        k: number of documents to return by query
+        queries_file: optional file with one query by line
+        output_file: where to write results in file mode
+        relevance: should we include relevance scores in file mode
 
     Returns:
 
     """
+    if not query and not queries_file:
+        raise click.UsageError("Provide either a QUERY argument or a --file option")
+
     filter_args = {}
 
     for filter_arg in filters:
@@ -213,7 +240,312 @@ def search(ctx, query, filters):
         filter_args = None
 
     wrapper = ctx.obj["singleton"]()
-    wrapper.search_documents(query, for_print=True, search_filter=filter_args)
+
+    if not queries_file:
+        wrapper.search_documents(query, k=k, for_print=True, search_filter=filter_args)
+        return
+
+    import json
+    from eurelis_kb_framework.langchain_wrapper import MetadataEncoder
+
+    queries = (line.strip() for line in queries_file)
+
+    for query_value, documents in wrapper.search_documents_batch(
+        (query_value for query_value in queries if query_value),
+        k=k,
+        search_filter=filter_args,
+        include_relevance=relevance,
+    ):
+        results = []
+        for item in documents:
+            document, score = item if relevance else (item, None)
+            result = {
+                "page_content": document.page_content,
+                "metadata": document.metadata,
+            }
+            if relevance:
+                result["score"] = score
+            results.append(result)
+
+        output_file.write(
+            json.dumps(
+                {"query": query_value, "documents": results}, cls=MetadataEncoder
+            )
+            + "\n"
+        )
+        output_file.flush()
+
+
+@cli.group()
+@click.pass_context
+def related(ctx, **kwargs):
+    """
+    Method handling related sources options
+    Args:
+        ctx: click context
+        **kwargs: options
+    Returns:
+
+    """
+    ctx.obj["wrapper"] = ctx.obj["singleton"]()
+
+
+@related.command("build")
+@click.option(
+    "--top-n", default=None, type=int, help="Number of neighbors kept by source"
+)
+@click.option(
+    "--block-size", default=None, type=int, help="Number of sources compared at once"
+)
+@click.pass_context
+def related_build(ctx, top_n, block_size):
+    """
+    Compute the related sources graph from the source centroids
+    Args:
+        ctx: click context
+        top_n: optional number of neighbors kept by source
+        block_size: optional number of sources compared at once
+
+    Returns:
+
+    """
+    wrapper = ctx.obj["wrapper"]
+    wrapper.build_related_graph(top_n=top_n, block_size=block_size)
+
+
+@cli.group()
+@click.pass_context
+def vectorstore(ctx, **kwargs):
+    """
+    Method handling vector store options
+    Args:
+        ctx: click context
+        **kwargs: options
+    Returns:
+
+    """
+    pass
+
+
+@vectorstore.command("init")
+@click.option("--id", default=None, help="Dataset ID")
+@click.pass_context
+def vectorstore_init(ctx, **kwargs):
+    """
+    Set up the vector store indexes
+    Args:
+        ctx: click context
+        **kwargs: options
+
+    Returns:
+
+    """
+    wrapper = ctx.obj["singleton"]()
+    wrapper.init_vector_stores(kwargs.get("id"))
+
+
+@vectorstore.command("copy")
+@click.option("--from", "from_config", required=True, help="Source configuration")
+@click.option("--to", "to_config", required=True, help="Target configuration")
+@click.option("--id", default=None, help="Dataset ID")
+@click.option(
+    "--page-size", default=500, type=int, help="Number of documents copied at once"
+)
+@click.option(
+    "--workers", default=4, type=int, help="Number of pages written in parallel"
+)
+@click.option(
+    "--state",
+    default="vectorstore_copy_state.json",
+    help="File keeping the copy progress, an interrupted copy resumes from it",
+)
+@click.pass_context
+def vectorstore_copy(ctx, from_config, to_config, page_size, workers, state, **kwargs):
+    """
+    Copy the datasets documents with their embeddings and record manager keys to another vector store
+    Args:
+        ctx: click context
+        from_config: source configuration path
+        to_config: target configuration path
+        page_size: number of documents copied at once
+        workers: number of pages written in parallel
+        state: file keeping the copy progress
+        **kwargs: options
+
+    Returns:
+
+    """
+    from eurelis_kb_framework import LangchainWrapperFactory
+    from eurelis_kb_framework.langchain_wrapper import BaseContext
+    from eurelis_kb_framework.vectorstores.migration import VectorStoreCopy
+
+    wrappers = []
+    for config_path in (from_config, to_config):
+        factory = LangchainWrapperFactory()
+        factory.set_verbose(
+            Verbosity.CONSOLE_DEBUG
+            if ctx.parent.parent.params.get("verbose")
+            else Verbosity.CONSOLE_INFO
+        )
+        factory.set_config_path(config_path)
+        wrappers.append(factory.build(cast(BaseContext, None)))
+
+    source, target = wrappers
+    results = VectorStoreCopy(
+        source, target, page_size=page_size, workers=workers, state_path=state
+    ).copy(kwargs.get("id"))
+
+    source.console.print_table(
+        results.items(),
+        ["Dataset", "Documents copied", "Status"],
+        lambda _, keyval: (
+            keyval[0],
+            str(keyval[1]["copied"]),
+            keyval[1]["status"],
+        ),
+        title="Vector store copy",
+        show_lines=True,
+    )
+
+
+@cli.group()
+@click.pass_context
+def embeddings(ctx, **kwargs):
+    """
+    Method handling embeddings options
+    Args:
+        ctx: click context
+        **kwargs: options
+    Returns:
+
+    """
+    ctx.obj["wrapper"] = ctx.obj["singleton"]()
+
+
+@embeddings.command("reduce")
+@click.option("--id", default=None, help="Dataset ID")
+@click.option("--sample", default=2000, type=int, help="Number of sampled documents")
+@click.option(
+    "queries_file",
+    "--queries",
+    default=None,
+    type=click.File("r"),
+    help="File with one sample query by line, default to held out sampled documents",
+)
+@click.option("-k", "--k", default=10, type=int, help="Number of neighbours by query")
+@click.pass_context
+def embeddings_reduce(ctx, sample, queries_file, k, **kwargs):
+    """
+    Fit the embeddings pca projection on a sample of the datasets and report the recall of the reduced embeddings
+    Args:
+        ctx: click context
+        sample: number of sampled documents
+        queries_file: optional file with one query by line
+        k: number of neighbours by query
+        **kwargs: options
+
+    Returns:
+
+    """
+    queries = (
+        [line.strip() for line in queries_file if line.strip()]
+        if queries_file
+        else None
+    )
+
+    wrapper = ctx.obj["wrapper"]
+    wrapper.reduce_embeddings(
+        kwargs.get("id"), sample_size=sample, queries=queries, k=k
+    )
+
+
+@cli.group()
+@click.pass_context
+def snapshot(ctx, **kwargs):
+    """
+    Method handling snapshot options
+    Args:
+        ctx: click context
+        **kwargs: options
+    Returns:
+
+    """
+    ctx.obj["wrapper"] = ctx.obj["singleton"]()
+
+
+@snapshot.command("export")
+@click.argument("path")
+@click.option("--id", default=None, help="Dataset ID")
+@click.option(
+    "--dtype",
+    default="float32",
+    type=click.Choice(["float32", "float16"]),
+    help="Vectors dtype, float16 halves the snapshot size",
+)
+@click.option(
+    "--page-size", default=1000, type=int, help="Number of documents read at once"
+)
+@click.pass_context
+def snapshot_export(ctx, path, dtype, page_size, **kwargs):
+    """
+    Export the indexed documents with their embeddings and record manager keys to a snapshot directory
+    Args:
+        ctx: click context
+        path: snapshot directory
+        dtype: vectors dtype
+        page_size: number of documents read at once
+        **kwargs: options
+
+    Returns:
+
+    """
+    from eurelis_kb_framework.vectorstores.snapshot import ProjectSnapshot
+
+    wrapper = ctx.obj["wrapper"]
+    results = ProjectSnapshot(wrapper, path, page_size=page_size).export(
+        kwargs.get("id"), dtype=dtype
+    )
+
+    wrapper.console.print_table(
+        results.items(),
+        ["Dataset", "Documents", "Status"],
+        lambda _, keyval: (keyval[0], str(keyval[1]["count"]), keyval[1]["status"]),
+        title="Snapshot export",
+        show_lines=True,
+    )
+
+
+@snapshot.command("import")
+@click.argument("path")
+@click.option("--id", default=None, help="Dataset ID")
+@click.option(
+    "--page-size", default=1000, type=int, help="Number of documents written at once"
+)
+@click.pass_context
+def snapshot_import(ctx, path, page_size, **kwargs):
+    """
+    Import a snapshot directory into the configured vector store and record manager
+    Args:
+        ctx: click context
+        path: snapshot directory
+        page_size: number of documents written at once
+        **kwargs: options
+
+    Returns:
+
+    """
+    from eurelis_kb_framework.vectorstores.snapshot import ProjectSnapshot
+
+    wrapper = ctx.obj["wrapper"]
+    results = ProjectSnapshot(wrapper, path, page_size=page_size).load(kwargs.get("id"))
+
+    wrapper.console.print_table(
+        results.items(),
+        ["Dataset", "Documents", "Status"],
+        lambda _, keyval: (keyval[0], str(keyval[1]["count"]), keyval[1]["status"]),
+        title="Snapshot import",
+        show_lines=True,
+    )
 
 
 @cli.command()
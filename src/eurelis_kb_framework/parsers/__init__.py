@@ -1,3 +1,4 @@
+import json
 from typing import Iterator, TYPE_CHECKING
 
 from langchain_community.document_loaders import Blob
@@ -25,7 +26,11 @@ class DocumentCacheParser(BaseBlobParser):
         Yields:
             an iterator over documents
         """
-        yield Dataset.load_document_from_cache(blob.path)
+        if blob.data is None:
+            yield Dataset.load_document_from_cache(blob.path)
+        else:
+            # in-memory blob, ie: an archive member
+            yield Dataset.document_from_json(json.loads(blob.as_string()))
 
 
 class DocumentCacheParserFactory(BaseFactory[BaseBlobParser]):
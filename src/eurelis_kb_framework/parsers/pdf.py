@@ -32,12 +32,15 @@ class PdfFileParser(BaseBlobParser):
             "source": str(os.path.relpath(blob.path, self._base_path)),
         }
 
-        pdf_file = PdfReader(blob.path)
+        # read through as_bytes_io to support in-memory blobs (ie: archive members)
+        with blob.as_bytes_io() as pdf_stream:
+            pdf_file = PdfReader(pdf_stream)
 
-        metadata.update(pdf_file.metadata)
+            if pdf_file.metadata:
+                metadata.update(pdf_file.metadata)
 
-        content = ""
-        for page in pdf_file.pages:
-            content += f"{page.extract_text()}\n\n"
+            content = ""
+            for page in pdf_file.pages:
+                content += f"{page.extract_text()}\n\n"
 
         yield Document(page_content=content, metadata=metadata)
@@ -7,6 +7,7 @@ class GenericRetrieverFactory(ProviderFactory[BaseRetriever]):
     ALLOWED_PROVIDERS = {
         "vectorstore": "eurelis_kb_framework.retrievers.vectorstore.VectorStoreRetrieverFactory",
         "selfcheck": "eurelis_kb_framework.retrievers.selfquery.SelfQueryRetrieverFactory",
+        "hybrid": "eurelis_kb_framework.retrievers.hybrid.HybridRetrieverFactory",
     }
 
     def __init__(self):
@@ -0,0 +1,217 @@
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain.schema import BaseRetriever, Document
+from langchain.schema.vectorstore import VectorStore
+
+from eurelis_kb_framework.vectorstores.capabilities import (
+    SimilaritySearchWithEmbeddingsCapability,
+)
+
+
+def _source_codes(sources: Sequence[Any]) -> np.ndarray:
+    """
+    Helper function to number the distinct source values, in order of first appearance
+    """
+    codes: dict = {}
+
+    return np.fromiter(
+        (codes.setdefault(source, len(codes)) for source in sources),
+        dtype=np.int64,
+        count=len(sources),
+    )
+
+
+def source_cap_indexes(sources: Sequence[Any], max_per_source: int) -> np.ndarray:
+    """
+    Select ranked items so that no source value appears more than max_per_source times
+    Args:
+        sources: source value of each item, items are ranked best first
+        max_per_source: max number of items kept by source value
+
+    Returns:
+        indexes of the kept items, in rank order
+    """
+    count = len(sources)
+    if not count:
+        return np.empty(0, dtype=np.int64)
+
+    codes = _source_codes(sources)
+
+    # rank of each item among the items of its source
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    group_sizes = np.diff(np.r_[starts, count])
+    ranks = np.empty(count, dtype=np.int64)
+    ranks[order] = np.arange(count) - np.repeat(starts, group_sizes)
+
+    return np.flatnonzero(ranks < max_per_source)
+
+
+def maximal_marginal_relevance(
+    query: np.ndarray,
+    vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+    sources: Optional[Sequence[Any]] = None,
+    max_per_source: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Greedy maximal marginal relevance selection, each step picks the candidate maximizing
+    lambda_mult * similarity to the query - (1 - lambda_mult) * max similarity to the already selected ones
+
+    Similarities are computed once as matrices, a step only updates the max similarity of each candidate
+    Args:
+        query: the query vector
+        vectors: candidate vectors, one row by candidate
+        k: number of candidates to select
+        lambda_mult: 1 for relevance only, 0 for diversity only
+        sources: optional source value of each candidate
+        max_per_source: optional max number of selected candidates by source value
+
+    Returns:
+        indexes of the selected candidates, in selection order
+    """
+    count = len(vectors)
+    if not count or k < 1:
+        return np.empty(0, dtype=np.int64)
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors = vectors / norms
+    query = np.asarray(query, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+
+    relevance = vectors @ query
+    similarities = vectors @ vectors.T
+
+    codes = None
+    source_counts = None
+    if sources is not None and max_per_source:
+        codes = _source_codes(sources)
+        source_counts = np.zeros(codes.max() + 1, dtype=np.int64)
+
+    # max similarity to the selected candidates, may be negative, plain relevance for the first pick
+    max_similarities = np.full(count, -np.inf, dtype=np.float32)
+    available = np.ones(count, dtype=bool)
+    selected: List[int] = []
+
+    for _ in range(min(k, count)):
+        scores = (
+            lambda_mult * relevance - (1 - lambda_mult) * max_similarities
+            if selected
+            else relevance.copy()
+        )
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        if not np.isfinite(scores[best]):
+            break
+
+        selected.append(best)
+        available[best] = False
+        max_similarities = np.maximum(max_similarities, similarities[best])
+
+        if codes is not None and source_counts is not None:
+            source_counts[codes[best]] += 1
+            if source_counts[codes[best]] >= max_per_source:
+                available[codes == codes[best]] = False
+
+    return np.array(selected, dtype=np.int64)
+
+
+class DiversityRetriever(BaseRetriever):
+    """
+    Retriever over-fetching vector store candidates with their vectors, then re-ranking them with
+    maximal marginal relevance and/or a cap on the number of documents by source
+    """
+
+    vector_store: VectorStore
+    k: int = 4
+    fetch_k: int = 20
+    method: str = "mmr"
+    lambda_mult: float = 0.5
+    max_per_source: Optional[int] = None
+    source_field: str = "source"
+    search_kwargs: dict = {}
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _candidates(self, query: str) -> tuple:
+        """
+        Helper method to fetch the candidates, with their vectors when the re-ranking needs them
+        Returns:
+            tuple with the query vector, the documents and the documents vectors, vectors are None if not needed
+        """
+        search_filter = self.search_kwargs.get("filter")
+        vector_store = self.vector_store
+        embeddings = vector_store.embeddings
+
+        if self.method != "mmr":
+            return (
+                None,
+                vector_store.similarity_search(
+                    query, self.fetch_k, **self.search_kwargs
+                ),
+                None,
+            )
+
+        if embeddings is None:
+            raise ValueError("MMR re-ranking needs a vector store with embeddings")
+
+        query_vector = embeddings.embed_query(query)
+
+        if isinstance(vector_store, SimilaritySearchWithEmbeddingsCapability):
+            results = [
+                (doc, stored_embedding)
+                for doc, _, stored_embedding in vector_store.similarity_search_with_embeddings(
+                    query_vector, self.fetch_k, search_filter
+                )
+                if stored_embedding is not None
+            ]
+            return (
+                query_vector,
+                [doc for doc, _ in results],
+                np.array([stored_embedding for _, stored_embedding in results]),
+            )
+
+        # the vector store does not return its vectors, candidates are embedded again
+        documents = vector_store.similarity_search_by_vector(
+            query_vector, self.fetch_k, **self.search_kwargs
+        )
+
+        return (
+            query_vector,
+            documents,
+            np.array(
+                embeddings.embed_documents([doc.page_content for doc in documents])
+            ),
+        )
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_vector, documents, vectors = self._candidates(query)
+        if not documents:
+            return []
+
+        sources = [doc.metadata.get(self.source_field) for doc in documents]
+
+        if self.method == "mmr":
+            selected = maximal_marginal_relevance(
+                np.asarray(query_vector),
+                vectors,
+                self.k,
+                self.lambda_mult,
+                sources,
+                self.max_per_source,
+            )
+        elif self.max_per_source:
+            selected = source_cap_indexes(sources, self.max_per_source)[: self.k]
+        else:
+            selected = np.arange(min(self.k, len(documents)))
+
+        return [documents[index] for index in selected]
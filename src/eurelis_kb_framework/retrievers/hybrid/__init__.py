@@ -0,0 +1,108 @@
+from typing import TYPE_CHECKING, Sequence
+
+from langchain.schema import BaseRetriever
+
+from eurelis_kb_framework.base_factory import BaseFactory
+
+if TYPE_CHECKING:
+    from eurelis_kb_framework.langchain_wrapper import BaseContext
+
+
+class HybridRetrieverFactory(BaseFactory[BaseRetriever]):
+    """
+    Factory for the hybrid retriever, fusing vector and BM25 keyword results with reciprocal rank fusion
+    """
+
+    def __init__(self):
+        self.k = 4
+        self.fetch_k = 20
+        self.rrf_k = 60
+        self.weights = (1.0, 1.0)
+        self.search_kwargs = {}
+
+    def set_k(self, k: int):
+        """
+        Setter for the number of documents to return
+        Args:
+            k: number of documents
+
+        Returns:
+
+        """
+        self.k = k
+
+    def set_fetch_k(self, fetch_k: int):
+        """
+        Setter for the number of documents fetched by each search before the fusion
+        Args:
+            fetch_k: number of documents
+
+        Returns:
+
+        """
+        self.fetch_k = fetch_k
+
+    def set_rrf_k(self, rrf_k: int):
+        """
+        Setter for the reciprocal rank fusion offset
+        Args:
+            rrf_k: rank offset, default to 60
+
+        Returns:
+
+        """
+        self.rrf_k = rrf_k
+
+    def set_weights(self, weights: Sequence[float]):
+        """
+        Setter for the weights of the vector and keyword results
+        Args:
+            weights: list of two values, vector weight then keyword weight
+
+        Returns:
+
+        """
+        if len(weights) != 2:
+            raise ValueError(
+                f"Bad weights value, expecting [vector weight, keyword weight], got {weights}"
+            )
+        self.weights = (float(weights[0]), float(weights[1]))
+
+    def set_search_kwargs(self, kwargs: dict):
+        """
+        Setter for the vector search kwargs, a filter key also applies to the keyword search
+        Args:
+            kwargs: key value arguments given to the vector store similarity search
+
+        Returns:
+
+        """
+        self.search_kwargs = kwargs if kwargs else {}
+
+    def build(self, context: "BaseContext") -> BaseRetriever:
+        from eurelis_kb_framework.langchain_wrapper import LangchainWrapper
+        from eurelis_kb_framework.retrievers.hybrid.hybrid_retriever import (
+            HybridRetriever,
+        )
+
+        if not isinstance(context, LangchainWrapper):
+            raise RuntimeError(
+                "HybridRetrieverFactory requires a LangchainWrapper instance as build context"
+            )
+
+        keyword_index = context.keyword_index
+        if keyword_index is None:
+            raise ValueError(
+                "Hybrid retriever needs a keyword index, add a keyword_index entry to the configuration "
+                "and index the datasets"
+            )
+
+        return HybridRetriever(
+            vector_store=context.vector_store,
+            keyword_index=keyword_index,
+            k=self.k,
+            fetch_k=self.fetch_k,
+            rrf_k=self.rrf_k,
+            weights=self.weights,
+            search_kwargs=self.search_kwargs,
+        )
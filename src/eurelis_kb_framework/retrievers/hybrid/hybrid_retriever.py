@@ -0,0 +1,97 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain.schema import BaseRetriever, Document
+from langchain.schema.vectorstore import VectorStore
+
+from eurelis_kb_framework.vectorstores.keyword_index import KeywordIndex
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Helper function to get the thread pool running the keyword searches, shared by every hybrid retriever
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=4, thread_name_prefix="kbf-keyword"
+            )
+
+    return _executor
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Document]],
+    weights: Sequence[float],
+    k: int,
+    rrf_k: int = 60,
+) -> List[Document]:
+    """
+    Fuse ranked lists of documents, each document scores the sum of weight / (rrf_k + rank) over the lists
+
+    Documents are identified by their page content, the first list holding a document provides it
+    Args:
+        rankings: the ranked lists, best first
+        weights: weight of each list
+        k: number of documents to return
+        rrf_k: rank offset, higher values flatten the contribution of the first ranks
+
+    Returns:
+        the k best documents
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking, start=1):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+            documents.setdefault(key, doc)
+
+    best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    return [documents[key] for key, _ in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing a vector store similarity search with a BM25 keyword search, both run concurrently
+    """
+
+    vector_store: VectorStore
+    keyword_index: KeywordIndex
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    weights: Tuple[float, float] = (1.0, 1.0)
+    search_kwargs: dict = {}
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        search_kwargs = dict(self.search_kwargs)
+        search_filter = search_kwargs.pop("filter", None)
+
+        keyword_future = _get_executor().submit(
+            self.keyword_index.search, query, self.fetch_k, search_filter
+        )
+
+        vector_kwargs = {"filter": search_filter} if search_filter else {}
+        vector_documents = self.vector_store.similarity_search(
+            query, self.fetch_k, **vector_kwargs, **search_kwargs
+        )
+        keyword_documents = [doc for doc, _ in keyword_future.result()]
+
+        return reciprocal_rank_fusion(
+            [vector_documents, keyword_documents], self.weights, self.k, self.rrf_k
+        )
@@ -1,4 +1,4 @@
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
 from langchain.schema import BaseRetriever
 
@@ -11,6 +11,7 @@ if TYPE_CHECKING:
 class VectorStoreRetrieverFactory(BaseFactory[BaseRetriever]):
     def __init__(self):
         self.retriever_kwargs = {}
+        self.diversity: Optional[dict] = None
 
     def set_retriever_kwargs(self, kwargs: dict):
         """
@@ -23,8 +24,47 @@ class VectorStoreRetrieverFactory(BaseFactory[BaseRetriever]):
         """
         self.retriever_kwargs = kwargs if kwargs else {}
 
+    def set_diversity(self, diversity: dict):
+        """
+        Setter for the diversity re-ranking stage
+        Args:
+            diversity: dictionary with optional keys method ("mmr" default, or "none" for the source cap only),
+                fetch_k (candidates fetched, default to 20), lambda_mult (default to 0.5), max_per_source
+                and source_field (default to "source")
+
+        Returns:
+
+        """
+        if not isinstance(diversity, dict):
+            raise ValueError(
+                f"Bad diversity value, expecting a dict, got {type(diversity)}"
+            )
+        if diversity.get("method", "mmr") not in ("mmr", "none"):
+            raise ValueError(
+                f"Unknown diversity method {diversity.get('method')}, use mmr or none"
+            )
+
+        self.diversity = diversity.copy()
+
     def build(self, context: "BaseContext") -> BaseRetriever:
         if context.vector_store is None:
             raise ValueError("context object does not contain a vector_store")
 
-        return context.vector_store.as_retriever(**self.retriever_kwargs)
+        if not self.diversity:
+            return context.vector_store.as_retriever(**self.retriever_kwargs)
+
+        from eurelis_kb_framework.retrievers.diversity import DiversityRetriever
+
+        search_kwargs = dict(self.retriever_kwargs.get("search_kwargs", {}))
+        k = search_kwargs.pop("k", 4)
+
+        return DiversityRetriever(
+            vector_store=context.vector_store,
+            k=k,
+            fetch_k=self.diversity.get("fetch_k", max(20, k * 5)),
+            method=self.diversity.get("method", "mmr"),
+            lambda_mult=self.diversity.get("lambda_mult", 0.5),
+            max_per_source=self.diversity.get("max_per_source"),
+            source_field=self.diversity.get("source_field", "source"),
+            search_kwargs=search_kwargs,
+        )
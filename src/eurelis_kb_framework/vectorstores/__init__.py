@@ -12,4 +12,5 @@ class GenericVectorStoreFactory(ProviderFactory[VectorStore]):
         "chroma": "eurelis_kb_framework.vectorstores.chroma.ChromaFactory",
         "solr": "eurelis_kb_framework.vectorstores.solr.SolrFactory",
         "mongodb": "eurelis_kb_framework.vectorstores.mongodb.MongoDBVectorStoreFactory",
+        "numpy": "eurelis_kb_framework.vectorstores.numpy.NumpyVectorStoreFactory",
     }
@@ -0,0 +1,149 @@
+from abc import ABC, abstractmethod
+from typing import Iterator, List, Optional, Tuple, Sequence
+
+from langchain.schema import Document
+
+from eurelis_kb_framework.types import EMBEDDING
+
+
+class StoredEmbeddingsCapability(ABC):
+    """
+    Capability for vector stores able to return the embeddings they store along with documents
+    """
+
+    @abstractmethod
+    def metadata_search_with_embeddings(
+        self, k: int = 10, search_filter: Optional[dict] = None
+    ) -> List[Tuple[Document, EMBEDDING]]:
+        """
+        Method to fetch k documents matching a metadata filter, with their stored embeddings
+
+        Args:
+            k: max number of documents to return
+            search_filter: metadata filter
+
+        Returns:
+            list of tuples with the document and its stored embedding
+        """
+
+    @abstractmethod
+    def get_by_ids_with_embeddings(
+        self, ids: Sequence[str]
+    ) -> List[Tuple[str, Document, EMBEDDING]]:
+        """
+        Method to fetch documents from their ids, with their stored embeddings
+
+        Args:
+            ids: ids of the documents, as given to add_documents
+
+        Returns:
+            list of tuples with the id, the document and its stored embedding, unknown ids are omitted
+        """
+
+
+class MetadataScanCapability(ABC):
+    """
+    Capability for vector stores able to list documents matching a metadata filter, without any
+    embeddings call or vector search
+    """
+
+    @abstractmethod
+    def metadata_scan(
+        self, search_filter: Optional[dict] = None, page_size: int = 1000
+    ) -> Iterator[List[Document]]:
+        """
+        Method to iterate over every document matching a metadata filter, page by page
+
+        The vector store is queried lazily, one page at a time, stored embeddings are not fetched
+
+        Args:
+            search_filter: metadata filter
+            page_size: number of documents fetched at once
+
+        Returns:
+            iterator over pages of documents
+        """
+
+
+class SimilaritySearchWithEmbeddingsCapability(ABC):
+    """
+    Capability for vector stores able to return the stored embeddings of similarity search results
+    """
+
+    @abstractmethod
+    def similarity_search_with_embeddings(
+        self, embedding: EMBEDDING, k: int = 4, search_filter: Optional[dict] = None
+    ) -> List[Tuple[Document, float, EMBEDDING]]:
+        """
+        Method to run a similarity search by vector, with the stored embeddings of the results
+
+        Args:
+            embedding: the query embedding
+            k: max number of documents to return
+            search_filter: metadata filter
+
+        Returns:
+            list of tuples with the document, its relevance score and its stored embedding, best first
+        """
+
+
+class BulkWritesCapability(ABC):
+    """
+    Capability for vector stores writing added documents in large batches, the indexing run gives them
+    at least index_batch_size documents at once
+    """
+
+    @property
+    @abstractmethod
+    def index_batch_size(self) -> int:
+        """
+        Number of documents to give at once to add_documents
+        """
+
+
+class IndexSetupCapability(ABC):
+    """
+    Capability for vector stores needing an explicit setup of their indexes, done once instead of at startup
+    """
+
+    @abstractmethod
+    def setup_indexes(
+        self, dimension: int, fields: Sequence[str] = ("namespace",)
+    ) -> List[str]:
+        """
+        Method to create the indexes used by the vector store, existing indexes are kept
+
+        Args:
+            dimension: dimension of the embeddings
+            fields: metadata fields used to select documents, namespace and source id keys
+
+        Returns:
+            list of messages describing the setup
+        """
+
+
+class PrecomputedEmbeddingsCapability(ABC):
+    """
+    Capability for vector stores able to add documents with already computed embeddings
+    """
+
+    @abstractmethod
+    def add_embeddings(
+        self,
+        texts: Sequence[str],
+        embeddings: Sequence[EMBEDDING],
+        metadatas: Optional[Sequence[dict]] = None,
+        ids: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        """
+        Method to add documents with already computed embeddings, existing ids are replaced
+
+        Args:
+            texts: page contents
+            embeddings: the embeddings, one by text
+            metadatas: optional metadata, one by text
+            ids: optional ids, one by text
+
+        Returns:
+            the ids of the added documents
+        """
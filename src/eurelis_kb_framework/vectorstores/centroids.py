@@ -0,0 +1,365 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, cast
+
+import numpy as np
+from langchain.schema import Document
+from langchain.schema.vectorstore import VectorStore
+
+from eurelis_kb_framework.utils import batched
+from eurelis_kb_framework.vectorstores.capabilities import (
+    PrecomputedEmbeddingsCapability,
+    StoredEmbeddingsCapability,
+)
+from eurelis_kb_framework.vectorstores.proxy import VectorStoreProxy
+
+CENTROID_DELTA = Tuple[np.ndarray, int]
+
+
+class SourceCentroidIndex:
+    """
+    Table of per source centroids, stored as a running sum of the chunks embeddings and a chunk count
+
+    The table lives in the record manager database, one row by namespace, metadata field and source value
+    """
+
+    TABLE_NAME = "kbf_source_centroids"
+    LOOKUP_BATCH_SIZE = 500
+
+    def __init__(self, db_url: str):
+        """
+        Constructor
+        Args:
+            db_url: sqlalchemy database url, usually the record manager one
+        """
+        from sqlalchemy import (
+            Column,
+            Integer,
+            LargeBinary,
+            MetaData,
+            String,
+            Table,
+            create_engine,
+        )
+
+        self.engine = create_engine(db_url)
+        self.metadata = MetaData()
+        self.table = Table(
+            SourceCentroidIndex.TABLE_NAME,
+            self.metadata,
+            Column("namespace", String(255), primary_key=True),
+            Column("field", String(255), primary_key=True),
+            Column("source", String(1024), primary_key=True),
+            Column("count", Integer, nullable=False),
+            Column("vector", LargeBinary, nullable=False),
+        )
+
+    def create_schema(self):
+        """
+        Create the centroid table if needed
+        """
+        self.metadata.create_all(self.engine)
+
+    def _select_rows(self, connection, conditions: Iterable, sources: Sequence[str]):
+        """
+        Helper method to select rows for a list of sources, by batches to keep IN clauses small
+        """
+        from sqlalchemy import select
+
+        for sources_batch in batched(sources, SourceCentroidIndex.LOOKUP_BATCH_SIZE):
+            yield from connection.execute(
+                select(self.table).where(
+                    *conditions, self.table.c.source.in_(sources_batch)
+                )
+            )
+
+    def update(
+        self, namespace: str, deltas: Dict[str, Dict[str, CENTROID_DELTA]]
+    ) -> None:
+        """
+        Apply embedding sums and chunk counts deltas to the centroid table
+
+        Args:
+            namespace: the namespace of the chunks
+            deltas: dictionary of metadata field to dictionary of source value to (embedding sum, count) delta
+
+        Returns:
+
+        """
+        from sqlalchemy import delete
+
+        with self.engine.begin() as connection:
+            for field, source_deltas in deltas.items():
+                if not source_deltas:
+                    continue
+
+                sums = {
+                    source: delta_sum.astype(np.float64, copy=True)
+                    for source, (delta_sum, _) in source_deltas.items()
+                }
+                counts = {
+                    source: delta_count
+                    for source, (_, delta_count) in source_deltas.items()
+                }
+
+                conditions = (
+                    self.table.c.namespace == namespace,
+                    self.table.c.field == field,
+                )
+                for row in self._select_rows(connection, conditions, list(sums)):
+                    stored = np.frombuffer(row.vector, dtype=np.float64)
+                    if stored.shape != sums[row.source].shape:
+                        raise ValueError(
+                            f"Centroid dimension mismatch for source '{row.source}', "
+                            f"stored {stored.shape[0]}, got {sums[row.source].shape[0]}"
+                        )
+                    sums[row.source] += stored
+                    counts[row.source] += row.count
+
+                for sources_batch in batched(
+                    list(sums), SourceCentroidIndex.LOOKUP_BATCH_SIZE
+                ):
+                    connection.execute(
+                        delete(self.table).where(
+                            *conditions, self.table.c.source.in_(sources_batch)
+                        )
+                    )
+
+                rows = [
+                    {
+                        "namespace": namespace,
+                        "field": field,
+                        "source": source,
+                        "count": counts[source],
+                        "vector": sums[source].tobytes(),
+                    }
+                    for source in sums
+                    if counts[source] > 0
+                ]
+                if rows:
+                    connection.execute(self.table.insert(), rows)
+
+    def clear(self, namespace: str) -> None:
+        """
+        Remove every centroid of a namespace
+        Args:
+            namespace: the namespace
+
+        Returns:
+
+        """
+        from sqlalchemy import delete
+
+        with self.engine.begin() as connection:
+            connection.execute(
+                delete(self.table).where(self.table.c.namespace == namespace)
+            )
+
+    def get_centroids(
+        self, field: str, sources: Sequence[str], namespace_prefix: str = ""
+    ) -> Dict[str, np.ndarray]:
+        """
+        Lookup the centroids of some sources, sums and counts are combined across namespaces
+
+        Args:
+            field: the metadata field the sources are values of
+            sources: the source values
+            namespace_prefix: only consider namespaces starting with this prefix, usually the project name
+
+        Returns:
+            dictionary of source value to centroid, sources without chunks are omitted
+        """
+        sums: Dict[str, np.ndarray] = {}
+        counts: Dict[str, int] = defaultdict(int)
+
+        conditions = (
+            self.table.c.field == field,
+            self.table.c.namespace.startswith(namespace_prefix, autoescape=True),
+        )
+
+        with self.engine.connect() as connection:
+            for row in self._select_rows(connection, conditions, list(set(sources))):
+                stored = np.frombuffer(row.vector, dtype=np.float64)
+                if row.source in sums:
+                    sums[row.source] = sums[row.source] + stored
+                else:
+                    sums[row.source] = stored
+                counts[row.source] += row.count
+
+        return {
+            source: sums[source] / counts[source]
+            for source in sums
+            if counts[source] > 0
+        }
+
+    def all_centroids(
+        self, field: str, namespace_prefix: str = ""
+    ) -> Tuple[List[str], np.ndarray]:
+        """
+        Read every centroid of a metadata field, sums and counts are combined across namespaces
+
+        Args:
+            field: the metadata field
+            namespace_prefix: only consider namespaces starting with this prefix, usually the project name
+
+        Returns:
+            tuple with the list of source values and the matrix of their centroids, one row by source
+        """
+        from sqlalchemy import select
+
+        sums: Dict[str, np.ndarray] = {}
+        counts: Dict[str, int] = defaultdict(int)
+
+        with self.engine.connect() as connection:
+            rows = connection.execution_options(yield_per=1000).execute(
+                select(self.table).where(
+                    self.table.c.field == field,
+                    self.table.c.namespace.startswith(
+                        namespace_prefix, autoescape=True
+                    ),
+                )
+            )
+            for row in rows:
+                stored = np.frombuffer(row.vector, dtype=np.float64)
+                if row.source in sums:
+                    sums[row.source] = sums[row.source] + stored
+                else:
+                    sums[row.source] = stored
+                # Row.count is the tuple method, the column is read through the mapping
+                counts[row.source] += row._mapping["count"]
+
+        sources = [source for source in sums if counts[source] > 0]
+        if not sources:
+            return [], np.empty((0, 0), dtype=np.float32)
+
+        centroids = np.empty((len(sources), len(sums[sources[0]])), dtype=np.float32)
+        for row_index, source in enumerate(sources):
+            centroids[row_index] = sums[source] / counts[source]
+
+        return sources, centroids
+
+
+class CentroidTrackingVectorStore(VectorStoreProxy):
+    """
+    Vector store proxy maintaining the source centroid table as chunks are added to and deleted from
+    the wrapped vector store
+
+    The wrapped vector store must implement StoredEmbeddingsCapability, embeddings of deleted chunks are
+    read back from the vector store. Added chunks are embedded by the proxy and given to the vector store
+    with their embeddings when it implements PrecomputedEmbeddingsCapability, so chunks are never embedded
+    twice and their embeddings are not read back
+    """
+
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        centroid_index: SourceCentroidIndex,
+        namespace: str,
+        fields: Sequence[str],
+    ):
+        """
+        Constructor
+        Args:
+            vector_store: the wrapped vector store
+            centroid_index: the centroid table
+            namespace: namespace of the indexed chunks
+            fields: metadata fields to maintain centroids for
+        """
+        if not isinstance(vector_store, StoredEmbeddingsCapability):
+            raise ValueError(
+                f"{type(vector_store).__name__} does not give access to stored embeddings, "
+                f"unable to maintain source centroids"
+            )
+
+        super().__init__(vector_store)
+        self.centroid_index = centroid_index
+        self.namespace = namespace
+        self.fields = list(fields)
+
+    def _deltas(
+        self, items: Iterable[Tuple[Document, Any]], sign: int
+    ) -> Dict[str, Dict[str, CENTROID_DELTA]]:
+        """
+        Helper method to compute the centroid deltas for a list of documents and their embeddings
+        Args:
+            items: tuples of document and embedding
+            sign: 1 for added chunks, -1 for deleted ones
+
+        Returns:
+            dictionary of metadata field to dictionary of source value to (embedding sum, count) delta
+        """
+        deltas: Dict[str, Dict[str, CENTROID_DELTA]] = {
+            field: {} for field in self.fields
+        }
+
+        for doc, embedding in items:
+            if embedding is None:
+                continue
+            vector = np.asarray(embedding, dtype=np.float64) * sign
+
+            for field in self.fields:
+                source = doc.metadata.get(field)
+                if source is None:
+                    continue
+                source = str(source)
+
+                current = deltas[field].get(source)
+                if current is None:
+                    deltas[field][source] = (vector, sign)
+                else:
+                    deltas[field][source] = (current[0] + vector, current[1] + sign)
+
+        return deltas
+
+    def _stored(self, ids: Sequence[str]) -> List[Tuple[Document, Any]]:
+        store = cast(StoredEmbeddingsCapability, self.vector_store)
+
+        return [
+            (doc, embedding)
+            for _, doc, embedding in store.get_by_ids_with_embeddings(ids)
+        ]
+
+    def add_documents(self, documents: List[Document], **kwargs: Any) -> List[str]:
+        """
+        Add documents to the wrapped vector store then add their embeddings to the centroids
+        """
+        vector_store = self.vector_store
+        embeddings = vector_store.embeddings
+        if (
+            documents
+            and embeddings is not None
+            and isinstance(vector_store, PrecomputedEmbeddingsCapability)
+        ):
+            texts = [doc.page_content for doc in documents]
+            vectors = embeddings.embed_documents(texts)
+            ids = vector_store.add_embeddings(
+                texts, vectors, [doc.metadata for doc in documents], kwargs.get("ids")
+            )
+            self.centroid_index.update(
+                self.namespace, self._deltas(zip(documents, vectors), 1)
+            )
+
+            return ids
+
+        # the vector store embeds the documents itself, their stored embeddings are read back
+        ids = vector_store.add_documents(documents, **kwargs)
+
+        # prefer the ids given by the caller, some vector stores return their own internal ids
+        stored_ids = kwargs.get("ids") or ids
+        if stored_ids:
+            self.centroid_index.update(
+                self.namespace, self._deltas(self._stored(stored_ids), 1)
+            )
+
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """
+        Remove the stored embeddings of the documents from the centroids then delete them from the wrapped
+        vector store
+        """
+        if ids:
+            self.centroid_index.update(
+                self.namespace, self._deltas(self._stored(ids), -1)
+            )
+
+        return self.vector_store.delete(ids, **kwargs)
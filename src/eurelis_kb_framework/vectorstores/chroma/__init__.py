@@ -1,11 +1,13 @@
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional, Union
 
 import chromadb  # type: ignore[import-not-found]
 from chromadb import API
 from langchain.schema.vectorstore import VectorStore
-from langchain_community.vectorstores import Chroma
 
 from eurelis_kb_framework.base_factory import BaseFactory
+from eurelis_kb_framework.vectorstores.chroma.chroma_vector_store import (
+    ChromaVectorStore,
+)
 
 if TYPE_CHECKING:
     from eurelis_kb_framework.langchain_wrapper import BaseContext
@@ -17,6 +19,8 @@ class ChromaFactory(BaseFactory[VectorStore]):
     """
 
     ALLOWED_MODES = {"in-memory", "persistent", "http"}
+    HNSW_PARAMETERS = {"space", "M", "construction_ef", "search_ef", "num_threads"}
+    DEFAULT_BULK_SIZE = 10_000
 
     def __init__(self):
         self.arguments = {}
@@ -24,6 +28,9 @@ class ChromaFactory(BaseFactory[VectorStore]):
         self.path = None
         self.host = "localhost"
         self.port = 8000
+        self.hnsw: dict = {}
+        self.bulk_size: Optional[int] = None
+        self.sync_threshold: Optional[int] = None
 
     def set_collection_name(self, name: str):
         """
@@ -87,6 +94,67 @@ class ChromaFactory(BaseFactory[VectorStore]):
         """
         self.port = port
 
+    def set_hnsw(self, hnsw: dict):
+        """
+        Setter for the HNSW parameters of the collection, only used when the collection is created
+        Args:
+            hnsw: dictionary with space, M, construction_ef, search_ef and num_threads optional keys
+
+        Returns:
+
+        """
+        for key, value in hnsw.items():
+            name = key[len("hnsw:") :] if key.startswith("hnsw:") else key
+            if name not in ChromaFactory.HNSW_PARAMETERS:
+                raise ValueError(
+                    f"{key} is not an allowed hnsw parameter, use one of {ChromaFactory.HNSW_PARAMETERS}"
+                )
+            self.hnsw[f"hnsw:{name}"] = value
+
+    def set_bulk_import(self, bulk_import: Union[bool, int, dict]):
+        """
+        Setter for the bulk import parameter, indexing runs add documents in large batches, embedded at once
+        Args:
+            bulk_import: True, a number of documents added at once or a dictionary with optional batch_size and
+                sync_threshold keys, sync_threshold being the number of documents added between two
+                persistences of the HNSW index in persistent mode, default to 10 batches
+
+        Returns:
+
+        """
+        if isinstance(bulk_import, bool):
+            bulk_import = (
+                {"batch_size": ChromaFactory.DEFAULT_BULK_SIZE} if bulk_import else {}
+            )
+        elif isinstance(bulk_import, int):
+            bulk_import = {"batch_size": bulk_import}
+
+        if not bulk_import:
+            self.bulk_size = None
+            self.sync_threshold = None
+            return
+
+        self.bulk_size = bulk_import.get("batch_size", ChromaFactory.DEFAULT_BULK_SIZE)
+        self.sync_threshold = bulk_import.get("sync_threshold", 10 * self.bulk_size)
+
+    def _collection_metadata(self, client: API) -> Optional[dict]:
+        """
+        Helper method to get the collection metadata holding the HNSW parameters
+        Returns:
+
+        """
+        metadata = dict(self.hnsw)
+
+        if self.bulk_size and self.mode == "persistent":
+            # the HNSW index is updated by batches and persisted every sync_threshold documents,
+            # the write ahead log keeps the documents added since the last persistence
+            metadata.setdefault(
+                "hnsw:batch_size", min(self.bulk_size, client.max_batch_size)
+            )
+            metadata.setdefault("hnsw:sync_threshold", self.sync_threshold)
+
+        return metadata if metadata else None
+
     def _get_chroma_client(self) -> API:
         """
         Helper method to get the chromadb client according to the given mode
@@ -120,6 +188,10 @@ class ChromaFactory(BaseFactory[VectorStore]):
             f"Getting chroma vector store using {self.mode} client"
         )
 
-        return Chroma(
-            embedding_function=context.embeddings, client=client, **self.arguments
+        return ChromaVectorStore(
+            embedding_function=context.embeddings,
+            client=client,
+            collection_metadata=self._collection_metadata(client),
+            bulk_size=self.bulk_size,
+            **self.arguments,
         )
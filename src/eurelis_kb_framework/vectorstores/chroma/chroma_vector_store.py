@@ -0,0 +1,301 @@
+import uuid
+from typing import Any, Iterable, Iterator, List, Optional, Tuple, Sequence
+
+from langchain.schema import Document
+from langchain_community.vectorstores import Chroma
+
+from eurelis_kb_framework.types import EMBEDDING
+from eurelis_kb_framework.vectorstores.capabilities import (
+    StoredEmbeddingsCapability,
+    MetadataScanCapability,
+    SimilaritySearchWithEmbeddingsCapability,
+    BulkWritesCapability,
+    PrecomputedEmbeddingsCapability,
+)
+
+
+def chroma_where(search_filter: Optional[dict]) -> Optional[dict]:
+    """
+    Helper function to convert a metadata filter to a chroma where clause
+
+    Chroma expects a single key by where dictionary, several keys are combined with $and
+
+    Args:
+        search_filter: metadata filter
+
+    Returns:
+        chroma where clause
+    """
+    if not search_filter:
+        return None
+
+    if len(search_filter) == 1 or any(key.startswith("$") for key in search_filter):
+        return search_filter
+
+    return {"$and": [{key: value} for key, value in search_filter.items()]}
+
+
+class ChromaVectorStore(
+    Chroma,
+    StoredEmbeddingsCapability,
+    MetadataScanCapability,
+    SimilaritySearchWithEmbeddingsCapability,
+    BulkWritesCapability,
+    PrecomputedEmbeddingsCapability,
+):
+    """
+    Chroma vector store with access to the stored embeddings and metadata scan
+
+    In bulk import mode, indexing runs add bulk_size texts at once, they are embedded at once and upserted
+    in batches of the client max batch size before add_texts returns, so the record manager never records
+    a document which is not written
+    """
+
+    def __init__(self, *args: Any, bulk_size: Optional[int] = None, **kwargs: Any):
+        """
+        Constructor
+        Args:
+            *args: Chroma arguments
+            bulk_size: optional number of texts added at once by indexing runs, bulk import mode is disabled
+                if not provided
+            **kwargs: Chroma arguments
+        """
+        super().__init__(*args, **kwargs)
+        self.bulk_size = bulk_size
+
+    @property
+    def index_batch_size(self) -> int:
+        """
+        Number of documents to give at once to add_documents, the bulk size in bulk import mode
+        """
+        return self.bulk_size or 0
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        if not self.bulk_size:
+            return super().add_texts(texts, metadatas, ids, **kwargs)
+
+        texts = list(texts)
+        ids = ids if ids else [str(uuid.uuid1()) for _ in texts]
+        metadatas = metadatas if metadatas else [{} for _ in texts]
+
+        # last write wins for an id added twice
+        latest = {
+            doc_id: (text, metadata)
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        }
+        unique_texts = [text for text, _ in latest.values()]
+        # without embedding function, chroma embeds the documents with the collection one
+        embeddings = (
+            self._embedding_function.embed_documents(unique_texts)
+            if self._embedding_function is not None
+            else None
+        )
+
+        # written before returning, the caller may record the ids right away
+        self._upsert(
+            list(latest.keys()),
+            embeddings,
+            [metadata for _, metadata in latest.values()],
+            unique_texts,
+        )
+
+        return ids
+
+    def _upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Optional[Sequence[EMBEDDING]],
+        metadatas: Sequence[dict],
+        texts: Sequence[str],
+    ):
+        """
+        Helper method to upsert documents in batches of the client max batch size
+        """
+        # chroma rejects empty metadata, documents without metadata are upserted apart
+        for with_metadata in (True, False):
+            indexes = [
+                index
+                for index, metadata in enumerate(metadatas)
+                if bool(metadata) == with_metadata
+            ]
+            batch_size = getattr(self._client, "max_batch_size", 0) or max(
+                len(indexes), 1
+            )
+            for start in range(0, len(indexes), batch_size):
+                batch = indexes[start : start + batch_size]
+                self._collection.upsert(
+                    ids=[ids[index] for index in batch],
+                    embeddings=[list(embeddings[index]) for index in batch]
+                    if embeddings is not None
+                    else None,
+                    metadatas=[metadatas[index] for index in batch]
+                    if with_metadata
+                    else None,
+                    documents=[texts[index] for index in batch],
+                )
+
+    def add_embeddings(
+        self,
+        texts: Sequence[str],
+        embeddings: Sequence[EMBEDDING],
+        metadatas: Optional[Sequence[dict]] = None,
+        ids: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        """
+        Method to add documents with already computed embeddings, existing ids are replaced
+
+        Args:
+            texts: page contents
+            embeddings: the embeddings, one by text
+            metadatas: optional metadata, one by text
+            ids: optional ids, one by text
+
+        Returns:
+            the ids of the added documents
+        """
+        ids = list(ids) if ids else [str(uuid.uuid1()) for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        if not len(ids) == len(texts) == len(embeddings) == len(metadatas):
+            raise ValueError("texts, embeddings, metadatas and ids lengths mismatch")
+
+        self._upsert(ids, embeddings, metadatas, texts)
+
+        return ids
+
+    def metadata_search_with_embeddings(
+        self, k: int = 10, search_filter: Optional[dict] = None
+    ) -> List[Tuple[Document, EMBEDDING]]:
+        """
+        Method to fetch k documents matching a metadata filter, with their stored embeddings
+
+        Args:
+            k: max number of documents to return
+            search_filter: metadata filter
+
+        Returns:
+            list of tuples with the document and its stored embedding
+        """
+        results = self._collection.get(
+            where=chroma_where(search_filter),
+            limit=k,
+            include=["documents", "metadatas", "embeddings"],
+        )
+
+        return [
+            (Document(page_content=text or "", metadata=metadata or {}), embedding)
+            for text, metadata, embedding in zip(
+                results["documents"], results["metadatas"], results["embeddings"]
+            )
+        ]
+
+    def get_by_ids_with_embeddings(
+        self, ids: Sequence[str]
+    ) -> List[Tuple[str, Document, EMBEDDING]]:
+        """
+        Method to fetch documents from their ids, with their stored embeddings
+
+        Args:
+            ids: ids of the documents, as given to add_documents
+
+        Returns:
+            list of tuples with the id, the document and its stored embedding, unknown ids are omitted
+        """
+        if not ids:
+            return []
+
+        results = self._collection.get(
+            ids=list(ids), include=["documents", "metadatas", "embeddings"]
+        )
+
+        return [
+            (
+                doc_id,
+                Document(page_content=text or "", metadata=metadata or {}),
+                embedding,
+            )
+            for doc_id, text, metadata, embedding in zip(
+                results["ids"],
+                results["documents"],
+                results["metadatas"],
+                results["embeddings"],
+            )
+        ]
+
+    def metadata_scan(
+        self, search_filter: Optional[dict] = None, page_size: int = 1000
+    ) -> Iterator[List[Document]]:
+        """
+        Method to iterate over every document matching a metadata filter, page by page
+
+        Args:
+            search_filter: metadata filter
+            page_size: number of documents fetched at once
+
+        Returns:
+            iterator over pages of documents
+        """
+        where = chroma_where(search_filter)
+        offset = 0
+
+        while True:
+            results = self._collection.get(
+                where=where,
+                limit=page_size,
+                offset=offset,
+                include=["documents", "metadatas"],
+            )
+
+            if not results["ids"]:
+                return
+
+            yield [
+                Document(page_content=text or "", metadata=metadata or {})
+                for text, metadata in zip(results["documents"], results["metadatas"])
+            ]
+
+            if len(results["ids"]) < page_size:
+                return
+
+            offset += len(results["ids"])
+
+    def similarity_search_with_embeddings(
+        self, embedding: EMBEDDING, k: int = 4, search_filter: Optional[dict] = None
+    ) -> List[Tuple[Document, float, EMBEDDING]]:
+        """
+        Method to run a similarity search by vector, with the stored embeddings of the results
+
+        Args:
+            embedding: the query embedding
+            k: max number of documents to return
+            search_filter: metadata filter
+
+        Returns:
+            list of tuples with the document, its relevance score and its stored embedding, best first
+        """
+        results = self._collection.query(
+            query_embeddings=[list(embedding)],
+            n_results=k,
+            where=chroma_where(search_filter),
+            include=["documents", "metadatas", "distances", "embeddings"],
+        )
+        relevance_score_fn = self._select_relevance_score_fn()
+
+        return [
+            (
+                Document(page_content=text or "", metadata=metadata or {}),
+                relevance_score_fn(distance),
+                stored_embedding,
+            )
+            for text, metadata, distance, stored_embedding in zip(
+                results["documents"][0],
+                results["metadatas"][0],
+                results["distances"][0],
+                results["embeddings"][0],
+            )
+        ]
@@ -0,0 +1,625 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain.schema.vectorstore import VectorStore
+
+from eurelis_kb_framework.utils import batched
+from eurelis_kb_framework.vectorstores.numpy.metadata_index import (
+    filter_conditions,
+    metadata_matches,
+)
+from eurelis_kb_framework.vectorstores.proxy import VectorStoreProxy
+from eurelis_kb_framework.vectorstores.related_graph import (
+    _pack_strings,
+    _unpack_strings,
+)
+
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+COMPOUND_SEPARATORS = re.compile(r"[-./]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split a text into lowercase terms, compound tokens such as product or error codes (AB-1234, v2.1)
+    are kept whole along with their parts
+    Args:
+        text: the text
+
+    Returns:
+        list of terms, in text order
+    """
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        terms.append(token)
+        if COMPOUND_SEPARATORS.search(token):
+            terms.extend(part for part in COMPOUND_SEPARATORS.split(token) if part)
+
+    return terms
+
+
+class _Segment:
+    """
+    Immutable postings segment: sorted vocabulary, and for each term a slice of the docs and freqs arrays
+    """
+
+    def __init__(
+        self,
+        terms: List[str],
+        offsets: np.ndarray,
+        docs: np.ndarray,
+        freqs: np.ndarray,
+    ):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.freqs = freqs
+        self._term_indexes = {term: index for index, term in enumerate(terms)}
+
+    @property
+    def size(self) -> int:
+        return len(self.docs)
+
+    @classmethod
+    def from_postings(
+        cls, postings: Dict[str, Tuple[List[int], List[int]]]
+    ) -> "_Segment":
+        """
+        Build a segment from in memory postings
+        Args:
+            postings: dictionary of term to (doc numbers, term frequencies)
+
+        Returns:
+            the segment
+        """
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term][0]) for term in terms])
+
+        docs = np.fromiter(
+            (doc for term in terms for doc in postings[term][0]),
+            dtype=np.int32,
+            count=int(offsets[-1]),
+        )
+        freqs = np.fromiter(
+            (min(freq, 65_535) for term in terms for freq in postings[term][1]),
+            dtype=np.uint16,
+            count=int(offsets[-1]),
+        )
+
+        return cls(terms, offsets, docs, freqs)
+
+    @classmethod
+    def merge(cls, segments: Sequence["_Segment"], live: np.ndarray) -> "_Segment":
+        """
+        Merge segments into a single one, postings of deleted documents are dropped
+        Args:
+            segments: the segments
+            live: boolean array, True for the doc numbers still indexed
+
+        Returns:
+            the merged segment
+        """
+        terms = sorted(set().union(*(segment.terms for segment in segments)))
+        term_indexes = {term: index for index, term in enumerate(terms)}
+
+        term_ids = np.concatenate(
+            [
+                np.repeat(
+                    np.array(
+                        [term_indexes[term] for term in segment.terms], dtype=np.int64
+                    ),
+                    np.diff(segment.offsets),
+                )
+                for segment in segments
+            ]
+        )
+        docs = np.concatenate([segment.docs for segment in segments])
+        freqs = np.concatenate([segment.freqs for segment in segments])
+
+        kept = live[docs]
+        term_ids, docs, freqs = term_ids[kept], docs[kept], freqs[kept]
+
+        order = np.lexsort((docs, term_ids))
+        term_ids, docs, freqs = term_ids[order], docs[order], freqs[order]
+
+        # terms whose postings were all deleted are dropped from the vocabulary
+        used_terms = np.unique(term_ids)
+        offsets = np.searchsorted(term_ids, np.append(used_terms, len(terms)))
+
+        return cls([terms[index] for index in used_terms], offsets, docs, freqs)
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        index = self._term_indexes.get(term)
+        if index is None:
+            return None
+
+        start, end = self.offsets[index], self.offsets[index + 1]
+
+        return self.docs[start:end], self.freqs[start:end]
+
+    def save(self, path: str):
+        term_offsets, term_buffer = _pack_strings(self.terms)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as segment_file:
+            np.savez(
+                segment_file,
+                term_offsets=term_offsets,
+                term_buffer=term_buffer,
+                offsets=self.offsets,
+                docs=self.docs,
+                freqs=self.freqs,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "_Segment":
+        with np.load(path) as data:
+            return cls(
+                _unpack_strings(data["term_offsets"], data["term_buffer"]),
+                data["offsets"],
+                data["docs"],
+                data["freqs"],
+            )
+
+
+class KeywordIndex:
+    """
+    Persistent BM25 inverted index
+
+    Documents are stored in sqlite, postings in immutable numpy segments written once FLUSH_SIZE documents
+    are buffered, segments are merged when they are too many. Buffered documents are read back from sqlite
+    when the index is opened, deleted documents are masked until their segments are merged.
+
+    The index is safe for a writer process and reader processes, readers reload on change
+    """
+
+    DOCUMENTS_FILE = "documents.sqlite"
+    SEGMENT_PREFIX = "segment_"
+    FLUSH_SIZE = 10_000
+    MAX_SEGMENTS = 8
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        """
+        Constructor
+        Args:
+            path: folder of the index
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.RLock()
+
+        os.makedirs(Path(path), exist_ok=True)
+        self._connection = sqlite3.connect(
+            os.path.join(path, KeywordIndex.DOCUMENTS_FILE), check_same_thread=False
+        )
+        self._connection.executescript(
+            "CREATE TABLE IF NOT EXISTS documents (doc INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "id TEXT UNIQUE NOT NULL, length INTEGER NOT NULL, page_content TEXT, metadata TEXT);"
+            "CREATE TABLE IF NOT EXISTS segments (name TEXT PRIMARY KEY, size INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS index_info (key TEXT PRIMARY KEY, value INTEGER);"
+        )
+        self._connection.commit()
+
+        self._segments: Dict[str, _Segment] = {}
+        self._generation = -1
+        self._refresh()
+
+    def _get_info(self, key: str, default: int) -> int:
+        row = self._connection.execute(
+            "SELECT value FROM index_info WHERE key = ?", (key,)
+        ).fetchone()
+
+        return row[0] if row else default
+
+    def _set_info(self, key: str, value: int):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO index_info (key, value) VALUES (?, ?)", (key, value)
+        )
+
+    def _bump_generation(self):
+        """
+        Helper method to signal a change to the other processes, must be called inside a transaction
+        """
+        self._generation = self._get_info("generation", 0) + 1
+        self._set_info("generation", self._generation)
+
+    def _refresh(self):
+        """
+        Helper method to load the index state, if it was changed since the last load
+        Must be called with the lock held
+        """
+        generation = self._get_info("generation", 0)
+        if generation == self._generation:
+            return
+
+        names = [
+            name for (name,) in self._connection.execute("SELECT name FROM segments")
+        ]
+        self._segments = {
+            name: self._segments.get(name)
+            or _Segment.load(os.path.join(self.path, name))
+            for name in names
+        }
+
+        (last_doc,) = self._connection.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'documents'"
+        ).fetchone()
+        self._lengths = np.zeros(last_doc + 1, dtype=np.float32)
+        self._live = np.zeros(last_doc + 1, dtype=bool)
+        for rows in batched(
+            self._connection.execute("SELECT doc, length FROM documents"), 100_000
+        ):
+            docs, lengths = np.array(rows, dtype=np.int64).T
+            self._lengths[docs] = lengths
+            self._live[docs] = True
+        self._total_length = float(self._lengths[self._live].sum())
+        self._live_count = int(np.count_nonzero(self._live))
+
+        # documents added since the last segment are kept in memory
+        self._flushed_doc = self._get_info("flushed_doc", 0)
+        self._buffer: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._buffered_count = 0
+        for doc, page_content in self._connection.execute(
+            "SELECT doc, page_content FROM documents WHERE doc > ? ORDER BY doc",
+            (self._flushed_doc,),
+        ):
+            self._buffer_document(doc, Counter(tokenize(page_content or "")))
+
+        self._generation = generation
+
+    def _buffer_document(self, doc: int, term_counts: Counter):
+        for term, count in term_counts.items():
+            postings = self._buffer.get(term)
+            if postings is None:
+                postings = self._buffer[term] = ([], [])
+            postings[0].append(doc)
+            postings[1].append(count)
+        self._buffered_count += 1
+
+    def _ensure_capacity(self, last_doc: int):
+        if last_doc < len(self._lengths):
+            return
+
+        capacity = max(len(self._lengths), 1024)
+        while capacity <= last_doc:
+            capacity *= 2
+
+        self._lengths = np.resize(self._lengths, capacity)
+        self._lengths[len(self._live) :] = 0
+        self._live = np.concatenate(
+            [self._live, np.zeros(capacity - len(self._live), dtype=bool)]
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._live_count
+
+    def add(self, ids: Sequence[str], documents: Sequence[Document]):
+        """
+        Add documents to the index, documents with an existing id are replaced
+        Args:
+            ids: document ids, as given to the vector store
+            documents: the documents
+
+        Returns:
+
+        """
+        if not ids:
+            return
+
+        with self._lock:
+            self._refresh()
+            self._delete_ids(ids)
+
+            term_counts = [Counter(tokenize(doc.page_content)) for doc in documents]
+
+            (last_doc,) = self._connection.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'documents'"
+            ).fetchone()
+            docs = list(range(last_doc + 1, last_doc + 1 + len(ids)))
+
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT INTO documents (doc, id, length, page_content, metadata) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            doc,
+                            doc_id,
+                            sum(counts.values()),
+                            document.page_content,
+                            json.dumps(document.metadata, default=str),
+                        )
+                        for doc, doc_id, document, counts in zip(
+                            docs, ids, documents, term_counts
+                        )
+                    ],
+                )
+                self._bump_generation()
+
+            self._ensure_capacity(docs[-1])
+            for doc, counts in zip(docs, term_counts):
+                length = sum(counts.values())
+                self._lengths[doc] = length
+                self._live[doc] = True
+                self._total_length += length
+                self._buffer_document(doc, counts)
+            self._live_count += len(docs)
+
+            if self._buffered_count >= KeywordIndex.FLUSH_SIZE:
+                self.flush()
+
+    def _delete_ids(self, ids: Sequence[str]):
+        """
+        Helper method to remove documents from the index, must be called with the lock held
+        """
+        docs: List[int] = []
+        for ids_batch in batched(ids, 500):
+            docs.extend(
+                doc
+                for (doc,) in self._connection.execute(
+                    f"SELECT doc FROM documents WHERE id IN ({','.join('?' * len(ids_batch))})",
+                    ids_batch,
+                )
+            )
+
+        if not docs:
+            return
+
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM documents WHERE doc = ?", [(doc,) for doc in docs]
+            )
+            self._bump_generation()
+
+        doc_array = np.array(docs, dtype=np.int64)
+        self._live[doc_array] = False
+        self._total_length -= float(self._lengths[doc_array].sum())
+        self._live_count -= len(docs)
+
+    def delete(self, ids: Sequence[str]):
+        """
+        Remove documents from the index
+        Args:
+            ids: document ids
+
+        Returns:
+
+        """
+        if not ids:
+            return
+
+        with self._lock:
+            self._refresh()
+            self._delete_ids(ids)
+
+    def flush(self):
+        """
+        Write the buffered documents postings as a new segment, then merge segments if they are too many
+        """
+        with self._lock:
+            self._refresh()
+            if not self._buffer:
+                return
+
+            name = f"{KeywordIndex.SEGMENT_PREFIX}{uuid.uuid4().hex}.npz"
+            segment = _Segment.from_postings(self._buffer)
+            segment.save(os.path.join(self.path, name))
+
+            flushed_doc = max(docs[-1] for docs, _ in self._buffer.values())
+
+            with self._connection:
+                self._connection.execute(
+                    "INSERT INTO segments (name, size) VALUES (?, ?)",
+                    (name, segment.size),
+                )
+                self._set_info("flushed_doc", flushed_doc)
+                self._bump_generation()
+
+            self._segments[name] = segment
+            self._flushed_doc = flushed_doc
+            self._buffer = {}
+            self._buffered_count = 0
+
+            while len(self._segments) > KeywordIndex.MAX_SEGMENTS:
+                # merging the two smallest segments keeps the merge cost logarithmic by posting
+                smallest = sorted(
+                    self._segments, key=lambda key: self._segments[key].size
+                )
+                self._merge(smallest[:2])
+
+    def optimize(self):
+        """
+        Flush the buffered documents and merge every segment into one, dropping deleted documents
+        """
+        with self._lock:
+            self.flush()
+            if len(self._segments) > 1 or not self._live.all():
+                self._merge(list(self._segments))
+
+    def _merge(self, names: List[str]):
+        """
+        Helper method to replace segments by their merge, must be called with the lock held
+        """
+        if not names:
+            return
+
+        name = f"{KeywordIndex.SEGMENT_PREFIX}{uuid.uuid4().hex}.npz"
+        segment = _Segment.merge([self._segments[old] for old in names], self._live)
+        segment.save(os.path.join(self.path, name))
+
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM segments WHERE name = ?", [(old,) for old in names]
+            )
+            self._connection.execute(
+                "INSERT INTO segments (name, size) VALUES (?, ?)", (name, segment.size)
+            )
+            self._bump_generation()
+
+        for old in names:
+            del self._segments[old]
+            os.remove(os.path.join(self.path, old))
+        self._segments[name] = segment
+
+    def _term_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Helper method to gather the postings of a term from every segment and the buffer
+        """
+        docs = []
+        freqs = []
+        for segment in self._segments.values():
+            postings = segment.postings(term)
+            if postings:
+                docs.append(postings[0])
+                freqs.append(postings[1])
+
+        buffered = self._buffer.get(term)
+        if buffered:
+            docs.append(np.array(buffered[0], dtype=np.int32))
+            freqs.append(np.array(buffered[1], dtype=np.uint16))
+
+        if not docs:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.uint16)
+
+        return np.concatenate(docs), np.concatenate(freqs)
+
+    def search(
+        self, query: str, k: int = 4, search_filter: Optional[dict] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Search documents with BM25 scoring
+        Args:
+            query: the query text
+            k: number of documents to return
+            search_filter: optional metadata filter, a value or a dictionary of operators ($eq, $ne, $gt,
+                $gte, $lt, $lte, $in, $nin) by key
+
+        Returns:
+            list of tuples with the document and its BM25 score, best first
+        """
+        # unsupported operators are reported before any scoring
+        filter_conditions(search_filter)
+
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or k < 1:
+            return []
+
+        with self._lock:
+            self._refresh()
+            if not self._live_count:
+                return []
+
+            average_length = self._total_length / self._live_count
+
+            all_docs = []
+            all_scores = []
+            for term in terms:
+                docs, freqs = self._term_postings(term)
+                live = self._live[docs]
+                docs, freqs = docs[live], freqs[live]
+                if not len(docs):
+                    continue
+
+                idf = math.log(
+                    1 + (self._live_count - len(docs) + 0.5) / (len(docs) + 0.5)
+                )
+                freqs = freqs.astype(np.float32)
+                norms = self.k1 * (
+                    1 - self.b + self.b * self._lengths[docs] / average_length
+                )
+                all_docs.append(docs)
+                all_scores.append(idf * freqs * (self.k1 + 1) / (freqs + norms))
+
+            if not all_docs:
+                return []
+
+            unique_docs, inverse = np.unique(
+                np.concatenate(all_docs), return_inverse=True
+            )
+            scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+            order = np.argsort(-scores, kind="stable")
+            # terms found in nearly every document do not make a match
+            order = order[scores[order] > 0]
+
+            results: List[Tuple[Document, float]] = []
+            batch_size = k if not search_filter else k * 4
+            for start in range(0, len(order), batch_size):
+                batch = order[start : start + batch_size]
+                documents = self._documents(unique_docs[batch].tolist())
+                for index in batch:
+                    document = documents.get(int(unique_docs[index]))
+                    if document is None or not metadata_matches(
+                        document.metadata, search_filter
+                    ):
+                        continue
+                    results.append((document, float(scores[index])))
+                    if len(results) == k:
+                        return results
+
+            return results
+
+    def _documents(self, docs: List[int]) -> Dict[int, Document]:
+        return {
+            doc: Document(page_content=page_content, metadata=json.loads(metadata))
+            for doc, page_content, metadata in self._connection.execute(
+                f"SELECT doc, page_content, metadata FROM documents "
+                f"WHERE doc IN ({','.join('?' * len(docs))})",
+                docs,
+            )
+        }
+
+
+class KeywordIndexingVectorStore(VectorStoreProxy):
+    """
+    Vector store proxy maintaining the keyword index as chunks are added to and deleted from
+    the wrapped vector store
+    """
+
+    def __init__(self, vector_store: VectorStore, keyword_index: KeywordIndex):
+        """
+        Constructor
+        Args:
+            vector_store: the wrapped vector store
+            keyword_index: the keyword index
+        """
+        super().__init__(vector_store)
+        self.keyword_index = keyword_index
+
+    def add_documents(self, documents: List[Document], **kwargs: Any) -> List[str]:
+        """
+        Add documents to the wrapped vector store then to the keyword index
+        """
+        ids = self.vector_store.add_documents(documents, **kwargs)
+
+        # prefer the ids given by the caller, some vector stores return their own internal ids
+        stored_ids = kwargs.get("ids") or ids
+        if stored_ids:
+            self.keyword_index.add(stored_ids, documents)
+
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """
+        Remove documents from the keyword index then from the wrapped vector store
+        """
+        if ids:
+            self.keyword_index.delete(ids)
+
+        return self.vector_store.delete(ids, **kwargs)
@@ -0,0 +1,305 @@
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple, cast
+
+from langchain.schema.vectorstore import VectorStore
+
+from eurelis_kb_framework.vectorstores.capabilities import (
+    PrecomputedEmbeddingsCapability,
+    StoredEmbeddingsCapability,
+)
+
+if TYPE_CHECKING:
+    from langchain.indexes import SQLRecordManager
+
+    from eurelis_kb_framework.langchain_wrapper import LangchainWrapper
+
+
+# fields added to the metadata by some vector stores, not copied
+STORE_FIELDS = {"_id", "_uid"}
+
+
+def copied_metadata(metadata: dict) -> dict:
+    """
+    Metadata of a copied document, without the fields added by the source vector store
+    """
+    return {key: value for key, value in metadata.items() if key not in STORE_FIELDS}
+
+
+def record_key_pages(
+    record_manager: "SQLRecordManager", after: Optional[str], page_size: int
+) -> Iterator[List[Tuple[str, Optional[str]]]]:
+    """
+    Read the keys of a namespace page by page, in key order
+    Args:
+        record_manager: the record manager of the namespace
+        after: optional key, only the keys after this one are read
+        page_size: number of keys by page
+
+    Returns:
+        iterator over pages of tuples with the key and its group id
+    """
+    from langchain.indexes._sql_record_manager import UpsertionRecord
+
+    while True:
+        with record_manager._make_session() as session:
+            query = session.query(UpsertionRecord.key, UpsertionRecord.group_id).filter(
+                UpsertionRecord.namespace == record_manager.namespace
+            )
+            if after is not None:
+                query = query.filter(UpsertionRecord.key > after)
+            page = [
+                (key, group_id)
+                for key, group_id in query.order_by(UpsertionRecord.key)
+                .limit(page_size)
+                .all()
+            ]
+
+        if not page:
+            return
+
+        yield page
+
+        if len(page) < page_size:
+            return
+
+        after = page[-1][0]
+
+
+class CopyState:
+    """
+    Progress of a copy, persisted as a json file so that an interrupted copy resumes where it stopped
+
+    For each namespace, the state keeps the last record key of the copied pages, keys are copied in order
+    """
+
+    def __init__(self, path: Optional[str]):
+        """
+        Constructor
+        Args:
+            path: optional json file, the progress is not persisted if not provided
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._namespaces: Dict[str, dict] = {}
+
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as state_file:
+                self._namespaces = json.load(state_file)
+
+    def get(self, namespace: str) -> dict:
+        with self._lock:
+            return dict(
+                self._namespaces.get(
+                    namespace, {"last_key": None, "copied": 0, "done": False}
+                )
+            )
+
+    def set(self, namespace: str, last_key: Optional[str], copied: int, done: bool):
+        with self._lock:
+            self._namespaces[namespace] = {
+                "last_key": last_key,
+                "copied": copied,
+                "done": done,
+            }
+
+            if not self.path:
+                return
+
+            # write then rename, an interruption never leaves a truncated state
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, "w", encoding="utf-8") as state_file:
+                json.dump(self._namespaces, state_file, indent=2)
+            os.replace(temporary_path, self.path)
+
+
+class VectorStoreCopy:
+    """
+    Copy the documents of the datasets of a project from its vector store to the vector store of another
+    configuration, with their stored embeddings, nothing is embedded again
+
+    The record manager keys of each dataset namespace drive the copy: keys are read page by page, in key
+    order, the documents of a page are fetched from the source vector store with their embeddings, written
+    to the target vector store then recorded in the target record manager with their group id (the source id),
+    so that incremental indexing goes on from the target configuration
+    """
+
+    def __init__(
+        self,
+        source: "LangchainWrapper",
+        target: "LangchainWrapper",
+        page_size: int = 500,
+        workers: int = 4,
+        state_path: Optional[str] = None,
+    ):
+        """
+        Constructor
+        Args:
+            source: wrapper of the source configuration
+            target: wrapper of the target configuration
+            page_size: number of documents copied at once
+            workers: number of pages written in parallel
+            state_path: optional json file keeping the progress, to resume an interrupted copy
+        """
+        self.source = source
+        self.target = target
+        self.page_size = page_size
+        self.workers = workers
+        self.state = CopyState(state_path)
+
+    def _copy_page(
+        self,
+        source_store: VectorStore,
+        target_store: VectorStore,
+        target_record_manager: Optional["SQLRecordManager"],
+        page: List[Tuple[str, Optional[str]]],
+    ) -> int:
+        """
+        Helper method to copy the documents of a page of keys
+        Returns:
+            number of copied documents
+        """
+        group_ids = dict(page)
+
+        # keys without document in the source vector store are not recorded in the target
+        documents = cast(
+            StoredEmbeddingsCapability, source_store
+        ).get_by_ids_with_embeddings([key for key, _ in page])
+        if not documents:
+            return 0
+
+        cast(PrecomputedEmbeddingsCapability, target_store).add_embeddings(
+            [doc.page_content for _, doc, _ in documents],
+            [embedding for _, _, embedding in documents],
+            [copied_metadata(doc.metadata) for _, doc, _ in documents],
+            [key for key, _, _ in documents],
+        )
+
+        if target_record_manager is not None:
+            target_record_manager.update(
+                [key for key, _, _ in documents],
+                group_ids=[group_ids.get(key) for key, _, _ in documents],
+            )
+
+        return len(documents)
+
+    def _copy_namespace(
+        self,
+        namespace: str,
+        source_store: VectorStore,
+        target_store: VectorStore,
+    ) -> dict:
+        """
+        Helper method to copy the documents of a namespace, pages are written in parallel and the progress
+        saved once every previous page is written
+        Returns:
+            dictionary with the number of copied documents and the copy status
+        """
+        state = self.state.get(namespace)
+        if state["done"]:
+            return {"copied": state["copied"], "status": "already copied"}
+
+        source_record_manager = self.source._get_record_manager(namespace)
+        target_record_manager = (
+            None
+            if self.source.record_manager_db_url == self.target.record_manager_db_url
+            else self.target._get_record_manager(namespace)
+        )
+
+        copied = state["copied"]
+        last_key = state["last_key"]
+
+        # pages done out of order wait here until every previous page is done
+        finished: Dict[int, Tuple[str, int]] = {}
+        next_page = 0
+        in_flight: Dict[Future, Tuple[int, str]] = {}
+
+        def collect(futures):
+            nonlocal copied, last_key, next_page
+            for future in futures:
+                page_number, page_last_key = in_flight.pop(future)
+                finished[page_number] = (page_last_key, future.result())
+
+            while next_page in finished:
+                page_last_key, page_copied = finished.pop(next_page)
+                copied += page_copied
+                last_key = page_last_key
+                next_page += 1
+            self.state.set(namespace, last_key, copied, False)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for page_number, page in enumerate(
+                record_key_pages(source_record_manager, last_key, self.page_size)
+            ):
+                if len(in_flight) >= 2 * self.workers:
+                    done, _ = wait(in_flight.keys(), return_when=FIRST_COMPLETED)
+                    collect(done)
+
+                future = executor.submit(
+                    self._copy_page,
+                    source_store,
+                    target_store,
+                    target_record_manager,
+                    page,
+                )
+                in_flight[future] = (page_number, page[-1][0])
+
+            while in_flight:
+                done, _ = wait(in_flight.keys(), return_when=FIRST_COMPLETED)
+                collect(done)
+
+        self.state.set(namespace, last_key, copied, True)
+
+        return {"copied": copied, "status": "copied"}
+
+    def copy(self, dataset_id: Optional[str] = None) -> Dict[str, dict]:
+        """
+        Copy the datasets found in both configurations
+        Args:
+            dataset_id: optional, if given only the named dataset is copied
+
+        Returns:
+            dictionary of dataset id to the copy results
+        """
+        self.source.ensure_initialized()
+        self.target.ensure_initialized()
+
+        if self.source.project != self.target.project:
+            # record keys are hashes of the documents, namespace included
+            raise ValueError(
+                f"Source project {self.source.project} and target project {self.target.project} differ, "
+                f"copied documents would be indexed again"
+            )
+
+        target_datasets = {
+            dataset.id: dataset for dataset in self.target._list_datasets(dataset_id)
+        }
+
+        results: Dict[str, dict] = {}
+        for dataset in self.source._list_datasets(dataset_id):
+            target_dataset = target_datasets.get(dataset.id)
+            if not target_dataset or not dataset.index or dataset.index == "cache":
+                continue
+
+            if not isinstance(dataset.vector_store, StoredEmbeddingsCapability):
+                raise ValueError(
+                    f"The vector store of the '{dataset.id}' dataset does not return its stored embeddings"
+                )
+            if not isinstance(
+                target_dataset.vector_store, PrecomputedEmbeddingsCapability
+            ):
+                raise ValueError(
+                    f"The target vector store of the '{dataset.id}' dataset does not accept embeddings"
+                )
+
+            namespace = f"{self.source.project}/{dataset.name}"
+            results[dataset.id] = self.source.console.status(
+                f"Copying '{dataset.id}' dataset",
+                lambda: self._copy_namespace(
+                    namespace, dataset.vector_store, target_dataset.vector_store
+                ),
+            )
+
+        return results
@@ -1,4 +1,4 @@
-from typing import TYPE_CHECKING, cast
+from typing import TYPE_CHECKING, Optional, cast
 
 from langchain.schema.vectorstore import VectorStore
 
@@ -10,10 +10,24 @@ if TYPE_CHECKING:
 
 class MongoDBVectorStoreFactory(ParamsDictFactory[VectorStore]):
     """
-    Factory to get a mongodb based vector store
+    Factory to get a mongodb based vector store, its indexes are created by the vectorstore init command
+
+    Optional parameters: batch_size (documents written at once), write_concern (w value or dictionary with
+    w, j and wtimeout keys) and the client pool and timeouts options of CLIENT_OPTIONS
     """
 
-    OPTIONAL_PARAMS = {"index_name", "text_key", "embedding_key"}
+    OPTIONAL_PARAMS = {"index_name", "text_key", "embedding_key", "batch_size"}
+
+    # client options, configuration name to driver name
+    CLIENT_OPTIONS = {
+        "max_pool_size": "maxPoolSize",
+        "min_pool_size": "minPoolSize",
+        "max_idle_time_ms": "maxIdleTimeMS",
+        "connect_timeout_ms": "connectTimeoutMS",
+        "socket_timeout_ms": "socketTimeoutMS",
+        "server_selection_timeout_ms": "serverSelectionTimeoutMS",
+        "wait_queue_timeout_ms": "waitQueueTimeoutMS",
+    }
 
     def __init__(self):
         super().__init__()
@@ -55,54 +69,32 @@ class MongoDBVectorStoreFactory(ParamsDictFactory[VectorStore]):
             f"Getting MongoDB vector store, using database {db_name} and collection {collection_name}"
         )
 
-        mongo_client = MongoClient(url)
-        collection = mongo_client[db_name][collection_name]
-
-        other_params = self.get_optional_params()
-
-        #
-        # FIXME
-        # VLA - le 07/03/2024
-        # This part of the code is commented because it is not working
-        # An error is raised when trying to create the search index
-        # pymongo.errors.OperationFailure: command not found, full error: {'ok': 0, 'errmsg': 'command not found', 'code': 59, 'codeName': 'CommandNotFound'}
-        #
-        server_info = mongo_client.server_info()
-        print(server_info)
-        version_array = server_info["versionArray"]
-
-        search_index = {
-            "name": cast(str, other_params.get("index_name")),
-            "definition": {
-                "type": "vectorSearch",
-                "fields": [
-                    {
-                        "numDimensions": len(context.embeddings.embed_query("")),
-                        "path": cast(str, other_params.get("embedding_key")),
-                        "similarity": "cosine",
-                        "type": "vector",
-                    }
-                ],
+        mongo_client = MongoClient(
+            url,
+            **{
+                driver_name: self.params[name]
+                for name, driver_name in MongoDBVectorStoreFactory.CLIENT_OPTIONS.items()
+                if name in self.params
             },
-        }
-
-        display_search_index_info = True
-
-        if version_array[0] >= 7:
-            from pymongo.errors import OperationFailure
+        )
+        collection = mongo_client[db_name][collection_name]
 
-            try:
-                collection.create_search_index(search_index)
-                display_search_index_info = False
-            except OperationFailure:
-                context.console.print("Unable to auto create search index")
+        write_concern = self.params.get("write_concern")
+        if write_concern is not None:
+            from pymongo.write_concern import WriteConcern  # type: ignore[import-not-found]
 
-        if display_search_index_info:
-            context.console.print("MongoDB vector store search index configuration:")
-            import json
+            collection = collection.with_options(
+                write_concern=WriteConcern(**write_concern)
+                if isinstance(write_concern, dict)
+                else WriteConcern(w=write_concern)
+            )
 
-            context.console.print(json.dumps(search_index))
+        other_params = dict(self.get_optional_params())
+        batch_size = cast(Optional[int], other_params.pop("batch_size", None))
 
         return MongoDBSimilarityAtlasVectorStoreSearch(
-            collection, context.embeddings, **other_params
+            collection,
+            context.embeddings,
+            batch_size=batch_size,
+            **other_params,
         )
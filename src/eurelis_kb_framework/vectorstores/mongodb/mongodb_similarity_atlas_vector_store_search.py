@@ -1,14 +1,63 @@
-from typing import Optional, List, Any, Callable
+import json
+from typing import (
+    Optional,
+    List,
+    Any,
+    Callable,
+    Tuple,
+    Dict,
+    Sequence,
+    Iterator,
+    Iterable,
+)
 
 from langchain.schema import Document
 from langchain_community.vectorstores import MongoDBAtlasVectorSearch
 
+from eurelis_kb_framework.types import EMBEDDING
+from eurelis_kb_framework.vectorstores.capabilities import (
+    StoredEmbeddingsCapability,
+    MetadataScanCapability,
+    SimilaritySearchWithEmbeddingsCapability,
+    IndexSetupCapability,
+    PrecomputedEmbeddingsCapability,
+)
 
-class MongoDBSimilarityAtlasVectorStoreSearch(MongoDBAtlasVectorSearch):
+
+class MongoDBSimilarityAtlasVectorStoreSearch(
+    MongoDBAtlasVectorSearch,
+    StoredEmbeddingsCapability,
+    MetadataScanCapability,
+    SimilaritySearchWithEmbeddingsCapability,
+    IndexSetupCapability,
+    PrecomputedEmbeddingsCapability,
+):
     """
     Class to enable similarity search with score on mongodb
+
+    Documents are written with unordered bulk writes, documents added with ids are upserted on their
+    _uid field, so that adding them again replaces them. The _uid index is created on the first write
+    with ids, without it each upsert would scan the whole collection
     """
 
+    DEFAULT_BATCH_SIZE = 1000
+
+    def __init__(self, *args: Any, batch_size: Optional[int] = None, **kwargs: Any):
+        """
+        Constructor
+        Args:
+            *args: MongoDBAtlasVectorSearch arguments
+            batch_size: optional number of documents embedded and written at once, default to 1000
+            **kwargs: MongoDBAtlasVectorSearch arguments
+        """
+        super().__init__(*args, **kwargs)
+        self.batch_size = (
+            batch_size
+            if batch_size
+            else MongoDBSimilarityAtlasVectorStoreSearch.DEFAULT_BATCH_SIZE
+        )
+        self._uid_index_ready = False
+
     def _select_relevance_score_fn(self) -> Callable[[float], float]:
         """
         The 'correct' relevance function
@@ -22,6 +71,219 @@ class MongoDBSimilarityAtlasVectorStoreSearch(MongoDBAtlasVectorSearch):
         # override default implementation which is buggy
         return lambda x: x
 
+    def search_index_definition(self, dimension: int) -> dict:
+        """
+        Method to get the definition of the atlas vector search index
+        Args:
+            dimension: dimension of the embeddings
+
+        Returns:
+            the search index definition
+        """
+        return {
+            "name": self._index_name,
+            "definition": {
+                "type": "vectorSearch",
+                "fields": [
+                    {
+                        "numDimensions": dimension,
+                        "path": self._embedding_key,
+                        "similarity": "cosine",
+                        "type": "vector",
+                    }
+                ],
+            },
+        }
+
+    def setup_indexes(
+        self, dimension: int, fields: Sequence[str] = ("namespace",)
+    ) -> List[str]:
+        """
+        Method to create the _uid and metadata fields indexes, used by deletes and cleanups, and the atlas
+        vector search index, search indexes can only be created by MongoDB 7 or newer atlas deployments
+
+        Args:
+            dimension: dimension of the embeddings
+            fields: metadata fields to index
+
+        Returns:
+            list of messages describing the setup
+        """
+        from pymongo.errors import OperationFailure  # type: ignore[import-not-found]
+
+        messages = []
+        for field in dict.fromkeys(["_uid", *fields]):
+            # create_index keeps an existing index with the same key
+            name = self._collection.create_index(field)
+            messages.append(f"Index {name} on {field} ready")
+        self._uid_index_ready = True
+
+        search_index = self.search_index_definition(dimension)
+
+        version_array = self._collection.database.client.server_info()["versionArray"]
+        if version_array[0] >= 7:
+            try:
+                if any(
+                    index["name"] == self._index_name
+                    for index in self._collection.list_search_indexes()
+                ):
+                    return [
+                        *messages,
+                        f"Search index {self._index_name} already exists",
+                    ]
+
+                self._collection.create_search_index(search_index)
+                return [*messages, f"Search index {self._index_name} created"]
+            except OperationFailure:
+                pass
+
+        return [
+            *messages,
+            "Unable to create the search index, create it with this configuration:",
+            json.dumps(search_index),
+        ]
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List:
+        """Run more texts through the embeddings and add to the vectorstore.
+
+        Texts are embedded and written batch by batch, each batch with a single unordered bulk write
+
+        Args:
+            texts: Iterable of strings to add to the vectorstore.
+            metadatas: Optional list of metadatas associated with the texts.
+            ids: Optional list of unique ids, stored in the _uid field, existing documents with the
+                same ids are replaced
+            batch_size: Optional number of texts embedded and written at once.
+
+        Returns:
+            List of ids from adding the texts into the vectorstore, the _id of the new records if no ids are given.
+        """
+        texts = list(texts)
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        if ids is not None and len(ids) != len(texts):
+            raise ValueError("ids length mismatch texts length")
+
+        batch_size = kwargs.get("batch_size", self.batch_size)
+        result_ids: List = []
+
+        for start in range(0, len(texts), batch_size):
+            batch_texts = texts[start : start + batch_size]
+            result_ids.extend(
+                self._write_records(
+                    batch_texts,
+                    self._embedding.embed_documents(batch_texts),
+                    metadatas[start : start + batch_size],
+                    ids[start : start + batch_size] if ids is not None else None,
+                )
+            )
+
+        return result_ids
+
+    def _ensure_uid_index(self):
+        """
+        Helper method to create the _uid index used by upserts and deletes, once by instance
+        """
+        if self._uid_index_ready:
+            return
+
+        # create_index keeps an existing index with the same key
+        self._collection.create_index("_uid")
+        self._uid_index_ready = True
+
+    def _write_records(
+        self,
+        texts: Sequence[str],
+        embeddings: Sequence[EMBEDDING],
+        metadatas: Sequence[dict],
+        ids: Optional[Sequence[str]],
+    ) -> List:
+        """
+        Helper method to write records with a single unordered bulk write
+        Args:
+            texts: page contents
+            embeddings: the embeddings, one by text
+            metadatas: metadata, one by text
+            ids: optional ids, stored in the _uid field, existing records with the same ids are replaced
+
+        Returns:
+            the ids, the _id of the new records if no ids are given
+        """
+        from bson import ObjectId  # type: ignore[import-not-found]
+        from pymongo import InsertOne, ReplaceOne  # type: ignore[import-not-found]
+
+        if ids is not None:
+            self._ensure_uid_index()
+
+        requests: List[Any] = []
+        result_ids: List = []
+        for index, (text, embedding, metadata) in enumerate(
+            zip(texts, embeddings, metadatas)
+        ):
+            record = {
+                self._text_key: text,
+                self._embedding_key: list(embedding),
+                **metadata,
+            }
+            if ids is None:
+                record["_id"] = ObjectId()
+                requests.append(InsertOne(record))
+                result_ids.append(record["_id"])
+            else:
+                # to enable deleting documents we must store the unique id used by the index system
+                record["_uid"] = ids[index]
+                requests.append(ReplaceOne({"_uid": ids[index]}, record, upsert=True))
+                result_ids.append(ids[index])
+
+        if requests:
+            self._collection.bulk_write(requests, ordered=False)
+
+        return result_ids
+
+    def add_embeddings(
+        self,
+        texts: Sequence[str],
+        embeddings: Sequence[EMBEDDING],
+        metadatas: Optional[Sequence[dict]] = None,
+        ids: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        """
+        Method to add documents with already computed embeddings, existing ids are replaced
+
+        Args:
+            texts: page contents
+            embeddings: the embeddings, one by text
+            metadatas: optional metadata, one by text
+            ids: optional ids, one by text
+
+        Returns:
+            the ids of the added documents
+        """
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        if not len(texts) == len(embeddings) == len(metadatas) or (
+            ids is not None and len(ids) != len(texts)
+        ):
+            raise ValueError("texts, embeddings, metadatas and ids lengths mismatch")
+
+        result_ids: List = []
+        for start in range(0, len(texts), self.batch_size):
+            end = start + self.batch_size
+            result_ids.extend(
+                self._write_records(
+                    texts[start:end],
+                    embeddings[start:end],
+                    metadatas[start:end],
+                    ids[start:end] if ids is not None else None,
+                )
+            )
+
+        return [str(result_id) for result_id in result_ids]
+
     def add_documents(self, documents: List[Document], **kwargs: Any) -> List[str]:
         """Run more documents through the embeddings and add to the vectorstore.
 
@@ -31,16 +293,6 @@ class MongoDBSimilarityAtlasVectorStoreSearch(MongoDBAtlasVectorSearch):
         Returns:
             List[str]: List of IDs of the added texts.
         """
-        if "ids" in kwargs:
-            # to enable deleting documents we must store the unique id used by the index system
-            ids = kwargs["ids"]
-            if len(ids) != len(documents):
-                raise ValueError("ids length mismatch documents length")
-
-            for doc_index, doc in enumerate(documents):
-                doc.metadata["_uid"] = ids[doc_index]
-
-        # TODO: Handle the case where the user doesn't provide ids on the Collection
         texts = [doc.page_content for doc in documents]
         metadatas = [doc.metadata for doc in documents]
         return self.add_texts(texts, metadatas, **kwargs)
@@ -56,11 +308,194 @@ class MongoDBSimilarityAtlasVectorStoreSearch(MongoDBAtlasVectorSearch):
             Optional[bool]: True if deletion is successful,
             False otherwise, None if not implemented.
         """
+        from pymongo import DeleteMany  # type: ignore[import-not-found]
 
         if not ids:
             return True
 
-        del_query = {"_uid": {"$in": ids}}
-        self._collection.delete_many(del_query)
+        batch_size = kwargs.get("batch_size", self.batch_size)
+        self._collection.bulk_write(
+            [
+                DeleteMany({"_uid": {"$in": ids[start : start + batch_size]}})
+                for start in range(0, len(ids), batch_size)
+            ],
+            ordered=False,
+        )
 
         return True
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        pre_filter: Optional[Dict] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """Return docs most similar to embedding vector and their relevance score.
+
+        Args:
+            embedding: Embedding to look up documents similar to.
+            k: Number of Documents to return. Defaults to 4.
+            pre_filter: (Optional) dictionary of argument(s) to prefilter document fields on.
+
+        Returns:
+            List of documents most similar to the query vector and their scores.
+        """
+        return self._similarity_search_with_score(embedding, k=k, pre_filter=pre_filter)
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        pre_filter: Optional[Dict] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        """Return docs most similar to embedding vector.
+
+        Args:
+            embedding: Embedding to look up documents similar to.
+            k: Number of Documents to return. Defaults to 4.
+            pre_filter: (Optional) dictionary of argument(s) to prefilter document fields on.
+
+        Returns:
+            List of documents most similar to the query vector.
+        """
+        return [
+            doc
+            for doc, _ in self._similarity_search_with_score(
+                embedding, k=k, pre_filter=pre_filter
+            )
+        ]
+
+    def _document_from_record(self, record: dict) -> Tuple[Document, EMBEDDING]:
+        """
+        Helper method to build a document and its embedding from a mongodb record
+        Args:
+            record: the mongodb record
+
+        Returns:
+            tuple with the document and its stored embedding
+        """
+        text = record.pop(self._text_key, "")
+        embedding = record.pop(self._embedding_key, None)
+
+        return Document(page_content=text, metadata=record), embedding
+
+    def metadata_search_with_embeddings(
+        self, k: int = 10, search_filter: Optional[dict] = None
+    ) -> List[Tuple[Document, EMBEDDING]]:
+        """
+        Method to fetch k documents matching a metadata filter, with their stored embeddings
+
+        Args:
+            k: max number of documents to return
+            search_filter: metadata filter
+
+        Returns:
+            list of tuples with the document and its stored embedding
+        """
+        cursor = self._collection.find(search_filter or {}, limit=k)
+
+        return [self._document_from_record(record) for record in cursor]
+
+    def get_by_ids_with_embeddings(
+        self, ids: Sequence[str]
+    ) -> List[Tuple[str, Document, EMBEDDING]]:
+        """
+        Method to fetch documents from their ids, with their stored embeddings
+
+        Args:
+            ids: ids of the documents, as given to add_documents
+
+        Returns:
+            list of tuples with the id, the document and its stored embedding, unknown ids are omitted
+        """
+        if not ids:
+            return []
+
+        cursor = self._collection.find({"_uid": {"$in": list(ids)}})
+
+        return [
+            (record.get("_uid"), *self._document_from_record(record))
+            for record in cursor
+        ]
+
+    def metadata_scan(
+        self, search_filter: Optional[dict] = None, page_size: int = 1000
+    ) -> Iterator[List[Document]]:
+        """
+        Method to iterate over every document matching a metadata filter, page by page
+
+        Pages are read in _id order, each page starting after the last _id of the previous one
+
+        Args:
+            search_filter: metadata filter
+            page_size: number of documents fetched at once
+
+        Returns:
+            iterator over pages of documents
+        """
+        last_id = None
+
+        while True:
+            query = search_filter or {}
+            if last_id is not None:
+                query = {"$and": [query, {"_id": {"$gt": last_id}}]}
+
+            records = list(
+                self._collection.find(
+                    query,
+                    projection={self._embedding_key: False},
+                    sort=[("_id", 1)],
+                    limit=page_size,
+                )
+            )
+
+            if not records:
+                return
+
+            last_id = records[-1]["_id"]
+
+            yield [self._document_from_record(record)[0] for record in records]
+
+            if len(records) < page_size:
+                return
+
+    def similarity_search_with_embeddings(
+        self, embedding: EMBEDDING, k: int = 4, search_filter: Optional[dict] = None
+    ) -> List[Tuple[Document, float, EMBEDDING]]:
+        """
+        Method to run a similarity search by vector, with the stored embeddings of the results
+
+        Args:
+            embedding: the query embedding
+            k: max number of documents to return
+            search_filter: metadata filter, used as the vector search pre filter
+
+        Returns:
+            list of tuples with the document, its relevance score and its stored embedding, best first
+        """
+        params = {
+            "queryVector": list(embedding),
+            "path": self._embedding_key,
+            "numCandidates": k * 10,
+            "limit": k,
+            "index": self._index_name,
+        }
+        if search_filter:
+            params["filter"] = search_filter
+
+        cursor = self._collection.aggregate(
+            [
+                {"$vectorSearch": params},
+                {"$set": {"score": {"$meta": "vectorSearchScore"}}},
+            ]
+        )
+
+        results = []
+        for record in cursor:
+            score = record.pop("score")
+            doc, stored_embedding = self._document_from_record(record)
+            results.append((doc, score, stored_embedding))
+
+        return results
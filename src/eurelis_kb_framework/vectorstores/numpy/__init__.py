@@ -0,0 +1,115 @@
+import os
+from typing import TYPE_CHECKING, Optional, Union
+
+from langchain.schema.vectorstore import VectorStore
+
+from eurelis_kb_framework.base_factory import BaseFactory
+
+if TYPE_CHECKING:
+    from eurelis_kb_framework.langchain_wrapper import BaseContext
+
+
+class NumpyVectorStoreFactory(BaseFactory[VectorStore]):
+    """
+    Factory to get an in-process numpy based vector store
+    """
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.collection_name: Optional[str] = None
+        self.index: Optional[dict] = None
+        self.compression: Optional[Union[str, dict]] = None
+        self.metadata_index: Optional[dict] = None
+
+    def set_path(self, path: str):
+        """
+        Setter for the path parameter, the store is kept in memory if not provided
+        Args:
+            path: folder where to persist the store
+
+        Returns:
+
+        """
+        self.path = path
+
+    def set_collection_name(self, name: str):
+        """
+        Setter for the collection name, default to the project name
+        Args:
+            name: collection name, sub folder of path
+
+        Returns:
+
+        """
+        self.collection_name = name
+
+    def set_index(self, index: Union[str, dict]):
+        """
+        Setter for the index parameter
+        Args:
+            index: "flat" for an exact search, "ivf" or a dictionary with a type key and optional
+                nlist, nprobe and train_size keys for an approximate search
+
+        Returns:
+
+        """
+        self.index = {"type": index} if isinstance(index, str) else dict(index)
+
+    def set_compression(self, compression: Union[str, dict]):
+        """
+        Setter for the compression parameter
+        Args:
+            compression: "float16", "int8", "pq" or a dictionary with a type key, an optional rerank key
+                and the quantizer parameters (m for pq), requires a path
+
+        Returns:
+
+        """
+        self.compression = compression
+
+    def set_metadata_index(self, metadata_index: dict):
+        """
+        Setter for the metadata index parameter
+        Args:
+            metadata_index: dictionary of metadata field to its type, "category", "number" or "date",
+                filters on those fields are evaluated before the vector search, an empty dictionary
+                disables the index
+
+        Returns:
+
+        """
+        self.metadata_index = dict(metadata_index)
+
+    def build(self, context: "BaseContext") -> VectorStore:
+        """
+        Construct a numpy based vector store
+
+        Args:
+            context: the context object, usually the current langchain wrapper instance
+
+        Returns:
+            a numpy vector store object
+        """
+        from eurelis_kb_framework.langchain_wrapper import LangchainWrapper
+        from eurelis_kb_framework.vectorstores.numpy.numpy_vector_store import (
+            NumpyVectorStore,
+        )
+
+        path = None
+        if self.path:
+            collection_name = self.collection_name
+            if not collection_name and isinstance(context, LangchainWrapper):
+                collection_name = context.project
+            path = os.path.join(self.path, collection_name or "default")
+
+        context.console.verbose_print(
+            f"Getting numpy vector store {'in ' + path if path else 'in memory'}"
+        )
+
+        return NumpyVectorStore(
+            context.embeddings,
+            path=path,
+            index=self.index,
+            compression=self.compression,
+            metadata_index=self.metadata_index,
+        )
@@ -0,0 +1,85 @@
+from typing import Iterable
+
+import numpy as np
+
+
+class InvertedLists:
+    """
+    Rows grouped by list number: the rows of every list sorted by list (CSR layout), plus the rows added
+    since the last rebuild
+
+    Rows assigned to a negative list number are not part of any list
+    """
+
+    REBUILD_MIN_PENDING = 65_536
+    REBUILD_RATIO = 0.1
+
+    def __init__(self):
+        self._list_rows = np.empty(0, dtype=np.int64)
+        self._list_offsets = np.zeros(1, dtype=np.int64)
+        self._pending_rows = np.empty(0, dtype=np.int64)
+        self._pending_assignments = np.empty(0, dtype=np.int32)
+
+    def rebuild(self, assignments: np.ndarray):
+        """
+        Rebuild the lists from the assignment of every row
+        Args:
+            assignments: list number of each row, row numbers are the indexes
+
+        Returns:
+
+        """
+        assignments = np.asarray(assignments)
+        order = np.argsort(assignments, kind="stable")
+        sorted_assignments = assignments[order]
+        first = np.searchsorted(sorted_assignments, 0)
+        nlist = int(sorted_assignments[-1]) + 1 if len(sorted_assignments) else 0
+
+        self._list_rows = order[first:].astype(np.int64)
+        self._list_offsets = np.searchsorted(
+            sorted_assignments[first:], np.arange(max(nlist, 0) + 1)
+        ).astype(np.int64)
+        self._pending_rows = np.empty(0, dtype=np.int64)
+        self._pending_assignments = np.empty(0, dtype=np.int32)
+
+    def add(self, rows: np.ndarray, assignments: np.ndarray) -> bool:
+        """
+        Add rows, kept apart from the lists until the next rebuild
+        Args:
+            rows: row numbers
+            assignments: list number of each row
+
+        Returns:
+            True if the pending rows are numerous enough to call rebuild
+        """
+        self._pending_rows = np.concatenate([self._pending_rows, rows])
+        self._pending_assignments = np.concatenate(
+            [self._pending_assignments, np.asarray(assignments, dtype=np.int32)]
+        )
+
+        return len(self._pending_rows) > max(
+            InvertedLists.REBUILD_MIN_PENDING,
+            len(self._list_rows) * InvertedLists.REBUILD_RATIO,
+        )
+
+    def rows(self, lists: Iterable[int]) -> np.ndarray:
+        """
+        Rows of some lists
+        Args:
+            lists: list numbers
+
+        Returns:
+            sorted array of row numbers
+        """
+        lists = np.asarray(list(lists), dtype=np.int64)
+        nlist = len(self._list_offsets) - 1
+
+        parts = [
+            self._list_rows[self._list_offsets[index] : self._list_offsets[index + 1]]
+            for index in lists
+            if 0 <= index < nlist
+        ]
+        if len(self._pending_rows):
+            parts.append(self._pending_rows[np.isin(self._pending_assignments, lists)])
+
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
@@ -0,0 +1,177 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+from eurelis_kb_framework.vectorstores.numpy.inverted_lists import InvertedLists
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class IVFIndex:
+    """
+    Inverted file index for cosine similarity: vectors are assigned to their nearest k-means centroid,
+    a query only scores the rows of its nprobe nearest centroids
+
+    Row assignments are stored by the vector store, the index keeps the centroids and, in memory,
+    the inverted lists
+    """
+
+    CENTROIDS_FILE = "ivf_centroids.npy"
+    ASSIGN_BLOCK_SIZE = 65_536
+    MIN_POINTS_BY_LIST = 39
+
+    def __init__(
+        self,
+        nlist: int = 1024,
+        nprobe: int = 16,
+        train_size: Optional[int] = None,
+        path: Optional[str] = None,
+    ):
+        """
+        Constructor
+        Args:
+            nlist: number of lists (k-means clusters)
+            nprobe: default number of lists scored by query
+            train_size: number of vectors sampled to train the k-means, default to 256 by list
+            path: optional folder to persist the centroids
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size if train_size else nlist * 256
+        self.path = path
+
+        self.centroids: Optional[np.ndarray] = None
+
+        self._lists = InvertedLists()
+
+        if path and os.path.exists(os.path.join(path, IVFIndex.CENTROIDS_FILE)):
+            self.centroids = np.load(os.path.join(path, IVFIndex.CENTROIDS_FILE))
+            self.nlist = self.centroids.shape[0]
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def train_threshold(self) -> int:
+        """
+        Number of vectors needed before training the index
+        """
+        return self.nlist * IVFIndex.MIN_POINTS_BY_LIST
+
+    def train(self, vectors: np.ndarray, iterations: int = 20, seed: int = 0):
+        """
+        Train the centroids with a spherical k-means
+
+        Args:
+            vectors: training vectors, sampled down to train_size rows
+            iterations: number of k-means iterations
+            seed: random seed
+
+        Returns:
+
+        """
+        rng = np.random.default_rng(seed)
+
+        if len(vectors) > self.train_size:
+            vectors = vectors[
+                np.sort(rng.choice(len(vectors), self.train_size, replace=False))
+            ]
+
+        points = _normalize(np.asarray(vectors, dtype=np.float32))
+        nlist = min(self.nlist, len(points))
+
+        centroids = points[rng.choice(len(points), nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignments = np.argmax(points @ centroids.T, axis=1)
+
+            order = np.argsort(assignments, kind="stable")
+            sorted_assignments = assignments[order]
+            starts = np.searchsorted(sorted_assignments, np.arange(nlist))
+            counts = np.bincount(assignments, minlength=nlist)
+
+            sums = np.zeros_like(centroids)
+            non_empty = counts > 0
+            sums[non_empty] = np.add.reduceat(points[order], starts[non_empty], axis=0)
+
+            # empty lists restart from random points
+            empty = np.flatnonzero(~non_empty)
+            sums[empty] = points[rng.choice(len(points), len(empty), replace=False)]
+
+            centroids = _normalize(sums)
+
+        self.nlist = nlist
+        self.centroids = centroids.astype(np.float32)
+        self._lists = InvertedLists()
+
+        if self.path:
+            np.save(os.path.join(self.path, IVFIndex.CENTROIDS_FILE), self.centroids)
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Compute the list of each vector
+        Args:
+            vectors: the vectors
+
+        Returns:
+            int32 array of list numbers
+        """
+        if self.centroids is None:
+            raise RuntimeError("IVF index is not trained")
+
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), IVFIndex.ASSIGN_BLOCK_SIZE):
+            end = min(start + IVFIndex.ASSIGN_BLOCK_SIZE, len(vectors))
+            block = np.asarray(vectors[start:end], dtype=np.float32)
+            assignments[start:end] = np.argmax(block @ self.centroids.T, axis=1)
+
+        return assignments
+
+    def rebuild(self, assignments: np.ndarray):
+        """
+        Rebuild the lists from the assignment of every row
+        Args:
+            assignments: list number of each row, row numbers are the indexes
+
+        Returns:
+
+        """
+        self._lists.rebuild(assignments)
+
+    def add(self, rows: np.ndarray, assignments: np.ndarray) -> bool:
+        """
+        Add rows to the index, kept apart from the lists until the next rebuild
+        Args:
+            rows: row numbers
+            assignments: list number of each row
+
+        Returns:
+            True if the pending rows are numerous enough to call rebuild
+        """
+        return self._lists.add(rows, assignments)
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """
+        Rows of the lists nearest to the query
+        Args:
+            query: normalized query vector
+            nprobe: number of lists to visit, default to the index nprobe
+
+        Returns:
+            sorted array of row numbers, deleted rows included
+        """
+        if self.centroids is None:
+            raise RuntimeError("IVF index is not trained")
+
+        nprobe = min(nprobe if nprobe else self.nprobe, self.nlist)
+
+        similarities = self.centroids @ query
+        lists = np.argpartition(-similarities, nprobe - 1)[:nprobe]
+
+        return self._lists.rows(lists)
@@ -0,0 +1,396 @@
+import datetime
+import json
+import re
+import sqlite3
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from eurelis_kb_framework.vectorstores.numpy.inverted_lists import InvertedLists
+
+FILTER_CONDITION = Tuple[str, str, Any]
+
+CATEGORY = "category"
+NUMBER = "number"
+DATE = "date"
+
+OPERATORS = ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$nin")
+CATEGORY_OPERATORS = ("$eq", "$ne", "$in", "$nin")
+
+
+def filter_conditions(search_filter: Optional[dict]) -> List[FILTER_CONDITION]:
+    """
+    Helper function to flatten a metadata filter to a list of (key, operator, value) conditions, all required
+
+    A filter maps keys to a value (equality) or to a dictionary of operators ($eq, $ne, $gt, $gte, $lt, $lte,
+    $in, $nin), a $and key holds a list of filters
+    Args:
+        search_filter: the metadata filter
+
+    Returns:
+        list of conditions
+    """
+    conditions: List[FILTER_CONDITION] = []
+    if not search_filter:
+        return conditions
+
+    for key, value in search_filter.items():
+        if key == "$and":
+            for sub_filter in value:
+                conditions.extend(filter_conditions(sub_filter))
+        elif key.startswith("$"):
+            raise ValueError(f"Unsupported filter operator {key}")
+        elif isinstance(value, dict):
+            for operator, operand in value.items():
+                if operator not in OPERATORS:
+                    raise ValueError(
+                        f"Unsupported filter operator {operator}, use one of {OPERATORS}"
+                    )
+                conditions.append((key, operator, operand))
+        else:
+            conditions.append((key, "$eq", value))
+
+    return conditions
+
+
+def _condition_matches(value: Any, operator: str, operand: Any) -> bool:
+    """
+    Helper function to evaluate a condition on a metadata value, like the sqlite clause of the condition:
+    a missing value or a value not comparable with the operand never matches
+    """
+    if value is None:
+        return False
+
+    try:
+        if operator == "$eq":
+            return value == operand
+        if operator == "$ne":
+            return value != operand
+        if operator == "$in":
+            return value in operand
+        if operator == "$nin":
+            return value not in operand
+        if operator == "$gt":
+            return value > operand
+        if operator == "$gte":
+            return value >= operand
+        if operator == "$lt":
+            return value < operand
+        if operator == "$lte":
+            return value <= operand
+    except TypeError:
+        return False
+
+    raise ValueError(f"Unsupported filter operator {operator}, use one of {OPERATORS}")
+
+
+def metadata_matches(
+    metadata: Mapping[str, Any], search_filter: Optional[dict]
+) -> bool:
+    """
+    Helper function to evaluate a metadata filter in python, on the metadata of a document
+    Args:
+        metadata: the document metadata
+        search_filter: the metadata filter, as accepted by filter_conditions
+
+    Returns:
+        True if every condition of the filter matches
+    """
+    return all(
+        _condition_matches(metadata.get(key), operator, operand)
+        for key, operator, operand in filter_conditions(search_filter)
+    )
+
+
+def _to_timestamp(value: Any) -> float:
+    """
+    Helper function to convert a date value (datetime, date, ISO string or number) to a timestamp
+    """
+    if value is None:
+        return np.nan
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return np.nan
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.timestamp()
+    if isinstance(value, datetime.date):
+        return datetime.datetime(
+            value.year, value.month, value.day, tzinfo=datetime.timezone.utc
+        ).timestamp()
+
+    return np.nan
+
+
+def _to_number(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return np.nan
+
+    return np.nan
+
+
+class MetadataIndex:
+    """
+    Filter index on some metadata fields of the numpy vector store
+
+    Category fields are dictionary encoded, the store keeps an int32 code column and the index keeps
+    the rows of each value as inverted lists, so an equality filter costs the size of its result.
+    Number and date fields are float64 columns compared with vectorized operations, on the rows
+    selected by the category conditions when there are some.
+
+    Value dictionaries are persisted in the store sqlite database
+    """
+
+    def __init__(self, fields: Mapping[str, str], connection: sqlite3.Connection):
+        """
+        Constructor
+        Args:
+            fields: dictionary of metadata field to its type, "category", "number" or "date"
+            connection: sqlite connection of the store
+        """
+        for field, field_type in fields.items():
+            if field_type not in (CATEGORY, NUMBER, DATE):
+                raise ValueError(
+                    f"Unknown metadata index type {field_type} for {field}, use category, number or date"
+                )
+
+        self.fields = dict(fields)
+        self._connection = connection
+
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS metadata_values "
+            "(field TEXT NOT NULL, value TEXT NOT NULL, code INTEGER NOT NULL, PRIMARY KEY (field, value))"
+        )
+        self._connection.commit()
+
+        self._codes: Dict[str, Dict[str, int]] = {
+            field: {} for field, field_type in self.fields.items()
+        }
+        for field, value, code in self._connection.execute(
+            "SELECT field, value, code FROM metadata_values"
+        ):
+            if field in self._codes:
+                self._codes[field][value] = code
+
+        self._lists: Dict[str, InvertedLists] = {
+            field: InvertedLists()
+            for field, field_type in self.fields.items()
+            if field_type == CATEGORY
+        }
+
+    @staticmethod
+    def column_name(field: str) -> str:
+        """
+        Name of the column file of a field
+        """
+        return f"metadata_{re.sub(r'[^0-9A-Za-z_]', '_', field)}.npy"
+
+    def columns(self) -> List[Tuple[str, str, type]]:
+        """
+        Columns of the indexed fields
+        Returns:
+            list of tuples with the field, the column file name and the column dtype
+        """
+        return [
+            (
+                field,
+                MetadataIndex.column_name(field),
+                np.int32 if field_type == CATEGORY else np.float64,
+            )
+            for field, field_type in sorted(self.fields.items())
+        ]
+
+    @staticmethod
+    def _category_key(value: Any) -> str:
+        return json.dumps(value, sort_keys=True, default=str)
+
+    def encode(self, field: str, values: Sequence[Any]) -> np.ndarray:
+        """
+        Encode metadata values as column values, new category values are added to the dictionary
+        Args:
+            field: the field
+            values: metadata values, None for missing ones
+
+        Returns:
+            int32 codes, -1 for missing values, or float64 values, nan for missing values
+        """
+        field_type = self.fields[field]
+
+        if field_type == NUMBER:
+            return np.array([_to_number(value) for value in values], dtype=np.float64)
+        if field_type == DATE:
+            return np.array(
+                [_to_timestamp(value) for value in values], dtype=np.float64
+            )
+
+        codes = self._codes[field]
+        new_values = []
+        result = np.empty(len(values), dtype=np.int32)
+        for index, value in enumerate(values):
+            if value is None:
+                result[index] = -1
+                continue
+            key = MetadataIndex._category_key(value)
+            code = codes.get(key)
+            if code is None:
+                code = codes[key] = len(codes)
+                new_values.append((field, key, code))
+            result[index] = code
+
+        if new_values:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT INTO metadata_values (field, value, code) VALUES (?, ?, ?)",
+                    new_values,
+                )
+
+        return result
+
+    def rebuild(self, field: str, column: np.ndarray):
+        """
+        Rebuild the inverted lists of a category field from its column
+        """
+        if field in self._lists:
+            self._lists[field].rebuild(np.asarray(column))
+
+    def add(self, field: str, start: int, values: np.ndarray) -> bool:
+        """
+        Add new rows to the inverted lists of a category field
+        Args:
+            field: the field
+            start: first new row
+            values: codes of the new rows
+
+        Returns:
+            True if the lists should be rebuilt
+        """
+        if field not in self._lists:
+            return False
+
+        return self._lists[field].add(np.arange(start, start + len(values)), values)
+
+    def split(
+        self, conditions: Sequence[FILTER_CONDITION]
+    ) -> Tuple[List[FILTER_CONDITION], List[FILTER_CONDITION]]:
+        """
+        Split conditions between the ones this index evaluates and the other ones
+        Returns:
+            tuple with the indexed conditions and the remaining ones
+        """
+        indexed = []
+        remaining = []
+        for condition in conditions:
+            field, operator, _ = condition
+            field_type = self.fields.get(field)
+            if field_type is None or (
+                field_type == CATEGORY and operator not in CATEGORY_OPERATORS
+            ):
+                remaining.append(condition)
+            else:
+                indexed.append(condition)
+
+        return indexed, remaining
+
+    def _category_codes(self, field: str, values: Sequence[Any]) -> List[int]:
+        codes = self._codes[field]
+
+        return [
+            codes[key]
+            for key in (MetadataIndex._category_key(value) for value in values)
+            if key in codes
+        ]
+
+    def filter_rows(
+        self,
+        conditions: Sequence[FILTER_CONDITION],
+        column: Callable[[str], np.ndarray],
+        count: int,
+    ) -> np.ndarray:
+        """
+        Evaluate indexed conditions
+        Args:
+            conditions: conditions returned as indexed by split
+            column: function returning the column of a field, first count rows are used
+            count: number of rows
+
+        Returns:
+            sorted array of the matching rows, deleted rows included
+        """
+        rows: Optional[np.ndarray] = None
+
+        # selective conditions first, the others only test the selected rows
+        list_conditions = [
+            condition
+            for condition in conditions
+            if self.fields[condition[0]] == CATEGORY and condition[1] in ("$eq", "$in")
+        ]
+        other_conditions = [
+            condition for condition in conditions if condition not in list_conditions
+        ]
+
+        list_rows = []
+        for field, operator, value in list_conditions:
+            values = value if operator == "$in" else [value]
+            list_rows.append(
+                self._lists[field].rows(self._category_codes(field, values))
+            )
+        for candidate_rows in sorted(list_rows, key=len):
+            rows = (
+                candidate_rows
+                if rows is None
+                else np.intersect1d(rows, candidate_rows, assume_unique=True)
+            )
+            if not len(rows):
+                return rows
+
+        for field, operator, value in other_conditions:
+            values = column(field)[:count] if rows is None else column(field)[rows]
+            mask = self._evaluate(field, operator, value, values)
+            rows = np.flatnonzero(mask) if rows is None else rows[mask]
+            if not len(rows):
+                return rows
+
+        return rows if rows is not None else np.arange(count)
+
+    def _evaluate(
+        self, field: str, operator: str, value: Any, values: np.ndarray
+    ) -> np.ndarray:
+        """
+        Helper method to evaluate a condition on column values
+        Returns:
+            boolean mask
+        """
+        if self.fields[field] == CATEGORY:
+            items = value if operator in ("$in", "$nin") else [value]
+            matches = np.isin(values, self._category_codes(field, items))
+            # missing values do not match a negative condition either
+            return matches if operator in ("$eq", "$in") else ~matches & (values >= 0)
+
+        convert = _to_timestamp if self.fields[field] == DATE else _to_number
+        if operator in ("$in", "$nin"):
+            matches = np.isin(values, [convert(item) for item in value])
+            return matches if operator == "$in" else ~matches & ~np.isnan(values)
+
+        operand = convert(value)
+        with np.errstate(invalid="ignore"):
+            if operator == "$eq":
+                return values == operand
+            if operator == "$ne":
+                return (values != operand) & ~np.isnan(values)
+            if operator == "$gt":
+                return values > operand
+            if operator == "$gte":
+                return values >= operand
+            if operator == "$lt":
+                return values < operand
+            return values <= operand
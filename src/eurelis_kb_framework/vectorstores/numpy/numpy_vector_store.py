@@ -0,0 +1,1289 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+    cast,
+)
+
+import numpy as np
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from langchain.schema.vectorstore import VectorStore
+
+from eurelis_kb_framework.types import EMBEDDING
+from eurelis_kb_framework.vectorstores.capabilities import (
+    StoredEmbeddingsCapability,
+    MetadataScanCapability,
+    SimilaritySearchWithEmbeddingsCapability,
+    PrecomputedEmbeddingsCapability,
+)
+from eurelis_kb_framework.vectorstores.numpy.ivf_index import IVFIndex
+from eurelis_kb_framework.vectorstores.numpy.metadata_index import (
+    MetadataIndex,
+    filter_conditions,
+)
+from eurelis_kb_framework.vectorstores.numpy.quantization import (
+    Quantizer,
+    build_quantizer,
+)
+
+
+def _json_path(key: str) -> str:
+    """
+    Helper function to build a sqlite json path for a metadata key
+    """
+    escaped = key.replace('"', '\\"')
+    return f'$."{escaped}"'
+
+
+SQL_OPERATORS = {
+    "$eq": "=",
+    "$ne": "!=",
+    "$gt": ">",
+    "$gte": ">=",
+    "$lt": "<",
+    "$lte": "<=",
+    "$in": "IN",
+    "$nin": "NOT IN",
+}
+
+
+class _SearchSnapshot(NamedTuple):
+    """
+    Row count, arrays and candidate rows of a search, taken with the lock held so the scoring runs without it
+    """
+
+    generation: int
+    row_count: int
+    rows: Optional[np.ndarray]
+    vectors: np.ndarray
+    norms: np.ndarray
+    codes: Optional[np.ndarray]
+
+
+DEFAULT_METADATA_INDEX = {
+    "namespace": "category",
+    "source": "category",
+    "language": "category",
+}
+
+
+class NumpyVectorStore(
+    VectorStore,
+    StoredEmbeddingsCapability,
+    MetadataScanCapability,
+    SimilaritySearchWithEmbeddingsCapability,
+    PrecomputedEmbeddingsCapability,
+):
+    """
+    In-process vector store, vectors are rows of a contiguous float32 matrix, memory mapped when persistent,
+    documents and metadata are stored in sqlite
+
+    Search is an exact cosine similarity top-k, computed by blocks of rows, or an approximate one restricted
+    to the nearest lists of an IVF index. With compression, rows are scored on their compressed codes and the
+    best candidates are re-ranked with the full precision vectors, which are then only read for those rows.
+    Compression is only available to persistent stores: the full precision matrix stays memory mapped and
+    mostly out of memory, an in memory store would hold it next to the codes and use more memory, not less.
+    Deleted rows are only flagged, their slots are reclaimed when the matrix is compacted
+
+    Filters on indexed metadata fields are evaluated on columns and inverted lists before the vector scoring,
+    other filter keys are evaluated by sqlite
+
+    Searches only hold the lock to snapshot the arrays and to read the documents, vectors are scored without it,
+    a search overlapping a compaction or a quantizer training runs again
+
+    A persistent store must be used by a single process at a time
+    """
+
+    VECTORS_FILE = "vectors.npy"
+    NORMS_FILE = "norms.npy"
+    ASSIGNMENTS_FILE = "ivf_assignments.npy"
+    CODES_FILE = "codes.npy"
+    QUANTIZER_FILE = "quantizer.npz"
+    DOCUMENTS_FILE = "documents.sqlite"
+
+    INITIAL_CAPACITY = 1024
+    SEARCH_BLOCK_SIZE = 262_144
+    COMPACT_RATIO = 0.5
+    EXACT_FILTER_THRESHOLD = 100_000
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        path: Optional[str] = None,
+        index: Optional[dict] = None,
+        compression: Optional[Union[str, dict]] = None,
+        metadata_index: Optional[dict] = None,
+    ):
+        """
+        Constructor
+        Args:
+            embedding: embeddings used for documents and queries
+            path: optional folder to persist the store, in memory if not provided
+            index: optional index parameters, {"type": "flat"} (default) or
+                {"type": "ivf", "nlist": 1024, "nprobe": 16, "train_size": 262144}
+            compression: optional compression of the searched vectors, "float16", "int8", "pq" or a dictionary
+                with a type key, an optional rerank key (candidates re-ranked by result, default to 4) and the
+                quantizer parameters (m for pq), requires a path
+            metadata_index: optional dictionary of metadata field to index for filters, to its type,
+                "category", "number" or "date", default to the namespace, source and language categories,
+                an empty dictionary disables the index
+        """
+        self._embedding = embedding
+        self.path = path
+
+        self._lock = threading.RLock()
+        # changed each time rows are moved or codes encoded again, see _search
+        self._generation = 0
+        # row arrays, without rows until the first documents are added or the files are opened
+        self._vectors: np.ndarray = np.empty((0, 0), dtype=np.float32)
+        self._norms: np.ndarray = np.empty(0, dtype=np.float32)
+        self._assignments: np.ndarray = np.empty(0, dtype=np.int32)
+        self._codes: np.ndarray = np.empty((0, 0), dtype=np.uint8)
+
+        self.quantizer: Optional[Quantizer] = None
+        self.rerank = 4
+        if compression:
+            if not path:
+                raise ValueError(
+                    "Compression needs a persistent store, set a path to memory map the full precision vectors"
+                )
+            self.quantizer = build_quantizer(compression)
+            if isinstance(compression, dict):
+                self.rerank = compression.get("rerank", self.rerank)
+
+        index = index if index else {"type": "flat"}
+        index_type = index.get("type", "flat")
+        if index_type not in ("flat", "ivf"):
+            raise ValueError(f"Unknown index type {index_type}, use flat or ivf")
+
+        self.ivf_index: Optional[IVFIndex] = None
+        if index_type == "ivf":
+            self.ivf_index = IVFIndex(
+                nlist=index.get("nlist", 1024),
+                nprobe=index.get("nprobe", 16),
+                train_size=index.get("train_size"),
+                path=path,
+            )
+
+        if path:
+            os.makedirs(Path(path), exist_ok=True)
+            self._connection = sqlite3.connect(
+                os.path.join(path, NumpyVectorStore.DOCUMENTS_FILE),
+                check_same_thread=False,
+            )
+        else:
+            self._connection = sqlite3.connect(":memory:", check_same_thread=False)
+
+        self._connection.executescript(
+            "CREATE TABLE IF NOT EXISTS documents "
+            "(row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, page_content TEXT, metadata TEXT);"
+            "CREATE TABLE IF NOT EXISTS store_info (key TEXT PRIMARY KEY, value INTEGER);"
+        )
+        self._connection.commit()
+
+        self.metadata_index: Optional[MetadataIndex] = None
+        metadata_fields = (
+            DEFAULT_METADATA_INDEX if metadata_index is None else metadata_index
+        )
+        if metadata_fields:
+            self.metadata_index = MetadataIndex(metadata_fields, self._connection)
+            for field, _, _ in self.metadata_index.columns():
+                setattr(self, NumpyVectorStore._metadata_attribute(field), None)
+
+        self.count = self._get_info("count", 0)
+        self.dimension = self._get_info("dimension", 0)
+
+        quantizer_path = (
+            os.path.join(path, NumpyVectorStore.QUANTIZER_FILE) if path else None
+        )
+        if self.quantizer and quantizer_path and os.path.exists(quantizer_path):
+            with np.load(quantizer_path) as parameters:
+                if str(parameters["type"]) == self.quantizer.NAME:
+                    self.quantizer.set_parameters(parameters)
+
+        missing_assignments = False
+        missing_codes = False
+        missing_metadata = []
+        if path and self.dimension:
+            for name, attribute, dtype, item_shape in self._columns():
+                file_path = os.path.join(path, name)
+                if os.path.exists(file_path):
+                    array = np.load(file_path, mmap_mode="r+")
+                    if array.shape[1:] != item_shape or array.dtype != dtype:
+                        # compression settings changed, the codes are computed again
+                        array = None
+                else:
+                    array = None
+
+                if array is None:
+                    # store created without this column
+                    missing_assignments |= attribute == "_assignments"
+                    missing_codes |= attribute == "_codes"
+                    if attribute.startswith("_metadata_"):
+                        missing_metadata.append(attribute)
+                    array = self._allocate(name, (self.capacity, *item_shape), dtype)
+                setattr(self, attribute, array)
+
+        if missing_codes and self.quantizer:
+            if self.quantizer.trained:
+                self._codes[: self.count] = self.quantizer.encode(
+                    self._vectors[: self.count]
+                )
+                self._flush()
+            else:
+                self._update_codes(0, self.count)
+
+        if self.ivf_index and self.ivf_index.trained:
+            if missing_assignments:
+                self._assignments[: self.count] = self.ivf_index.assign(
+                    self._vectors[: self.count]
+                )
+                self._flush()
+            self.ivf_index.rebuild(self._assignments[: self.count])
+
+        if self.metadata_index and self.dimension:
+            self._load_metadata_columns(missing_metadata)
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    def _get_info(self, key: str, default: int) -> int:
+        row = self._connection.execute(
+            "SELECT value FROM store_info WHERE key = ?", (key,)
+        ).fetchone()
+
+        return row[0] if row else default
+
+    def _set_info(self, key: str, value: int):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO store_info (key, value) VALUES (?, ?)", (key, value)
+        )
+
+    @staticmethod
+    def _metadata_attribute(field: str) -> str:
+        return f"_{MetadataIndex.column_name(field)[:-4]}"
+
+    def _metadata_column(self, field: str) -> np.ndarray:
+        return getattr(self, NumpyVectorStore._metadata_attribute(field))
+
+    def _load_metadata_columns(self, missing_attributes: List[str]):
+        """
+        Helper method to fill the metadata columns missing on disk from the sqlite metadata and to
+        build the inverted lists of the category fields
+        Args:
+            missing_attributes: attributes of the missing columns
+
+        Returns:
+
+        """
+        metadata_index = cast(MetadataIndex, self.metadata_index)
+
+        missing_fields = [
+            field
+            for field, _, _ in metadata_index.columns()
+            if NumpyVectorStore._metadata_attribute(field) in missing_attributes
+        ]
+        if missing_fields:
+            rows = []
+            metadatas = []
+            for row, metadata in self._connection.execute(
+                "SELECT row, metadata FROM documents ORDER BY row"
+            ):
+                rows.append(row)
+                metadatas.append(json.loads(metadata))
+
+            for field in missing_fields:
+                column = self._metadata_column(field)
+                column[: self.count] = -1 if column.dtype == np.int32 else np.nan
+                column[np.array(rows, dtype=np.int64)] = metadata_index.encode(
+                    field, [metadata.get(field) for metadata in metadatas]
+                )
+            self._flush()
+
+        for field, _, _ in metadata_index.columns():
+            metadata_index.rebuild(field, self._metadata_column(field)[: self.count])
+
+    @property
+    def capacity(self) -> int:
+        return self._vectors.shape[0]
+
+    def _columns(self) -> List[Tuple[str, str, type, Tuple[int, ...]]]:
+        """
+        Helper method to list the arrays holding one item by row
+        Returns:
+            list of tuples with the file name, the attribute name, the dtype and the shape of an item
+        """
+        columns: List[Tuple[str, str, type, Tuple[int, ...]]] = [
+            (NumpyVectorStore.VECTORS_FILE, "_vectors", np.float32, (self.dimension,)),
+            (NumpyVectorStore.NORMS_FILE, "_norms", np.float32, ()),
+        ]
+        if self.ivf_index:
+            columns.append(
+                (NumpyVectorStore.ASSIGNMENTS_FILE, "_assignments", np.int32, ())
+            )
+        if self.quantizer:
+            columns.append(
+                (
+                    NumpyVectorStore.CODES_FILE,
+                    "_codes",
+                    self.quantizer.code_dtype,
+                    self.quantizer.code_shape(self.dimension),
+                )
+            )
+        if self.metadata_index:
+            columns.extend(
+                (name, NumpyVectorStore._metadata_attribute(field), dtype, ())
+                for field, name, dtype in self.metadata_index.columns()
+            )
+
+        return columns
+
+    def _allocate(self, name: str, shape: Tuple[int, ...], dtype: type) -> np.ndarray:
+        """
+        Helper method to allocate an array, as a memory mapped .npy file when persistent
+        """
+        if not self.path:
+            return np.zeros(shape, dtype=dtype)
+
+        return np.lib.format.open_memmap(
+            os.path.join(self.path, name), mode="w+", dtype=dtype, shape=shape
+        )
+
+    def _resize(self, capacity: int):
+        """
+        Helper method to reallocate the row arrays, keeping the first count rows
+        Args:
+            capacity: new number of rows
+
+        Returns:
+
+        """
+        arrays: Dict[str, np.ndarray] = {}
+        for name, attribute, dtype, item_shape in self._columns():
+            current = getattr(self, attribute)
+            new_array = self._allocate(
+                f"{name}.tmp" if self.path else name, (capacity, *item_shape), dtype
+            )
+            if current is not None:
+                for start in range(0, self.count, NumpyVectorStore.SEARCH_BLOCK_SIZE):
+                    end = min(start + NumpyVectorStore.SEARCH_BLOCK_SIZE, self.count)
+                    new_array[start:end] = current[start:end]
+            arrays[name] = new_array
+
+        if self.path:
+            # release every mapping before swapping the files
+            for array in arrays.values():
+                cast(np.memmap, array).flush()
+            arrays.clear()
+
+            for name, attribute, _, _ in self._columns():
+                setattr(self, attribute, None)
+                os.replace(
+                    os.path.join(self.path, f"{name}.tmp"),
+                    os.path.join(self.path, name),
+                )
+                arrays[name] = np.load(os.path.join(self.path, name), mmap_mode="r+")
+
+        for name, attribute, _, _ in self._columns():
+            setattr(self, attribute, arrays[name])
+
+    def _ensure_capacity(self, rows: int):
+        if self.count + rows <= self.capacity:
+            return
+
+        capacity = max(self.capacity, NumpyVectorStore.INITIAL_CAPACITY)
+        while capacity < self.count + rows:
+            capacity *= 2
+
+        self._resize(capacity)
+
+    def _flush(self):
+        if self.path and self.capacity:
+            for _, attribute, _, _ in self._columns():
+                getattr(self, attribute).flush()
+
+    def _update_codes(self, start: int, end: int):
+        """
+        Helper method to encode new rows, training the quantizer once enough rows are stored
+        Must be called with the lock held
+        Args:
+            start: first new row
+            end: end of the new rows
+
+        Returns:
+
+        """
+        quantizer = self.quantizer
+        if not quantizer:
+            return
+
+        if quantizer.trained:
+            self._codes[start:end] = quantizer.encode(self._vectors[start:end])
+            return
+
+        live_rows = np.flatnonzero(self._norms[:end])
+        if len(live_rows) < quantizer.train_threshold:
+            return
+
+        self._train_quantizer(end)
+
+    def _train_quantizer(self, end: int):
+        """
+        Helper method to train the quantizer on the first rows and encode them
+        Must be called with the lock held
+        Args:
+            end: end of the rows to use
+
+        Returns:
+
+        """
+        quantizer = cast(Quantizer, self.quantizer)
+
+        live_rows = np.flatnonzero(self._norms[:end])
+        if not len(live_rows):
+            return
+
+        rng = np.random.default_rng(0)
+        sample = np.sort(
+            rng.choice(live_rows, min(len(live_rows), 65_536), replace=False)
+        )
+        quantizer.train(self._vectors[sample])
+        self._generation += 1
+
+        for start in range(0, end, NumpyVectorStore.SEARCH_BLOCK_SIZE):
+            block_end = min(start + NumpyVectorStore.SEARCH_BLOCK_SIZE, end)
+            self._codes[start:block_end] = quantizer.encode(
+                self._vectors[start:block_end]
+            )
+        self._flush()
+
+        if self.path:
+            np.savez(
+                os.path.join(self.path, NumpyVectorStore.QUANTIZER_FILE),
+                type=np.array(quantizer.NAME),
+                **quantizer.parameters(),
+            )
+
+    def train_quantizer(self):
+        """
+        Train the quantizer again on the stored vectors, every row is encoded again
+        """
+        if not self.quantizer:
+            raise ValueError("This store does not use compression")
+
+        with self._lock:
+            self._train_quantizer(self.count)
+
+    def _update_ivf_index(self, start: int, end: int):
+        """
+        Helper method to add new rows to the IVF index, training it once enough rows are stored
+        Must be called with the lock held
+        Args:
+            start: first new row
+            end: end of the new rows
+
+        Returns:
+
+        """
+        ivf_index = self.ivf_index
+        if not ivf_index:
+            return
+
+        if ivf_index.trained:
+            assignments = ivf_index.assign(self._vectors[start:end])
+            self._assignments[start:end] = assignments
+            if ivf_index.add(np.arange(start, end), assignments):
+                ivf_index.rebuild(self._assignments[:end])
+            return
+
+        if np.count_nonzero(self._norms[:end]) < ivf_index.train_threshold:
+            return
+
+        self._train_ivf_index(end)
+
+    def _train_ivf_index(self, end: int):
+        """
+        Helper method to train the IVF index on the first rows and assign them to a list
+        Must be called with the lock held
+        Args:
+            end: end of the rows to use
+
+        Returns:
+
+        """
+        ivf_index = cast(IVFIndex, self.ivf_index)
+
+        live_rows = np.flatnonzero(self._norms[:end])
+        if not len(live_rows):
+            return
+
+        rng = np.random.default_rng(0)
+        sample = np.sort(
+            rng.choice(
+                live_rows, min(len(live_rows), ivf_index.train_size), replace=False
+            )
+        )
+        ivf_index.train(self._vectors[sample])
+
+        self._assignments[:end] = ivf_index.assign(self._vectors[:end])
+        self._flush()
+        ivf_index.rebuild(self._assignments[:end])
+
+    def train_index(self):
+        """
+        Train the IVF index again on the stored vectors, lists are rebuilt
+        """
+        if not self.ivf_index:
+            raise ValueError("This store does not use an IVF index")
+
+        with self._lock:
+            self._train_ivf_index(self.count)
+
+    def _update_metadata_index(self, start: int, end: int, metadatas: Sequence[dict]):
+        """
+        Helper method to store the indexed metadata values of new rows
+        Must be called with the lock held
+        Args:
+            start: first new row
+            end: end of the new rows
+            metadatas: metadata of the new rows
+
+        Returns:
+
+        """
+        metadata_index = self.metadata_index
+        if not metadata_index:
+            return
+
+        for field, _, _ in metadata_index.columns():
+            column = self._metadata_column(field)
+            values = metadata_index.encode(
+                field, [metadata.get(field) for metadata in metadatas]
+            )
+            column[start:end] = values
+            if metadata_index.add(field, start, values):
+                metadata_index.rebuild(field, column[:end])
+
+    def add_embeddings(
+        self,
+        texts: Sequence[str],
+        embeddings: Sequence[EMBEDDING],
+        metadatas: Optional[Sequence[dict]] = None,
+        ids: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        """
+        Add documents with already computed embeddings, existing ids are replaced
+
+        Args:
+            texts: page contents
+            embeddings: the embeddings, one by text
+            metadatas: optional metadata, one by text
+            ids: optional ids, one by text
+
+        Returns:
+            the ids of the added documents
+        """
+        if not texts:
+            return []
+
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        if not len(ids) == len(texts) == len(embeddings) == len(metadatas):
+            raise ValueError("texts, embeddings, metadatas and ids lengths mismatch")
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+
+        with self._lock:
+            if not self.dimension:
+                self.dimension = vectors.shape[1]
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Embedding dimension mismatch, store uses {self.dimension}, got {vectors.shape[1]}"
+                )
+
+            self._delete_rows(self._rows_for_ids(ids))
+
+            self._ensure_capacity(len(texts))
+
+            start = self.count
+            end = start + len(texts)
+            self._vectors[start:end] = vectors
+            self._norms[start:end] = np.linalg.norm(vectors, axis=1)
+            self._update_ivf_index(start, end)
+            self._update_codes(start, end)
+            self._update_metadata_index(start, end, metadatas)
+            self._flush()
+
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT INTO documents (row, id, page_content, metadata) VALUES (?, ?, ?, ?)",
+                    [
+                        (row, doc_id, text, json.dumps(metadata, default=str))
+                        for row, doc_id, text, metadata in zip(
+                            range(start, end), ids, texts, metadatas
+                        )
+                    ],
+                )
+                self._set_info("dimension", self.dimension)
+                self._set_info("count", end)
+
+            self.count = end
+
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+
+        return self.add_embeddings(
+            texts, self._embedding.embed_documents(texts), metadatas, ids
+        )
+
+    def _rows_for_ids(self, ids: Sequence[str]) -> List[int]:
+        rows: List[int] = []
+        for start in range(0, len(ids), 500):
+            ids_batch = ids[start : start + 500]
+            rows.extend(
+                row
+                for (row,) in self._connection.execute(
+                    f"SELECT row FROM documents WHERE id IN ({','.join('?' * len(ids_batch))})",
+                    ids_batch,
+                )
+            )
+
+        return rows
+
+    def _ids_for_rows(self, rows: Sequence[int]) -> List[str]:
+        ids: List[str] = []
+        for start in range(0, len(rows), 500):
+            rows_batch = list(rows[start : start + 500])
+            ids.extend(
+                doc_id
+                for (doc_id,) in self._connection.execute(
+                    f"SELECT id FROM documents WHERE row IN ({','.join('?' * len(rows_batch))})",
+                    rows_batch,
+                )
+            )
+
+        return ids
+
+    def _delete_rows(self, rows: List[int]):
+        """
+        Helper method to flag rows as deleted, must be called with the lock held
+        """
+        if not rows:
+            return
+
+        self._norms[np.array(rows)] = 0.0
+        self._flush()
+
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM documents WHERE row = ?", [(row,) for row in rows]
+            )
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Delete by vector ID.
+
+        Args:
+            ids: List of ids to delete.
+
+        Returns:
+            Optional[bool]: True if deletion is successful
+        """
+        if not ids:
+            return True
+
+        with self._lock:
+            self._delete_rows(self._rows_for_ids(ids))
+
+            live = self._connection.execute(
+                "SELECT COUNT(*) FROM documents"
+            ).fetchone()[0]
+            if (
+                self.count > NumpyVectorStore.INITIAL_CAPACITY
+                and live < self.count * NumpyVectorStore.COMPACT_RATIO
+            ):
+                self.compact()
+
+        return True
+
+    def compact(self):
+        """
+        Rewrite the matrix without the deleted rows
+        """
+        with self._lock:
+            rows = [
+                row
+                for (row,) in self._connection.execute(
+                    "SELECT row FROM documents ORDER BY row"
+                )
+            ]
+
+            if rows == list(range(self.count)):
+                return
+
+            # rows are sorted, each live row moves to a lower or equal index, so a block never
+            # reads a slot written by a previous block
+            moved = np.asarray(rows, dtype=np.int64)
+            first = int(np.argmax(moved != np.arange(len(moved)))) if len(moved) else 0
+            block_size = NumpyVectorStore.SEARCH_BLOCK_SIZE
+            for _, attribute, _, _ in self._columns():
+                array = getattr(self, attribute)
+                for start in range(first, len(moved), block_size):
+                    end = min(start + block_size, len(moved))
+                    array[start:end] = array[moved[start:end]]
+            self._flush()
+            self._generation += 1
+
+            if self.ivf_index and self.ivf_index.trained:
+                self.ivf_index.rebuild(self._assignments[: len(rows)])
+            if self.metadata_index:
+                for field, _, _ in self.metadata_index.columns():
+                    self.metadata_index.rebuild(
+                        field, self._metadata_column(field)[: len(rows)]
+                    )
+
+            with self._connection:
+                self._connection.executemany(
+                    "UPDATE documents SET row = ? WHERE row = ?",
+                    [
+                        (new_row, row)
+                        for new_row, row in enumerate(rows)
+                        if new_row != row
+                    ],
+                )
+                self._set_info("count", len(rows))
+
+            self.count = len(rows)
+
+    @staticmethod
+    def _conditions_clause(conditions: Sequence[tuple]) -> Tuple[str, list]:
+        """
+        Helper method to convert filter conditions to a sql where clause on the documents table
+        """
+        if not conditions:
+            return "1 = 1", []
+
+        clauses = []
+        params: list = []
+        for key, operator, value in conditions:
+            if operator in ("$in", "$nin"):
+                values = list(value)
+                clauses.append(
+                    f"json_extract(metadata, ?) {SQL_OPERATORS[operator]} "
+                    f"({','.join('?' * len(values))})"
+                )
+                params.extend([_json_path(key), *values])
+            else:
+                clauses.append(f"json_extract(metadata, ?) {SQL_OPERATORS[operator]} ?")
+                params.extend([_json_path(key), value])
+
+        return " AND ".join(clauses), params
+
+    def _sql_filtered_rows(self, conditions: Sequence[tuple]) -> np.ndarray:
+        clause, params = NumpyVectorStore._conditions_clause(conditions)
+
+        return np.fromiter(
+            (
+                row
+                for (row,) in self._connection.execute(
+                    f"SELECT row FROM documents WHERE {clause} ORDER BY row", params
+                )
+            ),
+            dtype=np.int64,
+        )
+
+    def _filtered_rows(self, search_filter: dict) -> np.ndarray:
+        """
+        Helper method to get the live rows matching a metadata filter
+        Must be called with the lock held
+        Returns:
+            sorted array of rows
+        """
+        conditions = filter_conditions(search_filter)
+        metadata_index = self.metadata_index
+        if not metadata_index or not self.count:
+            return self._sql_filtered_rows(conditions)
+
+        indexed, remaining = metadata_index.split(conditions)
+        if not indexed:
+            return self._sql_filtered_rows(conditions)
+
+        rows = metadata_index.filter_rows(indexed, self._metadata_column, self.count)
+        # deleted rows have a zero norm
+        rows = rows[self._norms[rows] != 0]
+
+        if remaining and len(rows):
+            rows = np.intersect1d(
+                rows, self._sql_filtered_rows(remaining), assume_unique=True
+            )
+
+        return rows
+
+    def _snapshot(
+        self,
+        query: np.ndarray,
+        search_filter: Optional[dict] = None,
+        nprobe: Optional[int] = None,
+    ) -> _SearchSnapshot:
+        """
+        Helper method to take the arrays and the candidate rows of a search
+        Must be called with the lock held
+        Args:
+            query: the normalized query embedding
+            search_filter: optional metadata filter
+            nprobe: number of IVF lists to visit, default to the index nprobe
+
+        Returns:
+            the snapshot, candidate rows are None to scan every row
+        """
+        rows = self._filtered_rows(search_filter) if search_filter else None
+
+        ivf_index = self.ivf_index
+        if ivf_index and ivf_index.trained:
+            if rows is None:
+                rows = ivf_index.candidates(query, nprobe)
+            elif len(rows) > NumpyVectorStore.EXACT_FILTER_THRESHOLD:
+                rows = np.intersect1d(
+                    rows, ivf_index.candidates(query, nprobe), assume_unique=True
+                )
+
+        quantizer = self.quantizer
+
+        return _SearchSnapshot(
+            self._generation,
+            self.count,
+            rows,
+            self._vectors,
+            self._norms,
+            self._codes if quantizer and quantizer.trained else None,
+        )
+
+    def _top_k_rows(
+        self, snapshot: _SearchSnapshot, query: np.ndarray, k: int
+    ) -> List[Tuple[int, float]]:
+        """
+        Helper method to compute the cosine similarity top-k, block by block
+
+        The search is exact, unless the IVF index is trained and there is no candidate rows or too many of them
+
+        Args:
+            snapshot: arrays and candidate rows to score
+            query: the normalized query embedding
+            k: number of rows to return
+
+        Returns:
+            list of tuples with the row and its cosine similarity, best first
+        """
+        vectors = snapshot.vectors
+        codes = snapshot.codes
+        quantizer = self.quantizer
+
+        if quantizer and codes is not None:
+            # approximate scores on the codes, then exact scores for the best candidates
+            candidates = self._scan_top_k(
+                lambda block: quantizer.inner_products(query, codes[block]),
+                snapshot,
+                k * max(1, self.rerank),
+                snapshot.rows,
+            )
+            if not candidates:
+                return []
+
+            candidate_rows = np.sort(np.array([row for row, _ in candidates]))
+            return self._scan_top_k(
+                lambda block: vectors[block] @ query, snapshot, k, candidate_rows
+            )
+
+        return self._scan_top_k(
+            lambda block: vectors[block] @ query, snapshot, k, snapshot.rows
+        )
+
+    @staticmethod
+    def _scan_top_k(
+        inner_products: Callable[[Union[slice, np.ndarray]], np.ndarray],
+        snapshot: _SearchSnapshot,
+        k: int,
+        rows: Optional[np.ndarray] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Helper method to keep the k best rows, scanning them block by block
+
+        Args:
+            inner_products: function returning the inner products of the query with a block of rows,
+                given as a slice or an array of rows
+            snapshot: arrays of the search, for the row count and the norms
+            k: number of rows to return
+            rows: optional candidate rows, every row if not provided
+
+        Returns:
+            list of tuples with the row and its cosine similarity, best first
+        """
+        block_size = NumpyVectorStore.SEARCH_BLOCK_SIZE
+        total = snapshot.row_count if rows is None else len(rows)
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+
+        for start in range(0, total, block_size):
+            end = min(start + block_size, total)
+            block: Union[slice, np.ndarray]
+            if rows is None:
+                block = slice(start, end)
+                block_rows = np.arange(start, end)
+            else:
+                block = rows[start:end]
+                block_rows = block
+            norms = snapshot.norms[block]
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scores = inner_products(block) / norms
+            # deleted rows have a zero norm
+            scores[norms == 0] = -np.inf
+
+            block_k = min(k, len(scores))
+            candidates = np.argpartition(-scores, block_k - 1)[:block_k]
+
+            best_rows = np.concatenate([best_rows, block_rows[candidates]])
+            best_scores = np.concatenate([best_scores, scores[candidates]])
+
+        top = min(k, len(best_scores))
+        order = np.argsort(-best_scores, kind="stable")[:top]
+
+        return [
+            (int(best_rows[i]), float(best_scores[i]))
+            for i in order
+            if np.isfinite(best_scores[i])
+        ]
+
+    def _search(
+        self,
+        embedding: EMBEDDING,
+        k: int,
+        search_filter: Optional[dict] = None,
+        nprobe: Optional[int] = None,
+        with_embeddings: bool = False,
+    ) -> List[Tuple[Document, float, Optional[EMBEDDING]]]:
+        """
+        Helper method to run a similarity search, the lock is not held while the rows are scored
+
+        Args:
+            embedding: the query embedding
+            k: number of documents to return
+            search_filter: optional metadata filter
+            nprobe: number of IVF lists to visit, default to the index nprobe
+            with_embeddings: also return the stored embeddings of the results
+
+        Returns:
+            list of tuples with the document, its cosine similarity and its stored embedding if asked for,
+            best first
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        if not query_norm or k < 1:
+            return []
+        query = query / query_norm
+
+        while True:
+            with self._lock:
+                if not self.count:
+                    return []
+                snapshot = self._snapshot(query, search_filter, nprobe)
+
+            top_rows = self._top_k_rows(snapshot, query, k)
+
+            with self._lock:
+                if snapshot.generation != self._generation:
+                    # rows were moved or encoded again while they were scored
+                    continue
+
+                # rows deleted meanwhile have no document anymore
+                documents = self._documents_for_rows([row for row, _ in top_rows])
+
+                return [
+                    (
+                        documents[row][1],
+                        score,
+                        snapshot.vectors[row].tolist() if with_embeddings else None,
+                    )
+                    for row, score in top_rows
+                    if row in documents
+                ]
+
+    def _documents_for_rows(
+        self, rows: Sequence[int]
+    ) -> dict[int, Tuple[str, Document]]:
+        documents = {}
+        for start in range(0, len(rows), 500):
+            rows_batch = list(rows[start : start + 500])
+            for row, doc_id, page_content, metadata in self._connection.execute(
+                f"SELECT row, id, page_content, metadata FROM documents "
+                f"WHERE row IN ({','.join('?' * len(rows_batch))})",
+                rows_batch,
+            ):
+                documents[row] = (
+                    doc_id,
+                    Document(page_content=page_content, metadata=json.loads(metadata)),
+                )
+
+        return documents
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """Return docs most similar to embedding vector and their cosine similarity.
+
+        Args:
+            embedding: Embedding to look up documents similar to.
+            k: Number of Documents to return. Defaults to 4.
+            filter: (Optional) metadata filter, a value or a dictionary of operators ($eq, $ne, $gt, $gte,
+                $lt, $lte, $in, $nin) by key
+            nprobe: (Optional) number of IVF lists to visit, higher is slower with a better recall
+
+        Returns:
+            List of documents most similar to the query vector and their scores.
+        """
+        return [
+            (doc, score)
+            for doc, score, _ in self._search(
+                embedding, k, filter, kwargs.get("nprobe")
+            )
+        ]
+
+    def similarity_search_with_embeddings(
+        self, embedding: EMBEDDING, k: int = 4, search_filter: Optional[dict] = None
+    ) -> List[Tuple[Document, float, EMBEDDING]]:
+        """
+        Method to run a similarity search by vector, with the stored embeddings of the results
+
+        Args:
+            embedding: the query embedding
+            k: max number of documents to return
+            search_filter: metadata filter, a value or a dictionary of operators by key
+
+        Returns:
+            list of tuples with the document, its cosine similarity and its stored embedding, best first
+        """
+        return cast(
+            List[Tuple[Document, float, EMBEDDING]],
+            self._search(embedding, k, search_filter, with_embeddings=True),
+        )
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_by_vector_with_relevance_scores(
+                embedding, k, filter, **kwargs
+            )
+        ]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_relevance_scores(
+            self._embedding.embed_query(query), k, filter, **kwargs
+        )
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = 4,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)
+        ]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # scores are already cosine similarities
+        return lambda x: x
+
+    def metadata_search_with_embeddings(
+        self, k: int = 10, search_filter: Optional[dict] = None
+    ) -> List[Tuple[Document, EMBEDDING]]:
+        """
+        Method to fetch k documents matching a metadata filter, with their stored embeddings
+
+        Args:
+            k: max number of documents to return
+            search_filter: metadata filter
+
+        Returns:
+            list of tuples with the document and its stored embedding
+        """
+        with self._lock:
+            if not search_filter:
+                results = self._connection.execute(
+                    "SELECT row, page_content, metadata FROM documents ORDER BY row LIMIT ?",
+                    (k,),
+                ).fetchall()
+
+                return [
+                    (
+                        Document(
+                            page_content=page_content, metadata=json.loads(metadata)
+                        ),
+                        self._vectors[row].tolist(),
+                    )
+                    for row, page_content, metadata in results
+                ]
+
+            # indexed metadata fields are filtered on their columns, like similarity searches
+            rows = self._filtered_rows(search_filter)[:k].tolist()
+            documents = self._documents_for_rows(rows)
+
+            return [
+                (documents[row][1], self._vectors[row].tolist())
+                for row in rows
+                if row in documents
+            ]
+
+    def get_by_ids_with_embeddings(
+        self, ids: Sequence[str]
+    ) -> List[Tuple[str, Document, EMBEDDING]]:
+        """
+        Method to fetch documents from their ids, with their stored embeddings
+
+        Args:
+            ids: ids of the documents, as given to add_documents
+
+        Returns:
+            list of tuples with the id, the document and its stored embedding, unknown ids are omitted
+        """
+        with self._lock:
+            documents = self._documents_for_rows(self._rows_for_ids(list(ids)))
+
+            return [
+                (doc_id, doc, self._vectors[row].tolist())
+                for row, (doc_id, doc) in documents.items()
+            ]
+
+    def metadata_scan(
+        self, search_filter: Optional[dict] = None, page_size: int = 1000
+    ) -> Iterator[List[Document]]:
+        """
+        Method to iterate over every document matching a metadata filter, page by page
+
+        Args:
+            search_filter: metadata filter
+            page_size: number of documents fetched at once
+
+        Returns:
+            iterator over pages of documents
+        """
+        if search_filter:
+            yield from self._filtered_scan(search_filter, page_size)
+            return
+
+        last_id = ""
+
+        while True:
+            with self._lock:
+                results = self._connection.execute(
+                    "SELECT id, page_content, metadata FROM documents "
+                    "WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, page_size),
+                ).fetchall()
+
+            if not results:
+                return
+
+            last_id = results[-1][0]
+
+            yield [
+                Document(page_content=page_content, metadata=json.loads(metadata))
+                for _, page_content, metadata in results
+            ]
+
+            if len(results) < page_size:
+                return
+
+    def _filtered_scan(
+        self, search_filter: dict, page_size: int
+    ) -> Iterator[List[Document]]:
+        """
+        Helper method to iterate over the documents matching a metadata filter, page by page
+        Matching rows are found once, through the metadata index when the filter has indexed fields,
+        then pages are fetched by id, ids stay valid when a compaction moves the rows
+        """
+        with self._lock:
+            ids = sorted(
+                self._ids_for_rows(self._filtered_rows(search_filter).tolist())
+            )
+
+        for start in range(0, len(ids), page_size):
+            with self._lock:
+                documents = self._documents_for_rows(
+                    self._rows_for_ids(ids[start : start + page_size])
+                )
+
+            # documents deleted since the rows were found are omitted
+            page = [
+                doc for _, doc in sorted(documents.values(), key=lambda item: item[0])
+            ]
+            if page:
+                yield page
+
+    @classmethod
+    def from_texts(
+        cls: Type["NumpyVectorStore"],
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        path: Optional[str] = None,
+        index: Optional[dict] = None,
+        compression: Optional[Union[str, dict]] = None,
+        metadata_index: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(
+            embedding,
+            path=path,
+            index=index,
+            compression=compression,
+            metadata_index=metadata_index,
+        )
+        store.add_texts(texts, metadatas, **kwargs)
+
+        return store
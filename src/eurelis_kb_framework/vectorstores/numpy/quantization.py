@@ -0,0 +1,355 @@
+from abc import ABC, abstractmethod
+from typing import Mapping, Optional, Tuple, Type, Union
+
+import numpy as np
+
+
+class Quantizer(ABC):
+    """
+    Base class for vector compression, vectors are encoded as compact codes and inner products with a
+    full precision query are estimated directly from the codes
+    """
+
+    NAME = ""
+
+    @property
+    @abstractmethod
+    def code_dtype(self) -> type:
+        """
+        dtype of the codes
+        """
+
+    @abstractmethod
+    def code_shape(self, dimension: int) -> Tuple[int, ...]:
+        """
+        Shape of the code of a single vector
+        Args:
+            dimension: dimension of the vectors
+
+        Returns:
+            shape of a code
+        """
+
+    @property
+    def trained(self) -> bool:
+        return True
+
+    @property
+    def train_threshold(self) -> int:
+        """
+        Number of vectors needed before training
+        """
+        return 0
+
+    def train(self, vectors: np.ndarray):
+        """
+        Train the quantizer on sample vectors, default implementation does nothing
+        """
+
+    @abstractmethod
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Encode vectors
+        Args:
+            vectors: float32 matrix
+
+        Returns:
+            codes, one by vector
+        """
+
+    @abstractmethod
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Approximate vectors from their codes
+        Args:
+            codes: codes
+
+        Returns:
+            float32 matrix
+        """
+
+    @abstractmethod
+    def inner_products(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """
+        Estimate the inner products between a query and encoded vectors
+        Args:
+            query: float32 query vector
+            codes: codes of the vectors
+
+        Returns:
+            float32 array of estimated inner products
+        """
+
+    def parameters(self) -> dict[str, np.ndarray]:
+        """
+        Trained parameters, to persist the quantizer
+        """
+        return {}
+
+    def set_parameters(self, parameters: Mapping[str, np.ndarray]):
+        """
+        Restore trained parameters
+        """
+
+
+class Float16Quantizer(Quantizer):
+    """
+    Half precision storage, 2x smaller than float32
+    """
+
+    NAME = "float16"
+
+    @property
+    def code_dtype(self) -> type:
+        return np.float16
+
+    def code_shape(self, dimension: int) -> Tuple[int, ...]:
+        return (dimension,)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.asarray(vectors, dtype=np.float16)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.asarray(codes, dtype=np.float32)
+
+    def inner_products(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) @ query
+
+
+class ScalarInt8Quantizer(Quantizer):
+    """
+    Scalar quantization of each dimension on 256 levels between its trained min and max, 4x smaller than float32
+    """
+
+    NAME = "int8"
+    TRAIN_THRESHOLD = 1000
+
+    def __init__(self):
+        self.minimums: Optional[np.ndarray] = None
+        self.steps: Optional[np.ndarray] = None
+
+    @property
+    def code_dtype(self) -> type:
+        return np.uint8
+
+    def code_shape(self, dimension: int) -> Tuple[int, ...]:
+        return (dimension,)
+
+    @property
+    def trained(self) -> bool:
+        return self.minimums is not None
+
+    @property
+    def train_threshold(self) -> int:
+        return ScalarInt8Quantizer.TRAIN_THRESHOLD
+
+    def train(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.minimums = vectors.min(axis=0)
+        steps = (vectors.max(axis=0) - self.minimums) / 255.0
+        steps[steps == 0] = 1.0
+        self.steps = steps.astype(np.float32)
+
+    def _trained_parameters(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Helper method to get the minimums and steps, raise if the quantizer is not trained
+        """
+        if self.minimums is None or self.steps is None:
+            raise RuntimeError("The int8 quantizer is not trained")
+
+        return self.minimums, self.steps
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        minimums, steps = self._trained_parameters()
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - minimums) / steps)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        minimums, steps = self._trained_parameters()
+        return minimums + codes.astype(np.float32) * steps
+
+    def inner_products(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        minimums, steps = self._trained_parameters()
+        return codes.astype(np.float32) @ (query * steps) + float(minimums @ query)
+
+    def parameters(self) -> dict[str, np.ndarray]:
+        minimums, steps = self._trained_parameters()
+        return {"minimums": minimums, "steps": steps}
+
+    def set_parameters(self, parameters: Mapping[str, np.ndarray]):
+        self.minimums = np.asarray(parameters["minimums"], dtype=np.float32)
+        self.steps = np.asarray(parameters["steps"], dtype=np.float32)
+
+
+class ProductQuantizer(Quantizer):
+    """
+    Product quantization: vectors are split in m sub vectors, each one encoded by the index of its nearest
+    centroid among 256 trained by k-means, a vector is stored on m bytes
+    """
+
+    NAME = "pq"
+    CENTROIDS = 256
+    TRAIN_SIZE = 65_536
+
+    def __init__(self, m: Optional[int] = None, iterations: int = 15):
+        """
+        Constructor
+        Args:
+            m: number of sub vectors, must divide the dimension, default to dimension / 8
+            iterations: number of k-means iterations
+        """
+        self.m = m
+        self.iterations = iterations
+        self.codebooks: Optional[np.ndarray] = None
+
+    @property
+    def code_dtype(self) -> type:
+        return np.uint8
+
+    def code_shape(self, dimension: int) -> Tuple[int, ...]:
+        return (self._sub_vectors(dimension),)
+
+    def _sub_vectors(self, dimension: int) -> int:
+        m = self.m if self.m else max(1, dimension // 8)
+        if dimension % m:
+            raise ValueError(
+                f"Product quantization needs m dividing the dimension, got m={m} for {dimension}"
+            )
+        return m
+
+    @property
+    def trained(self) -> bool:
+        return self.codebooks is not None
+
+    @property
+    def train_threshold(self) -> int:
+        return ProductQuantizer.CENTROIDS * 16
+
+    def train(self, vectors: np.ndarray, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) > ProductQuantizer.TRAIN_SIZE:
+            vectors = vectors[
+                rng.choice(len(vectors), ProductQuantizer.TRAIN_SIZE, replace=False)
+            ]
+
+        m = self._sub_vectors(vectors.shape[1])
+        self.m = m
+        sub_dimension = vectors.shape[1] // m
+        centroids_count = min(ProductQuantizer.CENTROIDS, len(vectors))
+
+        codebooks = np.zeros((m, centroids_count, sub_dimension), dtype=np.float32)
+
+        for sub in range(m):
+            points = vectors[:, sub * sub_dimension : (sub + 1) * sub_dimension]
+            centroids = points[
+                rng.choice(len(points), centroids_count, replace=False)
+            ].copy()
+
+            for _ in range(self.iterations):
+                assignments = self._nearest(points, centroids)
+                counts = np.bincount(assignments, minlength=centroids_count)
+                sums = np.stack(
+                    [
+                        np.bincount(
+                            assignments,
+                            weights=points[:, column],
+                            minlength=centroids_count,
+                        )
+                        for column in range(sub_dimension)
+                    ],
+                    axis=1,
+                ).astype(np.float32)
+
+                non_empty = counts > 0
+                centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+                # empty centroids restart from random points
+                empty = np.flatnonzero(~non_empty)
+                centroids[empty] = points[rng.choice(len(points), len(empty))]
+
+            codebooks[sub, :centroids_count] = centroids
+
+        self.codebooks = codebooks
+
+    @staticmethod
+    def _nearest(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, |x|^2 does not change the argmin
+        distances = -2 * points @ centroids.T + np.sum(centroids**2, axis=1)
+        return np.argmin(distances, axis=1)
+
+    def _trained_codebooks(self) -> np.ndarray:
+        """
+        Helper method to get the codebooks, raise if the quantizer is not trained
+        """
+        if self.codebooks is None:
+            raise RuntimeError("The product quantizer is not trained")
+
+        return self.codebooks
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        codebooks = self._trained_codebooks()
+        m, _, sub_dimension = codebooks.shape
+
+        codes = np.empty((len(vectors), m), dtype=np.uint8)
+        for sub in range(m):
+            codes[:, sub] = self._nearest(
+                vectors[:, sub * sub_dimension : (sub + 1) * sub_dimension],
+                codebooks[sub],
+            )
+
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        codebooks = self._trained_codebooks()
+        return np.concatenate(
+            [codebooks[sub][codes[:, sub]] for sub in range(codebooks.shape[0])],
+            axis=1,
+        )
+
+    def inner_products(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        codebooks = self._trained_codebooks()
+        m, _, sub_dimension = codebooks.shape
+        # lookup table of the inner product of each query sub vector with each centroid
+        table = np.einsum("mcd,md->mc", codebooks, query.reshape(m, sub_dimension))
+
+        return table[np.arange(m), codes].sum(axis=1, dtype=np.float32)
+
+    def parameters(self) -> dict[str, np.ndarray]:
+        return {"codebooks": self._trained_codebooks()}
+
+    def set_parameters(self, parameters: Mapping[str, np.ndarray]):
+        codebooks = np.asarray(parameters["codebooks"], dtype=np.float32)
+        self.codebooks = codebooks
+        self.m = codebooks.shape[0]
+
+
+QUANTIZERS: Mapping[str, Type[Quantizer]] = {
+    Float16Quantizer.NAME: Float16Quantizer,
+    ScalarInt8Quantizer.NAME: ScalarInt8Quantizer,
+    ProductQuantizer.NAME: ProductQuantizer,
+}
+
+
+def build_quantizer(compression: Union[str, Mapping]) -> Quantizer:
+    """
+    Helper function to build a quantizer from its configuration
+    Args:
+        compression: "float16", "int8", "pq" or a dictionary with a type key and the quantizer parameters
+
+    Returns:
+        the quantizer
+    """
+    params = (
+        {"type": compression} if isinstance(compression, str) else dict(compression)
+    )
+    quantizer_type = params.pop("type", None)
+    params.pop("rerank", None)
+
+    quantizer_class = QUANTIZERS.get(quantizer_type)
+    if not quantizer_class:
+        raise ValueError(
+            f"Unknown compression {quantizer_type}, use one of {list(QUANTIZERS)}"
+        )
+
+    return quantizer_class(**params)
@@ -0,0 +1,63 @@
+from typing import Any, Iterable, List, Optional, Type
+
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from langchain.schema.vectorstore import VectorStore
+
+
+class VectorStoreProxy(VectorStore):
+    """
+    Base class for vector store proxies keeping a side index in sync with the wrapped vector store
+
+    Subclasses override add_documents and delete, other calls are forwarded to the wrapped vector store
+    """
+
+    def __init__(self, vector_store: VectorStore):
+        """
+        Constructor
+        Args:
+            vector_store: the wrapped vector store
+        """
+        self.vector_store = vector_store
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.vector_store.embeddings
+
+    def add_documents(self, documents: List[Document], **kwargs: Any) -> List[str]:
+        return self.vector_store.add_documents(documents, **kwargs)
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+
+        return self.add_documents(
+            [
+                Document(page_content=text, metadata=metadata)
+                for text, metadata in zip(texts, metadatas)
+            ],
+            **kwargs,
+        )
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        return self.vector_store.delete(ids, **kwargs)
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return self.vector_store.similarity_search(query, k, **kwargs)
+
+    @classmethod
+    def from_texts(
+        cls: Type["VectorStoreProxy"],
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> "VectorStoreProxy":
+        raise NotImplementedError(f"{cls.__name__} only wraps an existing vector store")
@@ -0,0 +1,285 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+
+def _pack_strings(values: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Helper function to store a list of strings as a single utf-8 buffer and an offsets array
+    Args:
+        values: the strings
+
+    Returns:
+        tuple with the offsets array (one more item than values) and the buffer
+    """
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _unpack_strings(offsets: np.ndarray, buffer: np.ndarray) -> List[str]:
+    """
+    Helper function to read back strings stored with _pack_strings
+    """
+    data = buffer.tobytes()
+
+    return [
+        data[start:end].decode("utf-8")
+        for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())
+    ]
+
+
+class RelatedSourcesGraph:
+    """
+    Top-N nearest neighbors graph between source centroids, with a representative document by source
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(
+        self,
+        field: str,
+        sources: List[str],
+        neighbors: np.ndarray,
+        scores: np.ndarray,
+        documents: Optional[List[Optional[Document]]] = None,
+    ):
+        """
+        Constructor
+        Args:
+            field: metadata field the sources are values of
+            sources: the source values
+            neighbors: int32 matrix, row i lists the indexes of the nearest sources of source i, -1 for padding
+            scores: float32 matrix, cosine similarity for each neighbor, in decreasing order
+            documents: optional representative document by source
+        """
+        self.field = field
+        self.sources = sources
+        self.neighbors = neighbors
+        self.scores = scores
+        self.documents = documents if documents else [None] * len(sources)
+        self._source_indexes: Dict[str, int] = {
+            source: index for index, source in enumerate(sources)
+        }
+
+    @property
+    def top_n(self) -> int:
+        return self.neighbors.shape[1] if self.neighbors.ndim == 2 else 0
+
+    @classmethod
+    def build(
+        cls,
+        field: str,
+        sources: List[str],
+        centroids: np.ndarray,
+        top_n: int = 50,
+        block_size: int = 1024,
+    ) -> "RelatedSourcesGraph":
+        """
+        Compute the neighbors graph, similarities are computed by blocks of rows
+        so memory stays bounded by block_size * len(sources)
+
+        Args:
+            field: metadata field the sources are values of
+            sources: the source values
+            centroids: matrix of the sources centroids, one row by source
+            top_n: number of neighbors to keep by source
+            block_size: number of sources handled at once
+
+        Returns:
+            the graph
+        """
+        count = len(sources)
+        top_n = max(0, min(top_n, count - 1))
+
+        vectors = np.asarray(centroids, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+
+        neighbors = np.full((count, top_n), -1, dtype=np.int32)
+        scores = np.full((count, top_n), -np.inf, dtype=np.float32)
+
+        if top_n == 0:
+            return cls(field, sources, neighbors, scores)
+
+        for start in range(0, count, block_size):
+            end = min(start + block_size, count)
+            similarities = vectors[start:end] @ vectors.T
+            # a source is not its own neighbor
+            similarities[np.arange(end - start), np.arange(start, end)] = -np.inf
+
+            candidates = np.argpartition(-similarities, top_n - 1, axis=1)[:, :top_n]
+            candidate_scores = np.take_along_axis(similarities, candidates, axis=1)
+            order = np.argsort(-candidate_scores, axis=1)
+
+            neighbors[start:end] = np.take_along_axis(candidates, order, axis=1)
+            scores[start:end] = np.take_along_axis(candidate_scores, order, axis=1)
+
+        return cls(field, sources, neighbors, scores)
+
+    def save(self, path: str):
+        """
+        Write the graph to a compressed numpy archive, atomically
+        Args:
+            path: path of the archive
+
+        Returns:
+
+        """
+        os.makedirs(Path(os.path.dirname(os.path.abspath(path))), exist_ok=True)
+
+        source_offsets, source_buffer = _pack_strings(self.sources)
+        document_offsets, document_buffer = _pack_strings(
+            [
+                json.dumps(
+                    {"page_content": doc.page_content, "metadata": doc.metadata},
+                    default=str,
+                )
+                if doc
+                else ""
+                for doc in self.documents
+            ]
+        )
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as graph_file:
+            np.savez_compressed(
+                graph_file,
+                version=np.array(RelatedSourcesGraph.FORMAT_VERSION),
+                field=np.array(self.field),
+                source_offsets=source_offsets,
+                source_buffer=source_buffer,
+                document_offsets=document_offsets,
+                document_buffer=document_buffer,
+                neighbors=self.neighbors,
+                scores=self.scores,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RelatedSourcesGraph":
+        """
+        Read a graph written by save
+        Args:
+            path: path of the archive
+
+        Returns:
+            the graph
+        """
+        with np.load(path) as data:
+            version = int(data["version"])
+            if version != RelatedSourcesGraph.FORMAT_VERSION:
+                raise ValueError(f"Unsupported related graph format version {version}")
+
+            documents: List[Optional[Document]] = [
+                Document(**json.loads(value)) if value else None
+                for value in _unpack_strings(
+                    data["document_offsets"], data["document_buffer"]
+                )
+            ]
+
+            return cls(
+                str(data["field"]),
+                _unpack_strings(data["source_offsets"], data["source_buffer"]),
+                data["neighbors"],
+                data["scores"],
+                documents,
+            )
+
+    def __contains__(self, source: str) -> bool:
+        return source in self._source_indexes
+
+    def related(
+        self,
+        sources: Sequence[str],
+        k: int,
+        coefs: Optional[Sequence[float]] = None,
+        exclude: Optional[Sequence[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Merge the neighbors lists of some sources
+
+        A candidate missing from a source neighbors list is given the last score of that list,
+        an upper bound of its real similarity
+
+        Args:
+            sources: the source values, all must be part of the graph
+            k: number of related sources to return
+            coefs: optional weight by source, default to the same weight for every source
+            exclude: optional other sources never returned, sources missing from the graph are ignored
+
+        Returns:
+            list of tuples with the related source and its weighted similarity, best first,
+            input and excluded sources are excluded
+        """
+        indexes = np.array([self._source_indexes[source] for source in sources])
+        excluded = np.union1d(
+            indexes,
+            [
+                self._source_indexes[source]
+                for source in exclude or []
+                if source in self._source_indexes
+            ],
+        )
+        weights = (
+            np.asarray(coefs, dtype=np.float64)
+            if coefs
+            else np.ones(len(indexes), dtype=np.float64)
+        )
+
+        neighbors = self.neighbors[indexes]
+        scores = self.scores[indexes].astype(np.float64)
+        valid = neighbors >= 0
+
+        candidates = np.setdiff1d(np.unique(neighbors[valid]), excluded)
+        if not len(candidates):
+            return []
+
+        # the default similarity of a candidate missing from a list is the list last score
+        floors = np.array(
+            [
+                row_scores[row_valid][-1] if row_valid.any() else 0.0
+                for row_scores, row_valid in zip(scores, valid)
+            ]
+        )
+        similarities = np.repeat(floors[:, None], len(candidates), axis=1)
+
+        for row in range(len(indexes)):
+            row_neighbors = neighbors[row][valid[row]]
+            positions = np.searchsorted(candidates, row_neighbors)
+            in_candidates = (positions < len(candidates)) & (
+                candidates[np.minimum(positions, len(candidates) - 1)] == row_neighbors
+            )
+            similarities[row, positions[in_candidates]] = scores[row][valid[row]][
+                in_candidates
+            ]
+
+        merged = weights @ similarities / np.sum(weights)
+
+        top = min(k, len(candidates))
+        best = np.argpartition(-merged, top - 1)[:top]
+        best = best[np.argsort(-merged[best])]
+
+        return [(self.sources[candidates[i]], float(merged[i])) for i in best]
+
+    def document(self, source: str) -> Document:
+        """
+        Representative document of a source
+        Args:
+            source: the source value
+
+        Returns:
+            the document stored at build time, or an empty document with only the source metadata
+        """
+        doc = self.documents[self._source_indexes[source]]
+        if doc:
+            return doc
+
+        return Document(page_content="", metadata={self.field: source})
@@ -0,0 +1,278 @@
+import datetime
+import json
+import os
+from itertools import islice
+from typing import TYPE_CHECKING, Dict, Optional, cast
+
+import numpy as np
+
+from eurelis_kb_framework.embeddings.dimensions import embedding_dimension, model_name
+from eurelis_kb_framework.vectorstores.capabilities import (
+    PrecomputedEmbeddingsCapability,
+    StoredEmbeddingsCapability,
+)
+from eurelis_kb_framework.vectorstores.migration import (
+    copied_metadata,
+    record_key_pages,
+)
+
+if TYPE_CHECKING:
+    from eurelis_kb_framework.langchain_wrapper import LangchainWrapper
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+DOCUMENTS = "documents.jsonl"
+VECTORS = "vectors.bin"
+DTYPES = ("float32", "float16")
+
+
+class ProjectSnapshot:
+    """
+    Portable snapshot of the indexed datasets of a project, independent of the vector store
+
+    A snapshot is a directory with a manifest and, for each dataset, a json lines file of the documents
+    (record key, group id, content and metadata) and a contiguous block of their vectors, row i of the
+    block being the vector of line i. The manifest is written last, a directory without manifest is an
+    incomplete export.
+
+    Importing writes the stored vectors to the configured vector store and the keys to its record manager,
+    nothing is embedded again
+    """
+
+    def __init__(self, wrapper: "LangchainWrapper", path: str, page_size: int = 1000):
+        """
+        Constructor
+        Args:
+            wrapper: the wrapper of the configuration to export or to import into
+            path: the snapshot directory
+            page_size: number of documents read or written at once
+        """
+        self.wrapper = wrapper
+        self.path = path
+        self.page_size = page_size
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, MANIFEST)
+
+    def export(
+        self, dataset_id: Optional[str] = None, dtype: str = "float32"
+    ) -> Dict[str, dict]:
+        """
+        Export the indexed datasets
+        Args:
+            dataset_id: optional, if given only the named dataset is exported
+            dtype: vectors dtype, float32 or float16 (half the size, lossy)
+
+        Returns:
+            dictionary of dataset id to the export results
+        """
+        self.wrapper.ensure_initialized()
+
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported snapshot dtype {dtype}, use one of {DTYPES}")
+        if os.path.exists(self._manifest_path()):
+            raise ValueError(f"A snapshot already exists in {self.path}")
+
+        manifest: dict = {
+            "format_version": FORMAT_VERSION,
+            "project": self.wrapper.project,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "embeddings_model": model_name(self.wrapper.embeddings),
+            "dimension": None,
+            "dtype": dtype,
+            "datasets": {},
+        }
+
+        for dataset in self.wrapper._list_datasets(dataset_id):
+            if not dataset.index or dataset.index == "cache":
+                continue
+
+            if not isinstance(dataset.vector_store, StoredEmbeddingsCapability):
+                raise ValueError(
+                    f"The vector store of the '{dataset.id}' dataset does not return its stored embeddings"
+                )
+
+            namespace = f"{self.wrapper.project}/{dataset.name}"
+            count, dimension = self.wrapper.console.status(
+                f"Exporting '{dataset.id}' dataset",
+                lambda: self._export_namespace(
+                    namespace, dataset.vector_store, dataset.id, dtype
+                ),
+            )
+
+            if dimension is not None:
+                if manifest["dimension"] not in (None, dimension):
+                    raise ValueError(
+                        f"The '{dataset.id}' dataset vectors have {dimension} dimensions, "
+                        f"other datasets have {manifest['dimension']}"
+                    )
+                manifest["dimension"] = dimension
+
+            manifest["datasets"][dataset.id] = {
+                "namespace": namespace,
+                "directory": dataset.id,
+                "count": count,
+            }
+
+        with open(self._manifest_path(), "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+        return {
+            dataset: {"count": details["count"], "status": "exported"}
+            for dataset, details in manifest["datasets"].items()
+        }
+
+    def _export_namespace(
+        self, namespace: str, vector_store, directory: str, dtype: str
+    ) -> tuple:
+        """
+        Helper method to export the documents of a namespace, in record key order
+        Returns:
+            tuple with the number of exported documents and the vectors dimension, None without documents
+        """
+        dataset_path = os.path.join(self.path, directory)
+        os.makedirs(dataset_path, exist_ok=True)
+
+        record_manager = self.wrapper._get_record_manager(namespace)
+        count = 0
+        dimension = None
+
+        with open(
+            os.path.join(dataset_path, DOCUMENTS), "w", encoding="utf-8"
+        ) as documents_file, open(
+            os.path.join(dataset_path, VECTORS), "wb"
+        ) as vectors_file:
+            for page in record_key_pages(record_manager, None, self.page_size):
+                group_ids = dict(page)
+                documents = cast(
+                    StoredEmbeddingsCapability, vector_store
+                ).get_by_ids_with_embeddings([key for key, _ in page])
+                if not documents:
+                    continue
+
+                vectors = np.asarray(
+                    [embedding for _, _, embedding in documents], dtype=dtype
+                )
+                if dimension is None:
+                    dimension = vectors.shape[1]
+                vectors_file.write(np.ascontiguousarray(vectors).tobytes())
+
+                for key, doc, _ in documents:
+                    documents_file.write(
+                        json.dumps(
+                            {
+                                "key": key,
+                                "group_id": group_ids.get(key),
+                                "page_content": doc.page_content,
+                                "metadata": copied_metadata(doc.metadata),
+                            },
+                            default=str,
+                        )
+                    )
+                    documents_file.write("\n")
+
+                count += len(documents)
+
+        return count, dimension
+
+    def load(self, dataset_id: Optional[str] = None) -> Dict[str, dict]:
+        """
+        Import the datasets of the snapshot found in the configuration
+        Args:
+            dataset_id: optional, if given only the named dataset is imported
+
+        Returns:
+            dictionary of dataset id to the import results
+        """
+        self.wrapper.ensure_initialized()
+
+        if not os.path.exists(self._manifest_path()):
+            raise ValueError(f"No snapshot manifest in {self.path}")
+
+        with open(self._manifest_path(), "r", encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported snapshot format version {manifest.get('format_version')}"
+            )
+        if manifest["project"] != self.wrapper.project:
+            # record keys are hashes of the documents, namespace included
+            raise ValueError(
+                f"Snapshot project {manifest['project']} and project {self.wrapper.project} differ, "
+                f"imported documents would be indexed again"
+            )
+
+        dimension = embedding_dimension(self.wrapper.embeddings, probe=False)
+        if manifest["dimension"] and dimension and dimension != manifest["dimension"]:
+            raise ValueError(
+                f"Snapshot vectors have {manifest['dimension']} dimensions, "
+                f"the configured embeddings {dimension}"
+            )
+        if manifest["embeddings_model"] != model_name(self.wrapper.embeddings):
+            self.wrapper.console.critical_print(
+                f"Snapshot embeddings model {manifest['embeddings_model']} differs from the configured one "
+                f"{model_name(self.wrapper.embeddings)}"
+            )
+
+        results: Dict[str, dict] = {}
+        for dataset in self.wrapper._list_datasets(dataset_id):
+            details = manifest["datasets"].get(dataset.id)
+            if not details or not dataset.index or dataset.index == "cache":
+                continue
+
+            if not isinstance(dataset.vector_store, PrecomputedEmbeddingsCapability):
+                raise ValueError(
+                    f"The vector store of the '{dataset.id}' dataset does not accept embeddings"
+                )
+
+            results[dataset.id] = self.wrapper.console.status(
+                f"Importing '{dataset.id}' dataset",
+                lambda: self._load_namespace(details, manifest, dataset.vector_store),
+            )
+
+        return results
+
+    def _load_namespace(self, details: dict, manifest: dict, vector_store) -> dict:
+        """
+        Helper method to import the documents of a namespace, vectors are memory mapped
+        Returns:
+            dictionary with the number of imported documents and the import status
+        """
+        dataset_path = os.path.join(self.path, details["directory"])
+        count = details["count"]
+        if not count:
+            return {"count": 0, "status": "empty"}
+
+        vectors = np.memmap(
+            os.path.join(dataset_path, VECTORS),
+            dtype=manifest["dtype"],
+            mode="r",
+            shape=(count, manifest["dimension"]),
+        )
+        record_manager = self.wrapper._get_record_manager(details["namespace"])
+
+        start = 0
+        with open(
+            os.path.join(dataset_path, DOCUMENTS), "r", encoding="utf-8"
+        ) as documents_file:
+            while True:
+                records = [
+                    json.loads(line) for line in islice(documents_file, self.page_size)
+                ]
+                if not records:
+                    break
+
+                keys = [record["key"] for record in records]
+                cast(PrecomputedEmbeddingsCapability, vector_store).add_embeddings(
+                    [record["page_content"] for record in records],
+                    vectors[start : start + len(records)].astype(np.float32).tolist(),
+                    [record["metadata"] for record in records],
+                    keys,
+                )
+                record_manager.update(
+                    keys, group_ids=[record["group_id"] for record in records]
+                )
+                start += len(records)
+
+        return {"count": start, "status": "imported"}
@@ -26,11 +26,15 @@ class SolrFactory(ParamsDictFactory[VectorStore]):
             a Solr vector store object
         """
         try:
-            from eurelis_langchain_solr_vectorstore import Solr  # type: ignore
+            from eurelis_kb_framework.vectorstores.solr.solr_vector_store import (
+                SolrVectorStore,
+            )
 
             context.console.verbose_print(f"Getting solr vector store")
 
-            return Solr(context.embeddings, core_kwargs=self.get_optional_params())
+            return SolrVectorStore(
+                context.embeddings, core_kwargs=self.get_optional_params()
+            )
         except ImportError:
             raise ImportError(
                 "Please install eurelis_langchain_solr_vectorstore with the option solr, (pip install eurelis_kb_framework[solr]"
@@ -0,0 +1,263 @@
+import json
+import uuid
+from typing import List, Optional, Tuple, Any, Sequence, Iterator
+
+import requests
+from eurelis_langchain_solr_vectorstore import Solr  # type: ignore
+from eurelis_langchain_solr_vectorstore.solr_core import SolrCore  # type: ignore
+from langchain.schema import Document
+
+from eurelis_kb_framework.types import EMBEDDING
+from eurelis_kb_framework.vectorstores.capabilities import (
+    StoredEmbeddingsCapability,
+    MetadataScanCapability,
+    SimilaritySearchWithEmbeddingsCapability,
+    PrecomputedEmbeddingsCapability,
+)
+
+
+class SolrVectorStore(
+    Solr,
+    StoredEmbeddingsCapability,
+    MetadataScanCapability,
+    SimilaritySearchWithEmbeddingsCapability,
+    PrecomputedEmbeddingsCapability,
+):
+    """
+    Solr vector store with access to the stored embeddings and metadata scan
+    """
+
+    def _filter_queries(self, search_filter: Optional[dict]) -> Optional[str]:
+        """
+        Helper method to convert a metadata filter to a solr filter query
+        Args:
+            search_filter: metadata filter
+
+        Returns:
+            solr filter query
+        """
+        if not search_filter:
+            return None
+
+        return " AND ".join(
+            f"{SolrCore.field_name_for_metadata_key(key, type(value))}:{json.dumps(value)}"
+            for key, value in search_filter.items()
+        )
+
+    def _document_from_solr(self, solr_doc: dict) -> Document:
+        """
+        Helper method to build a document from a solr document
+        Args:
+            solr_doc: the solr document
+
+        Returns:
+            the document, its stored embedding is the vector field of the solr document
+        """
+        metadata = {}
+        for solr_field, value in solr_doc.items():
+            metadata_key = SolrCore.metadata_key_for_field_name(solr_field)
+            if not metadata_key or not isinstance(value, (str, int, float, bool)):
+                continue
+            metadata[metadata_key] = value
+
+        page_content = solr_doc.get(self._core._page_content_field, "")
+
+        return Document(page_content=page_content, metadata=metadata)
+
+    def add_embeddings(
+        self,
+        texts: Sequence[str],
+        embeddings: Sequence[EMBEDDING],
+        metadatas: Optional[Sequence[dict]] = None,
+        ids: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        """
+        Method to add documents with already computed embeddings, existing ids are replaced
+
+        Args:
+            texts: page contents
+            embeddings: the embeddings, one by text
+            metadatas: optional metadata, one by text
+            ids: optional ids, one by text
+
+        Returns:
+            the ids of the added documents
+        """
+        ids = list(ids) if ids else [str(uuid.uuid1()) for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        if not len(ids) == len(texts) == len(embeddings) == len(metadatas):
+            raise ValueError("texts, embeddings, metadatas and ids lengths mismatch")
+
+        # documents without metadata are upserted apart, like add_texts does
+        for with_metadata in (True, False):
+            indexes = [
+                index
+                for index, metadata in enumerate(metadatas)
+                if bool(metadata) == with_metadata
+            ]
+            if indexes:
+                self._core.upsert(
+                    ids=[ids[index] for index in indexes],
+                    embeddings=[list(embeddings[index]) for index in indexes],
+                    metadatas=[metadatas[index] for index in indexes]
+                    if with_metadata
+                    else None,
+                    documents=[texts[index] for index in indexes],
+                )
+
+        return ids
+
+    def _select(self, query_params: dict[str, Any]) -> dict:
+        """
+        Helper method to call the solr select handler
+        Args:
+            query_params: solr query parameters
+
+        Returns:
+            the solr json response
+        """
+        response = requests.post(
+            self._core.get_handler_url("select"), json={"params": query_params}
+        )
+        response.raise_for_status()
+
+        return response.json()
+
+    def metadata_search_with_embeddings(
+        self, k: int = 10, search_filter: Optional[dict] = None
+    ) -> List[Tuple[Document, EMBEDDING]]:
+        """
+        Method to fetch k documents matching a metadata filter, with their stored embeddings
+
+        Args:
+            k: max number of documents to return
+            search_filter: metadata filter
+
+        Returns:
+            list of tuples with the document and its stored embedding
+        """
+        query_params: dict[str, Any] = {"q": "*:*", "fl": "*", "rows": k}
+
+        filter_queries = self._filter_queries(search_filter)
+        if filter_queries:
+            query_params["fq"] = filter_queries
+
+        data_json = self._select(query_params)
+
+        return [
+            (self._document_from_solr(solr_doc), solr_doc[self._core._vector_field])
+            for solr_doc in data_json["response"]["docs"]
+        ]
+
+    def get_by_ids_with_embeddings(
+        self, ids: Sequence[str]
+    ) -> List[Tuple[str, Document, EMBEDDING]]:
+        """
+        Method to fetch documents from their ids, with their stored embeddings
+
+        Args:
+            ids: ids of the documents, as given to add_documents
+
+        Returns:
+            list of tuples with the id, the document and its stored embedding, unknown ids are omitted
+        """
+        if not ids:
+            return []
+
+        data_json = self._select(
+            {
+                "q": "*:*",
+                "fq": "{!terms f=id}" + ",".join(ids),
+                "fl": "*",
+                "rows": len(ids),
+            }
+        )
+
+        return [
+            (
+                solr_doc["id"],
+                self._document_from_solr(solr_doc),
+                solr_doc[self._core._vector_field],
+            )
+            for solr_doc in data_json["response"]["docs"]
+        ]
+
+    def metadata_scan(
+        self, search_filter: Optional[dict] = None, page_size: int = 1000
+    ) -> Iterator[List[Document]]:
+        """
+        Method to iterate over every document matching a metadata filter, page by page
+
+        Pages are read with a solr cursorMark, the vector field is not requested
+
+        Args:
+            search_filter: metadata filter
+            page_size: number of documents fetched at once
+
+        Returns:
+            iterator over pages of documents
+        """
+        query_params: dict[str, Any] = {
+            "q": "*:*",
+            "fl": f"id,{self._core._page_content_field},metadata_*",
+            "rows": page_size,
+            "sort": "id asc",
+        }
+
+        filter_queries = self._filter_queries(search_filter)
+        if filter_queries:
+            query_params["fq"] = filter_queries
+
+        cursor_mark = "*"
+
+        while True:
+            data_json = self._select({**query_params, "cursorMark": cursor_mark})
+
+            solr_docs = data_json["response"]["docs"]
+            if solr_docs:
+                yield [self._document_from_solr(solr_doc) for solr_doc in solr_docs]
+
+            next_cursor_mark = data_json.get("nextCursorMark")
+            if not next_cursor_mark or next_cursor_mark == cursor_mark:
+                return
+
+            cursor_mark = next_cursor_mark
+
+    def similarity_search_with_embeddings(
+        self, embedding: EMBEDDING, k: int = 4, search_filter: Optional[dict] = None
+    ) -> List[Tuple[Document, float, EMBEDDING]]:
+        """
+        Method to run a similarity search by vector, with the stored embeddings of the results
+
+        Args:
+            embedding: the query embedding
+            k: max number of documents to return
+            search_filter: metadata filter
+
+        Returns:
+            list of tuples with the document, its relevance score and its stored embedding, best first
+        """
+        query_params: dict[str, Any] = {
+            "q": f"{{!knn f={self._core._vector_field} topK={k}}}{list(embedding)}",
+            "fl": "*, score",
+            "rows": k,
+        }
+
+        filter_queries = self._filter_queries(search_filter)
+        if filter_queries:
+            query_params["fq"] = filter_queries
+
+        data_json = self._select(query_params)
+
+        results = []
+        for solr_doc in data_json["response"]["docs"]:
+            # solr score is already a relevance value
+            results.append(
+                (
+                    self._document_from_solr(solr_doc),
+                    solr_doc.get("score", 0.0),
+                    solr_doc[self._core._vector_field],
+                )
+            )
+
+        return results